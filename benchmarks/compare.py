@@ -0,0 +1,58 @@
+"""Compare two benchmark reports and flag regressions.
+
+    python benchmarks/compare.py base.json new.json --threshold 0.10
+
+Cases are matched by name, bars and query. A case regresses when its p50
+or p95 grew by more than the threshold; the exit status is 1 if any did.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p95_ms")
+
+
+def case_key(result: dict) -> tuple:
+    return result["name"], result.get("bars"), result.get("query")
+
+
+def compare(base: dict, new: dict, threshold: float) -> tuple[list[dict], int]:
+    baseline = {case_key(r): r for r in base["results"]}
+    rows, regressions = [], 0
+    for result in new["results"]:
+        old = baseline.get(case_key(result))
+        if old is None:
+            continue
+        row = {"case": " ".join(str(k) for k in case_key(result) if k is not None)}
+        regressed = False
+        for metric in METRICS:
+            change = result[metric] / old[metric] - 1 if old[metric] else 0.0
+            row[metric] = f"{old[metric]:.4g} -> {result[metric]:.4g} ({change:+.1%})"
+            regressed |= change > threshold
+        row["regressed"] = regressed
+        regressions += regressed
+        rows.append(row)
+    return rows, regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    rows, regressions = compare(base, new, args.threshold)
+    for row in rows:
+        flag = "REGRESSED" if row["regressed"] else "ok"
+        print(f"{flag:9} {row['case']:45} " + "  ".join(f"{m} {row[m]}" for m in METRICS))
+    print(f"{regressions} of {len(rows)} cases regressed by more than {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Local stand-in for Binance: REST klines plus the kline websocket stream.
+
+Serves a random-walk price per symbol on one port:
+
+- GET /api/v3/klines?symbol=&interval=&startTime=&endTime=&limit=
+- ws  /stream?streams=btcusdt@kline_4h/... pushing an update per symbol every
+  --tick seconds (the bar still forming, then the close when it rolls over)
+
+    python benchmarks/fake_binance.py --port 9100 --tick 0.5
+    BINANCE_BASE_URL=http://127.0.0.1:9100 BINANCE_STREAM_URL=ws://127.0.0.1:9100 LIVE_FEED=1 ...
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import zlib
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from websockets.asyncio.server import serve
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "market_agent"))
+
+from indicator_state import interval_ms  # noqa: E402
+
+
+class Market:
+    """Deterministic random-walk OHLC per (symbol, interval, bar open time)."""
+
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+
+    def bar(self, symbol: str, interval: str, open_ms: int, now_ms: int | None = None) -> list:
+        step = interval_ms(interval)
+        index = open_ms // step
+        rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode()), index])
+        base = 100 * (1 + (index % 500) / 1000)
+        o = base * (1 + rng.normal(0, 0.01))
+        c = o * (1 + rng.normal(0, 0.02))
+        if now_ms is not None and now_ms < open_ms + step:
+            # Still forming: move part of the way to the close.
+            c = o + (c - o) * (now_ms - open_ms) / step
+        h = max(o, c) * (1 + abs(rng.normal(0, 0.005)))
+        l = min(o, c) * (1 - abs(rng.normal(0, 0.005)))
+        return [open_ms, f"{o:.2f}", f"{h:.2f}", f"{l:.2f}", f"{c:.2f}", "0", open_ms + step - 1,
+                "0", 0, "0", "0", "0"]
+
+    def klines(self, symbol: str, interval: str, start: int | None, end: int | None, limit: int) -> list:
+        step = interval_ms(interval)
+        now = int(time.time() * 1000)
+        last = min(end if end is not None else now, now) // step * step
+        first = (start + step - 1) // step * step if start is not None else last - (limit - 1) * step
+        opens = range(first, last + 1, step)[:limit]
+        return [self.bar(symbol, interval, t, now) for t in opens]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--tick", type=float, default=1.0, help="seconds between stream updates")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args.host, args.port, args.tick, Market(args.seed)))
+
+
+async def run(host: str, port: int, tick: float, market: Market) -> None:
+    def process_request(connection, request):
+        url = urlparse(request.path)
+        if url.path == "/stream":
+            return None  # websocket upgrade
+        if url.path != "/api/v3/klines":
+            return connection.respond(HTTPStatus.NOT_FOUND, "not found\n")
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        body = market.klines(
+            q["symbol"], q.get("interval", "4h"),
+            int(q["startTime"]) if "startTime" in q else None,
+            int(q["endTime"]) if "endTime" in q else None,
+            min(int(q.get("limit", 500)), 1000),
+        )
+        response = connection.respond(HTTPStatus.OK, json.dumps(body))
+        response.headers["Content-Type"] = "application/json"
+        return response
+
+    async def stream(ws):
+        streams = parse_qs(urlparse(ws.request.path).query).get("streams", [""])[0].split("/")
+        subscriptions = [name.split("@kline_") for name in streams if "@kline_" in name]
+        sent: dict[str, int] = {}
+
+        async def send(symbol: str, interval: str, open_ms: int, now: int, closed: bool) -> None:
+            step = interval_ms(interval)
+            t, o, h, l, c, *_ = market.bar(symbol.upper(), interval, open_ms, None if closed else now)
+            kline = {"t": t, "T": t + step - 1, "s": symbol.upper(), "i": interval,
+                     "o": o, "h": h, "l": l, "c": c, "x": closed}
+            await ws.send(json.dumps({"stream": f"{symbol}@kline_{interval}",
+                                      "data": {"e": "kline", "E": now, "s": symbol.upper(), "k": kline}}))
+
+        while True:
+            now = int(time.time() * 1000)
+            for symbol, interval in subscriptions:
+                open_ms = now // interval_ms(interval) * interval_ms(interval)
+                previous = sent.get(symbol)
+                if previous is not None and previous != open_ms:
+                    await send(symbol, interval, previous, now, closed=True)
+                await send(symbol, interval, open_ms, now, closed=False)
+                sent[symbol] = open_ms
+            await asyncio.sleep(tick)
+
+    async with serve(stream, host, port, process_request=process_request):
+        print(f"fake binance on http://{host}:{port} and ws://{host}:{port}/stream", flush=True)
+        await asyncio.get_running_loop().create_future()
+
+
+if __name__ == "__main__":
+    main()
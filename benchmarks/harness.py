@@ -0,0 +1,96 @@
+"""Timing, memory and report helpers shared by the benchmark scripts.
+
+Each case is timed call by call until it has run for at least `min_time`
+seconds and `min_runs` times, then summarized as latency percentiles (ms),
+ops/s and the peak RSS reached while it ran. Reports are JSON so two runs
+can be diffed with benchmarks/compare.py.
+"""
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def reset_peak_rss() -> None:
+    # Linux resets VmHWM to the current RSS on "5"; elsewhere the peak is process-wide.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            return int(re.search(r"VmHWM:\s+(\d+)", f.read()).group(1)) / 1024
+    except (OSError, AttributeError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summarize(samples: list[float]) -> dict:
+    ms = np.array(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "runs": len(samples),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "mean_ms": round(float(ms.mean()), 4),
+        "ops_per_s": round(len(samples) / sum(samples), 2) if sum(samples) else None,
+    }
+
+
+def measure(fn, min_time: float = 1.0, min_runs: int = 3, max_runs: int = 100_000, warmup: int = 1) -> dict:
+    """Time repeated calls of `fn()`."""
+    for _ in range(warmup):
+        fn()
+    reset_peak_rss()
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < min_runs or (time.perf_counter() - started < min_time and len(samples) < max_runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return {**summarize(samples), "peak_rss_mb": round(peak_rss_mb(), 1)}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_report(suite: str, results: list[dict], output: str | None, **settings) -> dict:
+    report = {
+        "suite": suite,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "settings": settings,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return report
+
+
+def progress(message: str) -> None:
+    print(message, file=sys.stderr, flush=True)
@@ -0,0 +1,234 @@
+"""Load generator for market_agent's POST /analyze.
+
+Open loop sends requests at a fixed rate whether or not earlier ones have
+answered, the way independent clients arrive; closed loop keeps a fixed
+number of clients each waiting for its answer before sending the next.
+Each --rps / --concurrency value is one stage, run in order, so a sweep
+shows where latency collapses.
+
+By default the app is started locally on the stub model and canned market
+data (benchmarks/loadtest_server.py); --url targets a running instance.
+
+    python benchmarks/loadtest.py open --rps 5 10 20 40 --duration 30
+    python benchmarks/loadtest.py closed --concurrency 1 8 32 --duration 30 --unique
+    python benchmarks/loadtest.py open --rps 10 --url http://127.0.0.1:8080 --output load.json
+
+For each stage the JSON report has offered and achieved throughput, latency
+percentiles of successful requests, error rate and status counts, the
+server's event-loop lag from /metrics (last 30s) and the generator's own
+loop lag and send lateness, which should stay small for the numbers to hold.
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+
+import httpx
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "market_agent"))
+
+from harness import progress, write_report  # noqa: E402
+from loop_lag import LoopLagMonitor  # noqa: E402
+
+QUERIES = (
+    "Analyze BTC/USD Price today",
+    "Analyze ETH/USD Price today",
+    "Analyze EUR/USD Price today",
+    "Analyze XAU/USD Price today",
+    "How is the market looking?",
+)
+SERVER_METRICS = ("event_loop", "analysis_coalescing", "response_cache", "candle_cache", "sessions")
+
+
+@dataclass
+class Sample:
+    started: float
+    latency: float
+    status: int | None
+    error: str | None
+    lateness: float
+
+
+class LoadTest:
+    def __init__(self, url: str, queries: list[str], unique: bool, timeout: float):
+        self.url = url.rstrip("/")
+        self.queries = queries
+        self.unique = unique
+        self.samples: list[Sample] = []
+        self._sent = 0
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=None),
+        )
+
+    def next_query(self) -> str:
+        query = self.queries[self._sent % len(self.queries)]
+        self._sent += 1
+        # A distinct query per request defeats the server's coalescing of identical ones.
+        return f"{query} (#{self._sent})" if self.unique else query
+
+    async def request(self, scheduled_at: float) -> None:
+        started = time.perf_counter()
+        status = error = None
+        try:
+            resp = await self.client.post(f"{self.url}/analyze", json={"query": self.next_query()})
+            status = resp.status_code
+            if status != 200:
+                error = f"HTTP {status}"
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+        self.samples.append(Sample(started, time.perf_counter() - started, status, error, started - scheduled_at))
+
+    async def open_loop(self, rps: float, duration: float, poisson: bool) -> None:
+        pending = set()
+        start = time.perf_counter()
+        next_at = start
+        while next_at < start + duration:
+            await asyncio.sleep(max(next_at - time.perf_counter(), 0))
+            task = asyncio.create_task(self.request(next_at))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            next_at += random.expovariate(rps) if poisson else 1 / rps
+        if pending:
+            await asyncio.wait(pending)
+
+    async def closed_loop(self, concurrency: int, duration: float, think: float) -> None:
+        end = time.perf_counter() + duration
+
+        async def client() -> None:
+            while time.perf_counter() < end:
+                await self.request(time.perf_counter())
+                if think:
+                    await asyncio.sleep(think)
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    async def server_metrics(self) -> dict | None:
+        try:
+            resp = await self.client.get(f"{self.url}/metrics")
+            resp.raise_for_status()
+        except httpx.HTTPError:
+            return None
+        metrics = resp.json()
+        return {name: metrics.get(name) for name in SERVER_METRICS}
+
+
+def stage_report(samples: list[Sample], window_start: float, window: float) -> dict:
+    measured = [s for s in samples if s.started >= window_start]
+    ok = [s for s in measured if s.error is None]
+    # Throughput counts answers arriving in the window, whenever they were sent.
+    answered = [
+        s for s in samples
+        if s.error is None and window_start <= s.started + s.latency <= window_start + window
+    ]
+    latencies = np.array([s.latency for s in ok]) * 1000
+    lateness = np.array([s.lateness for s in measured]) * 1000
+    statuses: dict[str, int] = {}
+    for s in measured:
+        key = str(s.status) if s.status is not None else s.error
+        statuses[key] = statuses.get(key, 0) + 1
+
+    def pct(values: np.ndarray, q: float) -> float | None:
+        return round(float(np.percentile(values, q)), 2) if len(values) else None
+
+    return {
+        "requests": len(measured),
+        "offered_rps": round(len(measured) / window, 2),
+        "throughput_rps": round(len(answered) / window, 2),
+        "error_rate": round(1 - len(ok) / len(measured), 4) if measured else 0.0,
+        "statuses": statuses,
+        "latency_ms": {
+            "p50": pct(latencies, 50), "p90": pct(latencies, 90), "p95": pct(latencies, 95),
+            "p99": pct(latencies, 99), "max": round(float(latencies.max()), 2) if len(latencies) else None,
+        },
+        "send_lateness_ms": {"p99": pct(lateness, 99), "max": round(float(lateness.max()), 2) if len(lateness) else None},
+    }
+
+
+async def run(args, url: str) -> list[dict]:
+    load = LoadTest(url, args.queries or list(QUERIES), args.unique, args.timeout)
+    generator_lag = LoopLagMonitor()
+    generator_lag.start()
+    results = []
+    try:
+        for level in (args.rps if args.mode == "open" else args.concurrency):
+            progress(f"{args.mode} loop, {level} {'rps' if args.mode == 'open' else 'clients'}")
+            load.samples = []
+            started = time.perf_counter()
+            if args.mode == "open":
+                await load.open_loop(level, args.warmup + args.duration, args.poisson)
+            else:
+                await load.closed_loop(level, args.warmup + args.duration, args.think)
+            results.append({
+                "mode": args.mode,
+                "rps" if args.mode == "open" else "concurrency": level,
+                **stage_report(load.samples, started + args.warmup, args.duration),
+                "server": await load.server_metrics(),
+                "generator_loop": generator_lag.stats(),
+            })
+    finally:
+        await generator_lag.stop()
+        await load.client.aclose()
+    return results
+
+
+def start_server(args) -> subprocess.Popen:
+    command = [sys.executable, os.path.join(HERE, "loadtest_server.py"), "--port", str(args.port),
+               "--llm-latency", str(args.llm_latency), "--http-latency", str(args.http_latency)]
+    if args.cold:
+        command.append("--cold")
+    server = subprocess.Popen(command)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"loadtest_server.py exited with {server.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{args.port}/health", timeout=1).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("loadtest_server.py did not come up within 60s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=("open", "closed"))
+    parser.add_argument("--rps", type=float, nargs="+", default=[5.0], help="open loop: request rate per stage")
+    parser.add_argument("--poisson", action="store_true", help="open loop: exponential gaps instead of even spacing")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8], help="closed loop: clients per stage")
+    parser.add_argument("--think", type=float, default=0.0, help="closed loop: pause between a client's requests")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds per stage")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before each stage")
+    parser.add_argument("--timeout", type=float, default=60.0, help="client timeout per request")
+    parser.add_argument("--queries", nargs="+", help="queries to rotate through")
+    parser.add_argument("--unique", action="store_true", help="make every query distinct")
+    parser.add_argument("--url", help="load this server instead of starting the stubbed app")
+    parser.add_argument("--port", type=int, default=8090, help="port for the stubbed app")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="stubbed app: seconds per model call")
+    parser.add_argument("--http-latency", type=float, default=0.05, help="stubbed app: seconds per market request")
+    parser.add_argument("--cold", action="store_true", help="stubbed app: disable the candle and response caches")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    server = None if args.url else start_server(args)
+    try:
+        results = asyncio.run(run(args, args.url or f"http://127.0.0.1:{args.port}"))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    settings = {k: v for k, v in vars(args).items() if k not in ("output", "port")}
+    write_report("loadtest", results, args.output, **settings)
+
+
+if __name__ == "__main__":
+    main()
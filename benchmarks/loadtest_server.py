@@ -0,0 +1,43 @@
+"""market_agent's FastAPI app on the stub model and canned market data.
+
+Serves the real app (routes, lifespan, /metrics) in one uvicorn process,
+with Gemini replaced by StubLlm and every market data request answered by
+CannedMarket. benchmarks/loadtest.py starts this itself; run it by hand to
+point other tools at it:
+
+    python benchmarks/loadtest_server.py --port 8090 --llm-latency 0.8 --http-latency 0.05
+"""
+import argparse
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, os.path.join(HERE, "..", "market_agent"))
+
+from replay.runner import prepare_environment  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="seconds per model call")
+    parser.add_argument("--http-latency", type=float, default=0.05, help="seconds per market data request")
+    parser.add_argument("--cold", action="store_true", help="disable the candle and response caches")
+    args = parser.parse_args()
+
+    # Before the app (and with it agent.py) is imported.
+    prepare_environment("replay", cold=args.cold)
+    import uvicorn
+
+    import agent
+    from app import app
+    from stubs import stub_market_agent
+
+    with stub_market_agent(agent, args.llm_latency, args.http_latency):
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
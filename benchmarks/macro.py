@@ -0,0 +1,77 @@
+"""End-to-end benchmark of market_agent.analyze_market, offline.
+
+Gemini is replaced by benchmarks/stubs.py's StubLlm and every market data
+request is answered by CannedMarket, so the numbers are the agent's own
+overhead plus whatever latency is injected. Each query is one case.
+
+    python benchmarks/macro.py --output macro.json
+    python benchmarks/macro.py --cold --llm-latency 0.5 --http-latency 0.05
+    python benchmarks/macro.py --fixture fixtures/btc.json "Analyze BTC/USD Price today"
+
+--cold turns off the candle and response caches, so every run fetches and
+calls the model; without it, repeated runs measure the warm path. With
+--fixture, a cassette recorded by `python -m replay record market_agent ...`
+is replayed instead of the stubs.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from harness import measure, progress, write_report  # noqa: E402
+from replay import Cassette, Latency  # noqa: E402
+from replay.runner import AgentTarget, cassette_session, prepare_environment  # noqa: E402
+
+QUERIES = (
+    "Analyze BTC/USD Price today",
+    "Analyze ETH/USD Price today",
+    "Analyze EUR/USD Price today",
+    "Analyze XAU/USD Price today",
+    # Names no single market, so it goes through the orchestrator.
+    "How is the market looking?",
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("queries", nargs="*", default=list(QUERIES))
+    parser.add_argument("--cold", action="store_true")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per model call")
+    parser.add_argument("--http-latency", type=float, default=0.0, help="seconds per HTTP exchange")
+    parser.add_argument("--fixture", help="replay this cassette instead of the stub model and canned market")
+    parser.add_argument("--min-time", type=float, default=3.0)
+    parser.add_argument("--min-runs", type=int, default=20)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    prepare_environment("replay", cold=args.cold)
+    target = AgentTarget("market_agent")
+    if args.fixture:
+        session = cassette_session(target, Cassette.load(args.fixture), "replay",
+                                   Latency(llm=args.llm_latency, http=args.http_latency))
+    else:
+        from stubs import stub_market_agent
+        session = stub_market_agent(target, args.llm_latency, args.http_latency)
+
+    loop = asyncio.new_event_loop()
+    results = []
+    with session as cassette:
+        for query in args.queries:
+            progress(f"  {query}")
+            stats = measure(lambda: loop.run_until_complete(target.module.analyze_market(query)),
+                            args.min_time, args.min_runs)
+            results.append({"name": "analyze_market", "query": query, **stats})
+        http_calls = cassette.http_calls
+    loop.close()
+
+    write_report(
+        "macro", results, args.output,
+        cold=args.cold, llm_latency=args.llm_latency, http_latency=args.http_latency,
+        fixture=args.fixture, http_calls=http_calls, llm_tokens=target.module.token_usage.stats(),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Micro-benchmarks for market_agent's per-request compute.
+
+Cases, each at every size in --sizes (bars):
+
+- calculate_ema / calculate_rsi on a list of closes
+- parse_binance / parse_alphavantage: JSON body to Candles, as in fetch_crypto_ohlc / fetch_fx_ohlc
+- parse_yahoo: yfinance DataFrame to Candles, as in fetch_xau_ohlc
+- indicator_snapshot: every snapshot indicator over the candles
+- crypto_snapshot: the full fetch_crypto_snapshot payload (4h indicators plus 1d/1w resampled)
+
+    python benchmarks/micro.py --output micro.json
+    python benchmarks/micro.py --sizes 200 10000 --cases calculate_ema parse_binance
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("ALPHAVANTAGE_API_KEY", "benchmark")
+
+from harness import measure, progress, write_report  # noqa: E402
+from market_agent import agent  # noqa: E402
+from market_agent.candles import Candles  # noqa: E402
+
+SIZES = (200, 10_000, 1_000_000)
+FOUR_HOURS_MS = 4 * 3600 * 1000
+
+
+def random_walk(bars: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """(ts, ohlc) for `bars` 4h candles."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.005, bars))
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    ts = 1_500_000_000_000 + np.arange(bars, dtype=np.int64) * FOUR_HOURS_MS
+    return ts, np.round(np.vstack([open_, high, low, close]), 2)
+
+
+def binance_body(ts: np.ndarray, ohlc: np.ndarray) -> bytes:
+    rows = [
+        [int(t), f"{o:.2f}", f"{h:.2f}", f"{l:.2f}", f"{c:.2f}", "0", int(t) + FOUR_HOURS_MS - 1,
+         "0", 0, "0", "0", "0"]
+        for t, o, h, l, c in zip(ts.tolist(), *ohlc.tolist())
+    ]
+    return json.dumps(rows).encode()
+
+
+def alphavantage_body(ohlc: np.ndarray) -> bytes:
+    # Daily bars, newest first as Alpha Vantage sends them.
+    dates = np.datetime_as_string(np.datetime64("1970-01-01") + np.arange(ohlc.shape[1]), unit="D")
+    series = {
+        d: {"1. open": f"{o:.5f}", "2. high": f"{h:.5f}", "3. low": f"{l:.5f}", "4. close": f"{c:.5f}"}
+        for d, o, h, l, c in zip(dates[::-1].tolist(), *ohlc[:, ::-1].tolist())
+    }
+    return json.dumps({"Meta Data": {"1. Information": "Forex Daily Prices"}, "Time Series FX (Daily)": series}).encode()
+
+
+def yahoo_frame(ts: np.ndarray, ohlc: np.ndarray) -> pd.DataFrame:
+    index = pd.DatetimeIndex(ts.astype("datetime64[ms]"), name="Date")
+    return pd.DataFrame({"Open": ohlc[0], "High": ohlc[1], "Low": ohlc[2], "Close": ohlc[3],
+                         "Volume": np.zeros(len(ts))}, index=index)
+
+
+def cases(bars: int) -> dict:
+    """Name -> zero-argument callable for one size. Inputs are built up front."""
+    ts, ohlc = random_walk(bars)
+    closes = ohlc[3].tolist()
+    candles = Candles(ts, np.ascontiguousarray(ohlc))
+    binance = binance_body(ts, ohlc)
+    alphavantage = alphavantage_body(ohlc)
+    frame = yahoo_frame(ts, ohlc)
+    return {
+        "calculate_ema": lambda: agent.calculate_ema(closes, 20),
+        "calculate_rsi": lambda: agent.calculate_rsi(closes, 14),
+        "parse_binance": lambda: Candles.from_binance(json.loads(binance)),
+        "parse_alphavantage": lambda: agent._parse_fx(json.loads(alphavantage), None),
+        "parse_yahoo": lambda: Candles.from_frame(frame),
+        "indicator_snapshot": lambda: agent._indicator_snapshot(candles),
+        "crypto_snapshot": lambda: agent._crypto_snapshot("BTCUSDT", candles),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--cases", nargs="+", help="only these cases (default: all)")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds to keep repeating each case")
+    parser.add_argument("--min-runs", type=int, default=3)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    results = []
+    for bars in args.sizes:
+        progress(f"building inputs for {bars} bars")
+        for name, fn in cases(bars).items():
+            if args.cases and name not in args.cases:
+                continue
+            progress(f"  {name}")
+            results.append({"name": name, "bars": bars, **measure(fn, args.min_time, args.min_runs)})
+    write_report("micro", results, args.output, sizes=args.sizes, min_time=args.min_time, min_runs=args.min_runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Soak test for market_agent's session store: memory should stay flat.
+
+Simulates N /analyze calls against the session service (create a session,
+append a user message and a model reply) and samples RSS as it goes.
+
+    python benchmarks/session_soak.py --requests 100000
+    python benchmarks/session_soak.py --requests 100000 --unbounded   # baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "market_agent"))
+
+from google.adk.events import Event  # noqa: E402
+from google.adk.sessions import InMemorySessionService  # noqa: E402
+from google.genai.types import Content, Part  # noqa: E402
+
+from session_store import create_session_service  # noqa: E402
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # Peak rather than current, but the best portable fallback.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def soak(requests: int, sample_every: int, unbounded: bool, max_sessions: int, db_url: str | None) -> dict:
+    if unbounded:
+        service = InMemorySessionService()
+    else:
+        service = create_session_service(db_url=db_url, max_sessions=max_sessions)
+
+    reply = "🌅 Crypto Market Outlook\n" + "- Notes: steady trend\n" * 20
+    samples = []
+    started = time.perf_counter()
+    for i in range(1, requests + 1):
+        session = await service.create_session(
+            app_name="market_agent", user_id="http_user", session_id=str(uuid.uuid4()),
+        )
+        for author, role, text in (("user", "user", "Analyze BTC/USD Price today"), ("CryptoAnalyst", "model", reply)):
+            event = Event(author=author, invocation_id=str(i), content=Content(role=role, parts=[Part(text=text)]))
+            await service.append_event(session, event)
+        if i % sample_every == 0:
+            samples.append({"requests": i, "rss_mb": round(rss_mb(), 1)})
+
+    result = {
+        "requests": requests,
+        "unbounded": unbounded,
+        "seconds": round(time.perf_counter() - started, 2),
+        "samples": samples,
+        "rss_growth_mb": round(samples[-1]["rss_mb"] - samples[0]["rss_mb"], 1) if samples else 0.0,
+    }
+    if not unbounded:
+        result["sessions"] = service.stats()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--sample-every", type=int, default=10_000)
+    parser.add_argument("--max-sessions", type=int, default=1000)
+    parser.add_argument("--db-url", help="e.g. sqlite:///soak.db to soak the SQLite backend")
+    parser.add_argument("--unbounded", action="store_true", help="plain InMemorySessionService baseline")
+    args = parser.parse_args()
+
+    result = asyncio.run(soak(args.requests, args.sample_every, args.unbounded, args.max_sessions, args.db_url))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
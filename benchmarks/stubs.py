@@ -0,0 +1,179 @@
+"""Offline stand-ins for Gemini and the market data APIs.
+
+- StubLlm plays every market_agent model: the orchestrator routes by
+  keyword, an analyst calls its snapshot tool and then writes fixed Notes.
+- CannedMarket is a replay cassette that makes up Binance klines, Alpha
+  Vantage FX_DAILY and Yahoo chart responses for whatever is asked, from
+  fake_binance's deterministic random walk.
+
+Install both with `stub_market_agent(target, ...)`, where target is
+anything with market_agent's `root_agent`: a replay.runner.AgentTarget, or
+the agent module itself.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import re
+import sys
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fake_binance import Market  # noqa: E402
+from replay import Cassette, Latency, ReplayMiss, patch_http  # noqa: E402
+
+DAY_MS = 86_400_000
+# Alpha Vantage "compact" is the last 100 days.
+FX_COMPACT_DAYS = 100
+FX_FULL_DAYS = 5000
+NOTES = "Momentum is steady with MACD histogram near zero; volatility is moderate and the higher timeframes agree."
+
+ROUTES = (
+    (("BTC", "ETH", "CRYPTO"), "CryptoAnalyst"),
+    (("EUR/USD", "FOREX", "FX"), "FXAnalyst"),
+    (("XAU", "GOLD"), "XAUAnalyst"),
+)
+
+
+def _query(llm_request: LlmRequest) -> str:
+    for content in llm_request.contents:
+        if content.role == "user":
+            for part in content.parts or []:
+                if part.text:
+                    return part.text
+    return ""
+
+
+def _tool_args(tool: str, query: str) -> dict:
+    upper = query.upper()
+    if tool == "fetch_crypto_snapshot":
+        return {"symbol": "ETHUSDT" if "ETH" in upper else "BTCUSDT"}
+    if tool == "fetch_fx_snapshot":
+        pair = re.search(r"\b([A-Z]{3})/([A-Z]{3})\b", upper)
+        return {"from_symbol": pair.group(1), "to_symbol": pair.group(2)} if pair else {"from_symbol": "EUR"}
+    return {}
+
+
+def _usage(llm_request: LlmRequest, text: str) -> types.GenerateContentResponseUsageMetadata:
+    prompt_chars = sum(len(str(c.model_dump(exclude_none=True))) for c in llm_request.contents)
+    return types.GenerateContentResponseUsageMetadata(
+        prompt_token_count=prompt_chars // 4, candidates_token_count=len(text) // 4 + 1,
+    )
+
+
+class StubLlm(BaseLlm):
+    """Scripted market_agent model, answering after `latency` seconds."""
+
+    model: str = "stub"
+    latency: float = 0.0
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        tools = llm_request.tools_dict
+        query = _query(llm_request)
+        last = (llm_request.contents[-1].parts or [None])[-1] if llm_request.contents else None
+        answered = last is not None and last.function_response is not None and last.function_response.name in tools
+
+        # Analysts get transfer_to_agent too; only an agent without a snapshot tool routes.
+        snapshot = next((t for t in tools if t.endswith("_snapshot")), None)
+        call = None
+        if snapshot is None and "transfer_to_agent" in tools:
+            agent = next((name for words, name in ROUTES if any(w in query.upper() for w in words)), "CryptoAnalyst")
+            call = types.FunctionCall(name="transfer_to_agent", args={"agent_name": agent})
+        elif snapshot is not None and not answered:
+            call = types.FunctionCall(name=snapshot, args=_tool_args(snapshot, query))
+        if call is not None:
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=call)]),
+                              usage_metadata=_usage(llm_request, call.name))
+            return
+
+        if stream:
+            for word in NOTES.split(" ")[:-1]:
+                yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=word + " ")]), partial=True)
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=NOTES)]),
+                          usage_metadata=_usage(llm_request, NOTES))
+
+
+def _fx_daily(market: Market, pair: str, days: int) -> dict:
+    today = int(time.time() * 1000) // DAY_MS * DAY_MS
+    series = {}
+    for i in range(days):
+        t, o, h, l, c, *_ = market.bar(pair, "1d", today - i * DAY_MS)
+        day = time.strftime("%Y-%m-%d", time.gmtime(t / 1000))
+        series[day] = {"1. open": o, "2. high": h, "3. low": l, "4. close": c}
+    return {"Meta Data": {"1. Information": "Forex Daily Prices (open, high, low, close)"},
+            "Time Series FX (Daily)": series}
+
+
+def _yahoo_chart(market: Market, symbol: str, q: dict) -> dict:
+    now = int(time.time())
+    end = int(q.get("period2", now))
+    start = int(q.get("period1", end - 365 * 86400))
+    first = (start * 1000 + DAY_MS - 1) // DAY_MS * DAY_MS
+    bars = [market.bar(symbol, "1d", t) for t in range(first, min(end, now) * 1000, DAY_MS)]
+    prices = {name: [float(bar[i]) for bar in bars] for i, name in ((1, "open"), (2, "high"), (3, "low"), (4, "close"))}
+    meta = {
+        "currency": "USD", "symbol": symbol, "exchangeName": "CMX", "fullExchangeName": "COMEX",
+        "instrumentType": "FUTURE", "firstTradeDate": 967003200, "regularMarketTime": now,
+        "hasPrePostMarketData": False, "gmtoffset": -14400, "timezone": "EDT",
+        "exchangeTimezoneName": "America/New_York", "regularMarketPrice": prices["close"][-1] if bars else 0.0,
+        "chartPreviousClose": prices["close"][0] if bars else 0.0, "priceHint": 2,
+        "dataGranularity": "1d", "range": "", "validRanges": ["1d", "5d", "1mo", "1y", "5y", "max"],
+    }
+    return {"chart": {"result": [{
+        "meta": meta,
+        "timestamp": [bar[0] // 1000 for bar in bars],
+        "indicators": {"quote": [{**prices, "volume": [0] * len(bars)}], "adjclose": [{"adjclose": prices["close"]}]},
+    }], "error": None}}
+
+
+class CannedMarket(Cassette):
+    """Cassette answering market data requests from a generated random walk."""
+
+    def __init__(self, seed: int = 0):
+        super().__init__()
+        self.market = Market(seed)
+
+    def next_http(self, method: str, url: str) -> dict:
+        parts = urlsplit(url)
+        q = dict(parse_qsl(parts.query))
+        headers = [["Content-Type", "application/json"]]
+        if parts.path == "/api/v3/klines":
+            body = self.market.klines(
+                q["symbol"], q.get("interval", "4h"),
+                int(q["startTime"]) if "startTime" in q else None,
+                int(q["endTime"]) if "endTime" in q else None,
+                min(int(q.get("limit", 500)), 1000),
+            )
+        elif parts.path == "/query" and q.get("function") == "FX_DAILY":
+            days = FX_FULL_DAYS if q.get("outputsize") == "full" else FX_COMPACT_DAYS
+            body = _fx_daily(self.market, q["from_symbol"] + q["to_symbol"], days)
+        elif parts.netloc == "fc.yahoo.com":
+            body, headers = "", [["Set-Cookie", "A3=stub; Max-Age=31536000; Domain=.yahoo.com; Path=/"]]
+        elif parts.path == "/v1/test/getcrumb":
+            body, headers = "stubcrumb", [["Content-Type", "text/plain"]]
+        elif parts.path.startswith("/v8/finance/chart/"):
+            body = _yahoo_chart(self.market, parts.path.rsplit("/", 1)[-1], q)
+        else:
+            raise ReplayMiss(f"no canned response for {method} {url}")
+        with self._lock:
+            self.http_calls += 1
+        text = body if isinstance(body, str) else json.dumps(body)
+        return {"status": 200, "headers": headers, "body": {"text": text}}
+
+
+@contextlib.contextmanager
+def stub_market_agent(target, llm_latency: float = 0.0, http_latency: float = 0.0, seed: int = 0):
+    """Run `target` (market_agent) on StubLlm and CannedMarket while open."""
+    llm = StubLlm(latency=llm_latency)
+    for agent in (target.root_agent, *target.root_agent.sub_agents):
+        agent.model = llm
+    market = CannedMarket(seed)
+    with patch_http(market, "replay", Latency(http=http_latency)):
+        yield market
@@ -0,0 +1,4 @@
+import os
+
+# market_agent/__init__.py imports agent.py, which requires these at import time.
+os.environ.setdefault("ALPHAVANTAGE_API_KEY", "test")
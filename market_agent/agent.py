@@ -1,27 +1,125 @@
-import requests
+import asyncio
+import logging
 import os
+import time
+from collections.abc import AsyncIterator
+from contextlib import aclosing
 import yfinance as yf
 import pandas as pd
+import numpy as np
 import uuid
 from google.adk.agents import Agent, LlmAgent
-from google.adk.sessions import InMemorySessionService
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.events import Event
 # from google.adk.apps import App
 from google.adk.runners import Runner
-from google.genai.types import Content, Part
+from google.genai.types import Content, FunctionCall, FunctionResponse, Part
 from dotenv import load_dotenv
 
+try:
+    from .backfill import PAGE_BARS, backfill, backfill_store
+    from .candle_cache import CandleCache
+    from .candle_store import CandleStore
+    from .candles import Candles
+    from .http_client import get_json, run_blocking
+    from .indicators import batch_indicators, indicator_fields, signal_fields
+    from .indicator_state import IndicatorStateStore, interval_ms
+    from .kline_feed import KlineFeed
+    from .llm_usage import TokenUsage
+    from .outlook import render, render_header
+    from .rate_limit import ProviderScheduler, TokenBucket, stale_fallback
+    from .resample import resample
+    from .response_cache import ResponseCache
+    from .router import KeywordRouter
+    from .session_store import create_session_service
+    from .singleflight import SingleFlight
+except ImportError:  # loaded as a top-level module by app.py / uvicorn
+    from backfill import PAGE_BARS, backfill, backfill_store
+    from candle_cache import CandleCache
+    from candle_store import CandleStore
+    from candles import Candles
+    from http_client import get_json, run_blocking
+    from indicators import batch_indicators, indicator_fields, signal_fields
+    from indicator_state import IndicatorStateStore, interval_ms
+    from kline_feed import KlineFeed
+    from llm_usage import TokenUsage
+    from outlook import render, render_header
+    from rate_limit import ProviderScheduler, TokenBucket, stale_fallback
+    from resample import resample
+    from response_cache import ResponseCache
+    from router import KeywordRouter
+    from session_store import create_session_service
+    from singleflight import SingleFlight
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Best model for fast iteration
 MODEL = "gemini-2.0-flash"
 ALPHAVANTAGE_API_KEY = os.environ["ALPHAVANTAGE_API_KEY"]
 
-def fetch_xau_ohlc(limit: int = 200) -> list:
+ALPHAVANTAGE_BASE_URL = os.environ.get("ALPHAVANTAGE_BASE_URL", "https://www.alphavantage.co")
+BINANCE_BASE_URL = os.environ.get("BINANCE_BASE_URL", "https://api.binance.com")
+
+# Upstream quotas. Alpha Vantage's free tier allows 5 calls/minute and 25/day;
+# Binance allows 6000 request weight per minute and a klines call weighs 2.
+# With RATE_LIMIT_DIR set, the buckets live there and all workers share them.
+RATE_LIMIT_DIR = os.environ.get("RATE_LIMIT_DIR")
+
+def _bucket(name: str, capacity: int, period: float) -> TokenBucket:
+    path = os.path.join(RATE_LIMIT_DIR, f"{name}.bucket") if RATE_LIMIT_DIR else None
+    return TokenBucket(capacity, period, path=path)
+
+alphavantage_limits = ProviderScheduler("alphavantage", [
+    _bucket("alphavantage-minute", int(os.environ.get("ALPHAVANTAGE_PER_MINUTE", "5")), 60),
+    _bucket("alphavantage-day", int(os.environ.get("ALPHAVANTAGE_PER_DAY", "25")), 86400),
+])
+binance_limits = ProviderScheduler("binance", [
+    _bucket("binance-minute", int(os.environ.get("BINANCE_WEIGHT_PER_MINUTE", "6000")), 60),
+])
+BINANCE_KLINES_WEIGHT = 2
+BINANCE_BACKFILL_CONCURRENCY = int(os.environ.get("BINANCE_BACKFILL_CONCURRENCY", "4"))
+# How long a request with cached data to fall back on will queue for quota.
+THROTTLE_MAX_WAIT_SECONDS = float(os.environ.get("THROTTLE_MAX_WAIT_SECONDS", "2"))
+
+async def _throttle(limits: ProviderScheduler, cost: float = 1) -> None:
+    max_wait = THROTTLE_MAX_WAIT_SECONDS if stale_fallback.get() else None
+    await limits.acquire(cost, max_wait=max_wait)
+
+indicator_states = IndicatorStateStore(os.environ.get("INDICATOR_STATE_PATH"))
+# Closed bars arriving within this many seconds share one write of the state file.
+INDICATOR_STATE_SAVE_DELAY = float(os.environ.get("INDICATOR_STATE_SAVE_DELAY_SECONDS", "1"))
+# Optional local history; when set, snapshots sync it incrementally and read from disk.
+candle_store = CandleStore(
+    os.environ["CANDLE_STORE_DIR"],
+    min_sync_seconds=float(os.environ.get("CANDLE_STORE_SYNC_SECONDS", "60")),
+) if os.environ.get("CANDLE_STORE_DIR") else None
+# Optional live mode: a kline websocket keeps the latest page of crypto
+# candles in memory, so snapshots skip the REST fetch.
+LIVE_FEED_INTERVAL = os.environ.get("LIVE_FEED_INTERVAL", "4h")
+live_feed = KlineFeed(
+    os.environ.get("BINANCE_STREAM_URL", "wss://stream.binance.com:9443"),
+    os.environ.get("LIVE_FEED_SYMBOLS", "BTCUSDT,ETHUSDT").split(","),
+    LIVE_FEED_INTERVAL,
+    backfill=lambda symbol, since: _klines_since(symbol, LIVE_FEED_INTERVAL, since),
+    capacity=PAGE_BARS,
+    # Keeps the streaming indicators current without any REST call.
+    on_close=lambda symbol, candles: _advance_crypto_state(symbol, LIVE_FEED_INTERVAL, candles),
+) if os.environ.get("LIVE_FEED") == "1" else None
+candle_cache = CandleCache(
+    max_entries=int(os.environ.get("CANDLE_CACHE_SIZE", "256")),
+    disk_dir=os.environ.get("CANDLE_CACHE_DIR"),
+    max_age=float(os.environ["CANDLE_CACHE_MAX_AGE"]) if "CANDLE_CACHE_MAX_AGE" in os.environ else None,
+    forming_max_age=float(os.environ.get("CANDLE_CACHE_FORMING_MAX_AGE", "60")),
+)
+
+def _download_xau(**window) -> Candles:
     df = yf.download(
         "GC=F",
-        period="1y",
         interval="1d",
         progress=False,
+        **window,
     )
 
     if df.empty:
@@ -30,56 +128,50 @@ def fetch_xau_ohlc(limit: int = 200) -> list:
     # Handle MultiIndex columns if present
     if isinstance(df.columns, pd.MultiIndex):
         df.columns = df.columns.get_level_values(0)
-    
-    df = df.tail(limit)
-    candles = []
-
-    for i in range(len(df)):
-        candles.append({
-            "open": float(df['Open'].iloc[i]),
-            "high": float(df['High'].iloc[i]),
-            "low": float(df['Low'].iloc[i]),
-            "close": float(df['Close'].iloc[i]),
-        })
-
-    return candles
-
-def fetch_fx_ohlc(from_symbol: str, to_symbol: str = "USD", limit: int = 200) -> list:
-    resp = requests.get(
-        "https://www.alphavantage.co/query",
-        params={
-            "function": "FX_DAILY",
-            "from_symbol": from_symbol,
-            "to_symbol": to_symbol,
-            "interval": "daily",
-            "apikey": ALPHAVANTAGE_API_KEY,
-            "outputsize": "compact",
-        },
-        timeout=15,
-    )
-    resp.raise_for_status()
-    data = resp.json()
 
+    return Candles.from_frame(df)
+
+def _xau_ohlc(limit: int) -> Candles:
+    return _download_xau(period="1y").tail(limit)
+
+@candle_cache.cached("yahoo", lambda a: ("GC=F", "1d", a["limit"]))
+async def fetch_xau_ohlc(limit: int = 200) -> Candles:
+    # yfinance has no async API; keep it off the event loop.
+    return await run_blocking(_xau_ohlc, limit)
+
+def _fx_params(from_symbol: str, to_symbol: str, outputsize: str = "compact") -> dict:
+    return {
+        "function": "FX_DAILY",
+        "from_symbol": from_symbol,
+        "to_symbol": to_symbol,
+        "interval": "daily",
+        "apikey": ALPHAVANTAGE_API_KEY,
+        "outputsize": outputsize,
+    }
+
+def _parse_fx(data: dict, limit: int | None) -> Candles:
     key = f"Time Series FX (Daily)"
     if key not in data:
         raise RuntimeError(f"Alpha Vantage FX error: {data}")
 
-    series = data[key]
+    return Candles.from_alpha_vantage(data[key], limit)
 
-    candles = []
-    for _, v in sorted(series.items())[-limit:]:
-        candles.append({
-            "open": float(v["1. open"]),
-            "high": float(v["2. high"]),
-            "low": float(v["3. low"]),
-            "close": float(v["4. close"]),
-        })
+@candle_cache.cached("alphavantage", lambda a: (f"{a['from_symbol']}{a['to_symbol']}", "1d", a["limit"]))
+async def fetch_fx_ohlc(from_symbol: str, to_symbol: str = "USD", limit: int = 200) -> Candles:
+    await _throttle(alphavantage_limits)
+    data = await get_json(
+        f"{ALPHAVANTAGE_BASE_URL}/query",
+        params=_fx_params(from_symbol, to_symbol),
+        timeout=15,
+    )
 
-    return candles
+    return _parse_fx(data, limit)
 
-def fetch_crypto_ohlc(symbol: str, interval: str = "4h", limit: int = 200) -> list:
-    resp = requests.get(
-        "https://api.binance.com/api/v3/klines",
+@candle_cache.cached("binance", lambda a: (a["symbol"], a["interval"], a["limit"]))
+async def fetch_crypto_ohlc(symbol: str, interval: str = "4h", limit: int = 200) -> Candles:
+    await _throttle(binance_limits, BINANCE_KLINES_WEIGHT)
+    data = await get_json(
+        f"{BINANCE_BASE_URL}/api/v3/klines",
         params={
             "symbol": symbol,
             "interval": interval,
@@ -87,18 +179,63 @@ def fetch_crypto_ohlc(symbol: str, interval: str = "4h", limit: int = 200) -> li
         },
         timeout=10,
     )
-    resp.raise_for_status()
-    data = resp.json()
-
-    candles = []
-    for k in data:
-        candles.append({
-            "open": float(k[1]),
-            "high": float(k[2]),
-            "low": float(k[3]),
-            "close": float(k[4]),
-        })
-    return candles
+
+    return Candles.from_binance(data)
+
+# Incremental fetchers for the candle store: everything from the bar that
+# opened at `since` onwards, or an initial history when `since` is None.
+
+async def _xau_since(since: int | None) -> Candles:
+    if since is None:
+        return await run_blocking(_download_xau, period="5y")
+    start = np.datetime64(since, "ms").astype("datetime64[D]")
+    return await run_blocking(_download_xau, start=str(start))
+
+async def _fx_since(from_symbol: str, to_symbol: str, since: int | None) -> Candles:
+    # "compact" covers the last 100 trading days; only go "full" past that.
+    recent = since is not None and time.time() * 1000 - since < 90 * 86_400_000
+    await _throttle(alphavantage_limits)
+    data = await get_json(
+        f"{ALPHAVANTAGE_BASE_URL}/query",
+        params=_fx_params(from_symbol, to_symbol, "compact" if recent else "full"),
+        timeout=15,
+    )
+    return _parse_fx(data, None)
+
+async def _klines_window(symbol: str, interval: str, start: int, end: int) -> Candles:
+    await _throttle(binance_limits, BINANCE_KLINES_WEIGHT)
+    data = await get_json(
+        f"{BINANCE_BASE_URL}/api/v3/klines",
+        params={"symbol": symbol, "interval": interval, "startTime": start, "endTime": end, "limit": PAGE_BARS},
+    )
+    return Candles.from_binance(data)
+
+def backfill_crypto(symbol: str, interval: str, start_ms: int, end_ms: int) -> AsyncIterator[Candles]:
+    """Stream Binance bars opening in [start_ms, end_ms), fetching pages in parallel."""
+    return backfill(
+        lambda start, end: _klines_window(symbol, interval, start, end),
+        start_ms, end_ms, interval, BINANCE_BACKFILL_CONCURRENCY,
+    )
+
+async def backfill_crypto_store(symbol: str, interval: str, start_ms: int, end_ms: int) -> int:
+    return await backfill_store(
+        candle_store, "binance", symbol, interval,
+        lambda start, end: _klines_window(symbol, interval, start, end),
+        start_ms, end_ms, BINANCE_BACKFILL_CONCURRENCY,
+    )
+
+async def _klines_since(symbol: str, interval: str, since: int | None) -> Candles:
+    if since is None:
+        # Initial history: the latest page.
+        await _throttle(binance_limits, BINANCE_KLINES_WEIGHT)
+        data = await get_json(
+            f"{BINANCE_BASE_URL}/api/v3/klines",
+            params={"symbol": symbol, "interval": interval, "limit": PAGE_BARS},
+        )
+        return Candles.from_binance(data)
+    # Catching up after a long gap may take several pages; fetch them in parallel.
+    pages = [page async for page in backfill_crypto(symbol, interval, since, int(time.time() * 1000) + 1)]
+    return Candles.concat(pages) if pages else Candles.from_binance([])
 
 def calculate_ema(values: list[float], period: int) -> float:
     k = 2 / (period + 1)
@@ -124,192 +261,241 @@ def calculate_rsi(values: list[float], period: int = 14) -> float:
     rsi = 100 - (100 / (1 + rs))
     return round(rsi, 2)
 
-def fetch_crypto_snapshot(symbol: str) -> dict:
-    candles = fetch_crypto_ohlc(symbol)
-    closes = [c["close"] for c in candles]
+def _indicator_snapshot(candles: Candles) -> dict:
+    fields = indicator_fields(candles.close, candles.high, candles.low)
+    signals = signal_fields(fields)
+    fields.pop("last")
+    fields.pop("trend_code")
+    return {**fields, **signals}
+
+# Bars behind each snapshot's own indicators; matches what the plain fetchers
+# used to return (Alpha Vantage's "compact" output is 100 days).
+SNAPSHOT_BARS = 200
+FX_SNAPSHOT_BARS = 100
+# History fetched per snapshot, enough to derive the higher timeframes too.
+# One Binance page of 4h bars is ~5.5 months; Yahoo's 1y download is ~250 days.
+CRYPTO_HISTORY_BARS = 1000
+FX_HISTORY_BARS = 200
+XAU_HISTORY_BARS = 260
+CRYPTO_TIMEFRAMES = ("1d", "1w")
+DAILY_TIMEFRAMES = ("1w",)
+# RSI14 needs 14 price changes.
+MIN_TIMEFRAME_BARS = 15
+
+def _timeframes_snapshot(history: Candles, intervals: tuple[str, ...]) -> dict:
+    """Indicators on higher timeframes resampled from the base history."""
+    out = {}
+    for interval in intervals:
+        bars = resample(history, interval).tail(SNAPSHOT_BARS)
+        if len(bars) >= MIN_TIMEFRAME_BARS:
+            out[interval] = _indicator_snapshot(bars)
+    return out
+
+async def _snapshot_candles(store_key: tuple[str, str, str], fetch_since, fetch_recent, bars: int) -> Candles:
+    """Read from the local candle store when enabled, otherwise fetch the recent window."""
+    if candle_store is None:
+        return await fetch_recent()
+    return (await candle_store.sync(*store_key, fetch_since)).tail(bars)
+
+async def crypto_snapshot_candles(symbol: str, interval: str = "4h") -> Candles:
+    if live_feed is not None and (candles := live_feed.candles(symbol, interval)) is not None:
+        return candles
+    return await _snapshot_candles(
+        ("binance", symbol, interval),
+        lambda since: _klines_since(symbol, interval, since),
+        lambda: fetch_crypto_ohlc(symbol, interval, CRYPTO_HISTORY_BARS),
+        CRYPTO_HISTORY_BARS,
+    )
 
-    return {
-        "symbol": symbol,
-        "last_price": closes[-1],
-        "ema20": calculate_ema(closes[-20:], 20),
-        "ema50": calculate_ema(closes[-50:], 50),
-        "rsi14": calculate_rsi(closes),
-        "high_recent": max(c["high"] for c in candles[-20:]),
-        "low_recent": min(c["low"] for c in candles[-20:]),
-    }
+async def fx_snapshot_candles(from_symbol: str, to_symbol: str = "USD") -> Candles:
+    return await _snapshot_candles(
+        ("alphavantage", f"{from_symbol}{to_symbol}", "1d"),
+        lambda since: _fx_since(from_symbol, to_symbol, since),
+        lambda: fetch_fx_ohlc(from_symbol, to_symbol, FX_HISTORY_BARS),
+        FX_HISTORY_BARS,
+    )
 
-def fetch_fx_snapshot(from_symbol: str, to_symbol: str = "USD") -> dict:
-    candles = fetch_fx_ohlc(from_symbol, to_symbol)
-    closes = [c["close"] for c in candles]
+async def xau_snapshot_candles() -> Candles:
+    return await _snapshot_candles(
+        ("yahoo", "GC=F", "1d"),
+        _xau_since,
+        lambda: fetch_xau_ohlc(XAU_HISTORY_BARS),
+        XAU_HISTORY_BARS,
+    )
 
-    return {
-        "pair": f"{from_symbol}/{to_symbol}",
-        "price": closes[-1],
-        "ema20": calculate_ema(closes[-20:], 20),
-        "ema50": calculate_ema(closes[-50:], 50),
-        "rsi14": calculate_rsi(closes),
-        "high_recent": max(c["high"] for c in candles[-20:]),
-        "low_recent": min(c["low"] for c in candles[-20:]),
-    }
+# Per snapshot tool: the price field's name, bars behind the indicators and
+# the higher timeframes.
+SNAPSHOT_SHAPES = {
+    "fetch_crypto_snapshot": ("last_price", SNAPSHOT_BARS, CRYPTO_TIMEFRAMES),
+    "fetch_fx_snapshot": ("price", FX_SNAPSHOT_BARS, DAILY_TIMEFRAMES),
+    "fetch_xau_snapshot": ("price", SNAPSHOT_BARS, DAILY_TIMEFRAMES),
+}
 
-def fetch_xau_snapshot() -> dict:
-    candles = fetch_xau_ohlc()
-    closes = [c["close"] for c in candles]
+def _build_snapshot(tool: str, header: dict, history: Candles, indicators: dict | None = None) -> dict:
+    """The payload `tool` returns for `history`.
+
+    `indicators` are the indicator_fields of the snapshot window when the
+    caller has computed them already (the batch run does, for all instruments
+    at once).
+    """
+    price_key, bars, timeframes = SNAPSHOT_SHAPES[tool]
+    if indicators is None:
+        candles = history.tail(bars)
+        indicators = indicator_fields(candles.close, candles.high, candles.low)
+    fields = dict(indicators)
+    signals = signal_fields(fields)
+    fields.pop("trend_code")
 
     return {
-        "pair": "XAU/USD",
-        "price": closes[-1],
-        "ema20": calculate_ema(closes[-20:], 20),
-        "ema50": calculate_ema(closes[-50:], 50),
-        "rsi14": calculate_rsi(closes),
-        "high_recent": max(c["high"] for c in candles[-20:]),
-        "low_recent": min(c["low"] for c in candles[-20:]),
+        **header,
+        price_key: fields.pop("last"),
+        **fields,
+        **signals,
+        "timeframes": _timeframes_snapshot(history, timeframes),
     }
 
+def _crypto_snapshot(symbol: str, history: Candles, indicators: dict | None = None) -> dict:
+    return _build_snapshot("fetch_crypto_snapshot", {"symbol": symbol}, history, indicators)
+
+def _fx_snapshot(from_symbol: str, to_symbol: str, history: Candles, indicators: dict | None = None) -> dict:
+    return _build_snapshot("fetch_fx_snapshot", {"pair": f"{from_symbol}/{to_symbol}"}, history, indicators)
+
+def _xau_snapshot(history: Candles, indicators: dict | None = None) -> dict:
+    return _build_snapshot("fetch_xau_snapshot", {"pair": "XAU/USD"}, history, indicators)
+
+async def fetch_crypto_snapshot(symbol: str) -> dict:
+    if live_feed is not None:
+        # Served from memory; recomputed only when a stream update arrived.
+        snapshot = live_feed.view(symbol, lambda history: _crypto_snapshot(symbol, history))
+        if snapshot is not None:
+            return snapshot
+    return _crypto_snapshot(symbol, await crypto_snapshot_candles(symbol))
+
+def _advance_crypto_state(symbol: str, interval: str, closed: Candles) -> dict:
+    """Apply the bars in `closed` that symbol/interval's streaming state hasn't seen.
+
+    Once warmed up this is one O(1) update per newly closed bar. If `closed`
+    starts after a gap in the state's history, the state is rebuilt from it.
+    """
+    state = indicator_states.get(symbol, interval)
+    step = interval_ms(interval)
+    new = closed[int(np.searchsorted(closed.ts, state.last_ts, side="right")):]
+    if state.bars and len(new) and int(new.ts[0]) - state.last_ts > step:
+        state = indicator_states.reset(symbol, interval)
+        new = closed
+    applied = sum(state.update(float(close), int(ts)) for close, ts in zip(new.close, new.ts))
+    if applied:
+        _schedule_state_save()
+
+    return {"symbol": symbol, "interval": interval, **state.snapshot()}
+
+_state_save: asyncio.Task | None = None
+
+def _schedule_state_save() -> None:
+    """Write the streaming state soon, on the blocking pool rather than the event loop."""
+    global _state_save
+    if indicator_states.path and (_state_save is None or _state_save.done()):
+        _state_save = asyncio.ensure_future(_save_states())
+
+async def _save_states() -> None:
+    global _state_save
+    await asyncio.sleep(INDICATOR_STATE_SAVE_DELAY)
+    # Updates from here on are not in this save, so they schedule another.
+    _state_save = None
+    try:
+        await run_blocking(indicator_states.save)
+    except OSError as e:
+        logger.warning("Saving indicator state failed: %s", e)
+
+async def flush_indicator_states() -> None:
+    """Write a save that is still waiting out its delay now, e.g. on shutdown."""
+    if _state_save is not None and not _state_save.done():
+        _state_save.cancel()
+        await run_blocking(indicator_states.save)
+
+async def refresh_crypto_state(symbol: str, interval: str = "4h") -> dict:
+    """Advance the streaming indicators for symbol/interval with newly closed candles.
+
+    Read from the live feed when it covers the symbol. Otherwise the first
+    call warms up from one page of candles, and later calls only fetch the
+    candles opened since the last applied one.
+    """
+    candles = live_feed.candles(symbol, interval) if live_feed is not None else None
+    if candles is None:
+        state = indicator_states.get(symbol, interval)
+        candles = await _klines_since(symbol, interval, state.last_ts if state.bars else None)
+    # A bar is closed once its full interval has passed.
+    now_ms = int(time.time() * 1000)
+    closed = candles[:int(np.searchsorted(candles.ts, now_ms - interval_ms(interval), side="right"))]
+    return _advance_crypto_state(symbol, interval, closed)
+
+async def fetch_fx_snapshot(from_symbol: str, to_symbol: str = "USD") -> dict:
+    return _fx_snapshot(from_symbol, to_symbol, await fx_snapshot_candles(from_symbol, to_symbol))
+
+async def fetch_xau_snapshot() -> dict:
+    return _xau_snapshot(await xau_snapshot_candles())
+
+# Shared by the analysts: identical snapshots get the same outlook back
+# without another model call.
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("RESPONSE_CACHE_SIZE", "512")),
+    ttl_seconds=float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", str(6 * 3600))),
+)
+token_usage = TokenUsage()
+
+# Shared analyst rules. Price, indicators, trend, volatility and bias are
+# computed into the snapshot and rendered by outlook.py; the model only
+# writes the Notes.
+NOTES_RULES = """
+    Rules:
+    - Use fetched data ONLY; do not invent indicators
+    - The reader already sees price, EMA20/EMA50, RSI14, trend, volatility and
+      bias from the snapshot; do not repeat, recompute or override them
+
+    Reply with the Notes only: 2-3 sentences on momentum (macd_hist),
+    volatility (atr_pct, bb_width) and whether the higher "timeframes" confirm
+    or conflict with the trend. No heading, no bullet list.
+"""
+
 xau_agent = Agent(
     name="XAUAnalyst",
     model=MODEL,
     tools=[fetch_xau_snapshot],
+    before_model_callback=response_cache.before_model,
+    after_model_callback=[token_usage.after_model, response_cache.after_model],
     instruction="""
     You are a professional XAU analyst.
 
-    Rules:
-    - You MAY call fetch_xau_snapshot when needed
-    - Analyze Forex only
-    - Use fetched data ONLY
-    - Do not invent technical indicators
-    - If only spot price is available, limit analysis to:
-    - Directional bias
-    - Volatility
-    - Spread quality
-
-    Interpretation rules:
-    - Trend:
-    - Bullish if price > EMA20 > EMA50 and RSI > 55
-    - Bearish if price < EMA20 < EMA50 and RSI < 45
-    - Otherwise Range
-    - Volatility:
-    - High if price is volatile (high recent range > 10%)
-    - Low if price is stable (high recent range < 5%)
-    - Spread quality:
-    - Good if spread is narrow (less than 1 pip)
-    - Bad if spread is wide (more than 10 pips)
-
-    Output format:
-
-    🌅 XAU Outlook
-
-    <XAU PAIR>:
-    - Price:
-    - EMA20 / EMA50:
-    - RSI14:
-    - Trend:
-    - Bias:
-    - Notes:
-
-    Bias must be ONE of:
-    - Buy
-    - Sell
-    - Wait
-    """
+    Call fetch_xau_snapshot for XAU/USD.
+    """ + NOTES_RULES,
 )
 
 fx_agent = Agent(
     name="FXAnalyst",
     model=MODEL,
     tools=[fetch_fx_snapshot],
+    before_model_callback=response_cache.before_model,
+    after_model_callback=[token_usage.after_model, response_cache.after_model],
     instruction="""
     You are a professional FX analyst.
 
-    Rules:
-    - You MAY call fetch_fx_snapshot when needed
-    - Analyze Forex only
-    - Use fetched data ONLY
-    - Do not invent technical indicators
-    - If only spot price is available, limit analysis to:
-    - Directional bias
-    - Volatility
-    - Spread quality
-
-    Interpretation rules:
-    - Trend:
-    - Bullish if price > EMA20 > EMA50 and RSI > 55
-    - Bearish if price < EMA20 < EMA50 and RSI < 45
-    - Otherwise Range
-    - Volatility:
-    - High if price is volatile (high recent range > 10%)
-    - Low if price is stable (high recent range < 5%)
-    - Spread quality:
-    - Good if spread is narrow (less than 1 pip)
-    - Bad if spread is wide (more than 10 pips)
-
-    Output format:
-
-    🌅 FX Market Outlook
-
-    <FOREX PAIR>:
-    - Price:
-    - EMA20 / EMA50:
-    - RSI14:
-    - Trend:
-    - Bias:
-    - Notes:
-
-    Bias must be ONE of:
-    - Buy
-    - Sell
-    - Wait
-    """
+    Call fetch_fx_snapshot for the pair in the query (EUR/USD → from_symbol EUR).
+    """ + NOTES_RULES,
 )
 
 crypto_agent = Agent(
     name="CryptoAnalyst",
     model=MODEL,
     tools=[fetch_crypto_snapshot],
+    before_model_callback=response_cache.before_model,
+    after_model_callback=[token_usage.after_model, response_cache.after_model],
     instruction="""
     You are a professional crypto technical analyst.
 
-    Supported assets:
-    - BTC/USD
-    - ETH/USD
-
-    Rules:
-    - Detect asset from user query:
+    Call fetch_crypto_snapshot with the asset from the query:
     - BTC → symbol BTCUSDT
     - ETH → symbol ETHUSDT
-    - Call fetch_crypto_snapshot with the correct symbol
-    - Use indicator data ONLY (EMA20, EMA50, RSI14)
-    - Do NOT invent indicators
-
-    Interpretation rules:
-    - Trend:
-    - Bullish if price > EMA20 > EMA50 and RSI > 55
-    - Bearish if price < EMA20 < EMA50 and RSI < 45
-    - Otherwise Range
-    - Volatility:
-    - High if price is volatile (high recent range > 10%)
-    - Low if price is stable (high recent range < 5%)
-    - Spread quality:
-    - Good if spread is narrow (less than 1 pip)
-    - Bad if spread is wide (more than 10 pips)
-
-    Output format:
-
-    🌅 Crypto Market Outlook
-
-    <ASSET>/USD:
-    - Price:
-    - EMA20 / EMA50:
-    - RSI14:
-    - Trend:
-    - Bias:
-    - Notes:
-
-    Bias must be ONE of:
-    - Buy
-    - Sell
-    - Wait
-    """
+    """ + NOTES_RULES,
 )
 
 root_agent = LlmAgent(
@@ -332,10 +518,15 @@ root_agent = LlmAgent(
     - ALWAYS delegate using transfer_to_agent
     - NEVER invent agent names
     """,
-    sub_agents=[fx_agent, crypto_agent, xau_agent] 
+    sub_agents=[fx_agent, crypto_agent, xau_agent],
+    after_model_callback=token_usage.after_model,
 )
 
-session_service = InMemorySessionService()
+session_service = create_session_service(
+    db_url=os.environ.get("SESSION_DB_URL"),
+    max_sessions=int(os.environ.get("SESSION_MAX_SESSIONS", "1000")),
+    ttl_seconds=float(os.environ.get("SESSION_TTL_SECONDS", "3600")),
+)
 
 runner = Runner(
     agent=root_agent,
@@ -343,28 +534,262 @@ runner = Runner(
     session_service=session_service,
 )
 
-async def analyze_market(user_input: str) -> str:
+# Runners rooted at each analyst, for queries the keyword router can place
+# without asking the orchestrator.
+analyst_runners = {
+    agent.name: Runner(agent=agent, app_name="market_agent", session_service=session_service)
+    for agent in (fx_agent, crypto_agent, xau_agent)
+}
+keyword_router = KeywordRouter()
+KEYWORD_ROUTING = os.environ.get("KEYWORD_ROUTING", "1") != "0"
+
+# Cloud Scheduler gives up after 320s; stop the agent before that.
+ANALYZE_TIMEOUT_SECONDS = float(os.environ.get("ANALYZE_TIMEOUT_SECONDS", "300"))
+MAX_CONCURRENT_ANALYSES = int(os.environ.get("MAX_CONCURRENT_ANALYSES", "8"))
+analysis_slots = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+
+def _stream_events(event) -> list[dict]:
+    """Translate one ADK event into the client-facing stream events."""
+    out = []
+    for call in event.get_function_calls():
+        if call.name == "transfer_to_agent":
+            out.append({"type": "route", "agent": (call.args or {}).get("agent_name"), "via": "orchestrator"})
+        else:
+            out.append({"type": "tool_call", "author": event.author, "name": call.name, "args": call.args})
+    for response in event.get_function_responses():
+        if response.name != "transfer_to_agent":
+            out.append({"type": "tool_result", "author": event.author, "name": response.name, "result": response.response})
+
+    text = "".join(
+        part.text for part in (getattr(event.content, "parts", None) or [])
+        if getattr(part, "text", None)
+    )
+    if text:
+        if event.partial:
+            out.append({"type": "text", "author": event.author, "text": text})
+        elif event.is_final_response():
+            out.append({"type": "message", "author": event.author, "text": text})
+    return out
+
+async def _agent_events(active_runner: Runner, message: Content, deadline: float,
+                        history: list[Event] = ()) -> AsyncIterator[dict]:
+    """Run one agent conversation in a fresh session, yielding stream events.
+
+    `history` is appended to the session before `message`. Holds one of the
+    analysis slots while running and raises TimeoutError at `deadline` (event
+    loop time). Only the agent's own steps count against the deadline, not
+    the time a consumer spends handling what we yield.
+    """
     user_id = "http_user"
     session_id = str(uuid.uuid4())
-    
-    await session_service.create_session(
-        app_name="market_agent",
-        user_id=user_id,
-        session_id=session_id,
-    )
 
-    message = Content(parts=[Part(text=user_input)])
+    async with asyncio.timeout_at(deadline):
+        await analysis_slots.acquire()
+    try:
+        session = await session_service.create_session(
+            app_name="market_agent",
+            user_id=user_id,
+            session_id=session_id,
+        )
+        for event in history:
+            await session_service.append_event(session, event)
+
+        events = active_runner.run_async(
+            user_id=user_id,
+            session_id=session_id,
+            new_message=message,
+            run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+        )
+        async with aclosing(events):
+            while True:
+                try:
+                    async with asyncio.timeout_at(deadline):
+                        event = await anext(events)
+                except StopAsyncIteration:
+                    break
+                for item in _stream_events(event):
+                    yield item
+    finally:
+        analysis_slots.release()
+
+async def analyze_market_events(user_input: str, timeout: float = ANALYZE_TIMEOUT_SECONDS) -> AsyncIterator[dict]:
+    """Run the agent and yield routing, tool and (partial) text events as they happen.
+
+    Ends with a "done" event carrying the full result. Raises TimeoutError
+    once `timeout` seconds have passed, queueing included.
+    """
+    message = Content(role="user", parts=[Part(text=user_input)])
+    deadline = asyncio.get_running_loop().time() + timeout
 
-    final_text = ""
+    agent_name = keyword_router.route(user_input) if KEYWORD_ROUTING else None
+    if agent_name:
+        yield {"type": "route", "agent": agent_name, "via": "keywords"}
+    active_runner = analyst_runners[agent_name] if agent_name else runner
 
-    for event in runner.run(
-        user_id=user_id,
-        session_id=session_id,
-        new_message=message,
-    ):
-        if event.is_final_response():
-            for part in getattr(event.content, "parts", []):
-                if hasattr(part, "text"):
-                    final_text += part.text
-
-    return final_text or "No output from agent"
\ No newline at end of file
+    final_text = ""
+    # Rendered outlook per analyst, waiting for the Notes the model writes.
+    headers: dict[str, str] = {}
+    async for item in _agent_events(active_runner, message, deadline):
+        if item["type"] == "tool_result" and (header := render_header(item["name"], item["result"])):
+            headers[item["author"]] = header
+            yield item
+            yield {"type": "text", "author": item["author"], "text": header}
+            continue
+        if item["type"] == "message":
+            if item["author"] in headers:
+                item = {**item, "text": headers.pop(item["author"]) + item["text"].strip()}
+            final_text += item["text"]
+        yield item
+
+    yield {"type": "done", "result": final_text or "No output from agent"}
+
+analysis_flights = SingleFlight()
+
+def normalize_query(user_input: str) -> str:
+    return " ".join(user_input.lower().split()).rstrip(" .?!")
+
+async def analyze_market(user_input: str, timeout: float = ANALYZE_TIMEOUT_SECONDS) -> str:
+    """Buffered analyze_market_events. Identical concurrent queries share one run."""
+    async def run() -> str:
+        result = ""
+        async for item in analyze_market_events(user_input, timeout):
+            if item["type"] == "done":
+                result = item["result"]
+        return result
+
+    return await analysis_flights.do(normalize_query(user_input), run)
+
+# Instruments the daily batch run covers: the analyst and its snapshot tool,
+# the tool's arguments, and how that tool gets its candles and builds its
+# payload.
+BATCH_INSTRUMENTS = {
+    "eurusd": {
+        "query": "Analyze EUR/USD Price today",
+        "agent": "FXAnalyst",
+        "tool": "fetch_fx_snapshot",
+        "args": {"from_symbol": "EUR", "to_symbol": "USD"},
+        "candles": fx_snapshot_candles,
+        "snapshot": _fx_snapshot,
+    },
+    "xauusd": {
+        "query": "Analyze XAU/USD Price today",
+        "agent": "XAUAnalyst",
+        "tool": "fetch_xau_snapshot",
+        "args": {},
+        "candles": xau_snapshot_candles,
+        "snapshot": _xau_snapshot,
+    },
+    "ethusd": {
+        "query": "Analyze ETH/USD Price today",
+        "agent": "CryptoAnalyst",
+        "tool": "fetch_crypto_snapshot",
+        "args": {"symbol": "ETHUSDT"},
+        "candles": crypto_snapshot_candles,
+        "snapshot": _crypto_snapshot,
+    },
+    "btcusd": {
+        "query": "Analyze BTC/USD Price today",
+        "agent": "CryptoAnalyst",
+        "tool": "fetch_crypto_snapshot",
+        "args": {"symbol": "BTCUSDT"},
+        "candles": crypto_snapshot_candles,
+        "snapshot": _crypto_snapshot,
+    },
+}
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))
+
+def _batch_snapshots(specs: list[dict], histories: list) -> list:
+    """Snapshots for every instrument, computing indicators once per bar count."""
+    snapshots = list(histories)  # fetch errors pass through as-is
+    candle_sets = {
+        i: history.tail(SNAPSHOT_SHAPES[specs[i]["tool"]][1])
+        for i, history in enumerate(histories)
+        if not isinstance(history, BaseException)
+    }
+    by_length: dict[int, list[int]] = {}
+    for i, candles in candle_sets.items():
+        by_length.setdefault(len(candles), []).append(i)
+
+    for indexes in by_length.values():
+        batch = batch_indicators(
+            np.stack([candle_sets[i].close for i in indexes]),
+            np.stack([candle_sets[i].high for i in indexes]),
+            np.stack([candle_sets[i].low for i in indexes]),
+        )
+        for row, i in enumerate(indexes):
+            spec = specs[i]
+            fields = {name: float(values[row]) for name, values in batch.items()}
+            snapshots[i] = spec["snapshot"](**spec["args"], history=histories[i], indicators=fields)
+    return snapshots
+
+def _tool_exchange(spec: dict, snapshot: dict) -> tuple[list[Event], Content]:
+    """The session the analyst would reach by calling its tool itself.
+
+    Returns the prior events (the query and the analyst's tool call) and the
+    tool's response carrying `snapshot`, to send as the new message. The
+    model then sees the same contents as on /analyze, so the response cache
+    recognises the snapshot.
+    """
+    call_id = f"batch-{uuid.uuid4()}"
+    history = [
+        Event(author="user", content=Content(role="user", parts=[Part(text=spec["query"])])),
+        Event(author=spec["agent"], content=Content(role="model", parts=[
+            Part(function_call=FunctionCall(id=call_id, name=spec["tool"], args=spec["args"])),
+        ])),
+    ]
+    response = Content(role="user", parts=[
+        Part(function_response=FunctionResponse(id=call_id, name=spec["tool"], response=snapshot)),
+    ])
+    return history, response
+
+async def analyze_instruments(keys: list[str], timeout: float = ANALYZE_TIMEOUT_SECONDS) -> dict:
+    """Analyze several instruments in one run.
+
+    Market data is fetched concurrently, indicators are computed in one
+    batched pass, and the analysts then run in parallel (at most
+    BATCH_CONCURRENCY at once) from a session where their tool call has
+    already been answered with the snapshot. Returns {key: {"snapshot",
+    "result"} or {"error"}}; a key given twice is analyzed once.
+    """
+    keys = list(dict.fromkeys(keys))
+    unknown = [key for key in keys if key not in BATCH_INSTRUMENTS]
+    if unknown:
+        raise ValueError(f"Unknown instruments: {unknown}; expected some of {list(BATCH_INSTRUMENTS)}")
+    deadline = asyncio.get_running_loop().time() + timeout
+    specs = [BATCH_INSTRUMENTS[key] for key in keys]
+
+    async with asyncio.timeout_at(deadline):
+        histories = await asyncio.gather(*(spec["candles"](**spec["args"]) for spec in specs), return_exceptions=True)
+    snapshots = _batch_snapshots(specs, histories)
+    batch_slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run_one(spec: dict, snapshot: dict) -> str:
+        history, message = _tool_exchange(spec, snapshot)
+        result = ""
+        async with batch_slots:
+            async for item in _agent_events(analyst_runners[spec["agent"]], message, deadline, history):
+                if item["type"] == "message":
+                    result += item["text"]
+        return render(spec["tool"], snapshot, result) if result else "No output from agent"
+
+    async def analyze_one(spec: dict, snapshot) -> dict:
+        if isinstance(snapshot, BaseException):
+            return {"error": f"Fetch failed: {snapshot}"}
+        try:
+            return {"snapshot": snapshot, "result": await run_one(spec, snapshot)}
+        except TimeoutError:
+            return {"snapshot": snapshot, "error": f"Timed out after {timeout:g}s"}
+        except Exception as e:
+            return {"snapshot": snapshot, "error": str(e)}
+
+    outcomes = await asyncio.gather(*(analyze_one(spec, snap) for spec, snap in zip(specs, snapshots)))
+    return dict(zip(keys, outcomes))
+
+def format_batch_report(results: dict) -> str:
+    sections = []
+    for key, outcome in results.items():
+        if "error" in outcome:
+            sections.append(f"❌ {key.upper()}: {outcome['error']}")
+        else:
+            sections.append(outcome["result"].strip())
+    return "\n\n".join(sections)
@@ -1,23 +1,176 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-from agent import analyze_market
-from telegram_notify import send_message
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
 
-app = FastAPI()
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, field_validator
+import agent
+from agent import (
+    ANALYZE_TIMEOUT_SECONDS,
+    BATCH_INSTRUMENTS,
+    analyze_instruments,
+    analyze_market,
+    analyze_market_events,
+    format_batch_report,
+)
+from telegram_notify import notifier, send_message
+import http_client
+from loop_lag import LoopLagMonitor
+from rate_limit import ADHOC, SCHEDULED, request_priority
+
+loop_lag = LoopLagMonitor(float(os.environ.get("LOOP_LAG_INTERVAL_SECONDS", "0.1")))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop_lag.start()
+    if agent.live_feed is not None:
+        agent.live_feed.start()
+    yield
+    if agent.live_feed is not None:
+        await agent.live_feed.stop()
+    await agent.flush_indicator_states()
+    await loop_lag.stop()
+    await notifier.stop()
+    await http_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+DISCONNECT_POLL_SECONDS = 0.5
+
+def set_request_priority(http_request: Request) -> None:
+    """Cloud Scheduler requests go ahead of ad-hoc ones in upstream API queues."""
+    scheduled = http_request.headers.get("x-cloudscheduler", "").lower() == "true"
+    request_priority.set(SCHEDULED if scheduled else ADHOC)
+
+class ClientDisconnected(Exception):
+    pass
+
+async def run_until_disconnect(request: Request, coro):
+    """Await `coro`, cancelling it if the HTTP client goes away first."""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise ClientDisconnected()
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
 
 class AnalyzeRequest(BaseModel):
     query: str
 
+class AnalyzeAllRequest(BaseModel):
+    instruments: list[str] = list(BATCH_INSTRUMENTS)
+
+    @field_validator("instruments")
+    @classmethod
+    def known_instruments(cls, instruments: list[str]) -> list[str]:
+        # Unknown keys are the caller's mistake: a 422, not a failed run and an alert.
+        unknown = [key for key in instruments if key not in BATCH_INSTRUMENTS]
+        if unknown:
+            raise ValueError(f"Unknown instruments: {unknown}; expected some of {list(BATCH_INSTRUMENTS)}")
+        # Each instrument is analyzed once, in the order first given.
+        return list(dict.fromkeys(instruments))
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics")
+def metrics():
+    return {
+        "sessions": agent.session_service.stats(),
+        "candle_cache": agent.candle_cache.stats(),
+        "fetch_coalescing": agent.candle_cache.inflight.stats(),
+        "analysis_coalescing": agent.analysis_flights.stats(),
+        "telegram": notifier.stats(),
+        "rate_limits": {
+            "alphavantage": agent.alphavantage_limits.stats(),
+            "binance": agent.binance_limits.stats(),
+        },
+        "router": agent.keyword_router.stats(),
+        "response_cache": agent.response_cache.stats(),
+        "llm_tokens": agent.token_usage.stats(),
+        "live_feed": agent.live_feed.stats() if agent.live_feed else None,
+        "candle_store": agent.candle_store.stats() if agent.candle_store else None,
+        "event_loop": loop_lag.stats(),
+    }
+
+@app.get("/indicators/{symbol}")
+async def indicators_endpoint(symbol: str, interval: str = "4h"):
+    """Streaming EMA20/EMA50/RSI14 for a Binance symbol, advanced by the bars closed since the last call."""
+    try:
+        return await agent.refresh_crypto_state(symbol.upper(), interval)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
 @app.post("/analyze")
-async def analyze_endpoint(request: AnalyzeRequest):
+async def analyze_endpoint(request: AnalyzeRequest, http_request: Request):
+    set_request_priority(http_request)
     try:
-        result = await analyze_market(request.query)
+        result = await run_until_disconnect(http_request, analyze_market(request.query))
         send_message(f"✅ market_agent\nQuery: {request.query}\nResult: {result}")
         return {"result": result}
+    except ClientDisconnected:
+        # Nobody is waiting for the answer any more.
+        return Response(status_code=499)
+    except TimeoutError:
+        error = f"Timed out after {ANALYZE_TIMEOUT_SECONDS:g}s"
+        send_message(f"❌ market_agent\nQuery: {request.query}\nError: {error}")
+        return JSONResponse({"error": error}, status_code=500)
     except Exception as e:
         send_message(f"❌ market_agent\nQuery: {request.query}\nError: {e}")
-        return {"error": str(e)}, 500
\ No newline at end of file
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+@app.post("/analyze-all")
+async def analyze_all_endpoint(request: AnalyzeAllRequest, http_request: Request):
+    """Analyze several instruments in one run and send a single consolidated notification."""
+    set_request_priority(http_request)
+    try:
+        results = await run_until_disconnect(http_request, analyze_instruments(request.instruments))
+        report = format_batch_report(results)
+        send_message(f"✅ market_agent\n{report}")
+        return {"results": results, "report": report}
+    except ClientDisconnected:
+        return Response(status_code=499)
+    except TimeoutError:
+        error = f"Timed out after {ANALYZE_TIMEOUT_SECONDS:g}s"
+        send_message(f"❌ market_agent\nInstruments: {request.instruments}\nError: {error}")
+        return JSONResponse({"error": error}, status_code=500)
+    except Exception as e:
+        send_message(f"❌ market_agent\nInstruments: {request.instruments}\nError: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+def _sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+@app.post("/analyze/stream")
+async def analyze_stream_endpoint(request: AnalyzeRequest, http_request: Request):
+    """Server-sent events: route, tool_call, tool_result, text, message, then done or error."""
+    set_request_priority(http_request)
+    async def stream():
+        try:
+            async for event in analyze_market_events(request.query):
+                if event["type"] == "done":
+                    send_message(f"✅ market_agent\nQuery: {request.query}\nResult: {event['result']}")
+                yield _sse(event)
+        except TimeoutError:
+            error = f"Timed out after {ANALYZE_TIMEOUT_SECONDS:g}s"
+            send_message(f"❌ market_agent\nQuery: {request.query}\nError: {error}")
+            yield _sse({"type": "error", "error": error})
+        except Exception as e:
+            send_message(f"❌ market_agent\nQuery: {request.query}\nError: {e}")
+            yield _sse({"type": "error", "error": str(e)})
+
+    # Starlette cancels the generator when the client disconnects.
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,92 @@
+"""Backfill kline history over a date range, one page-sized window at a time.
+
+A single Binance /api/v3/klines call returns at most 1000 bars. The range is
+split into windows of that many bars, which are fetched concurrently (each
+request still waits for weight from the provider's scheduler) and merged in
+open-time order with duplicates dropped. Pages stream out as soon as every
+earlier page is in, so a failure part-way leaves a usable prefix and the next
+run resumes after it.
+
+Usage (writes to CANDLE_STORE_DIR):
+
+    python backfill.py BTCUSDT 4h 2023-01-01 [2024-01-01]
+"""
+import asyncio
+import sys
+from collections import deque
+from typing import AsyncIterator
+
+import numpy as np
+
+try:
+    from .candles import Candles
+    from .indicator_state import interval_ms
+except ImportError:
+    from candles import Candles
+    from indicator_state import interval_ms
+
+PAGE_BARS = 1000
+
+
+def page_windows(start_ms: int, end_ms: int, interval: str, page_bars: int = PAGE_BARS) -> list[tuple[int, int]]:
+    """Split [start_ms, end_ms) into inclusive (start, end) windows of `page_bars` bars."""
+    step = interval_ms(interval) * page_bars
+    return [(start, min(start + step, end_ms) - 1) for start in range(start_ms, end_ms, step)]
+
+
+async def backfill(fetch_page, start_ms: int, end_ms: int, interval: str,
+                   concurrency: int = 4, page_bars: int = PAGE_BARS) -> AsyncIterator[Candles]:
+    """Yield bars opening in [start_ms, end_ms) in order, one page at a time.
+
+    `fetch_page(start, end)` is awaited for each window and must return the
+    bars opening within it. At most `concurrency` pages are in flight; a
+    failed page raises after all earlier pages have been yielded.
+    """
+    windows = deque(page_windows(start_ms, end_ms, interval, page_bars))
+    pending: deque[asyncio.Future] = deque()
+    last = start_ms - 1
+    try:
+        while windows or pending:
+            while windows and len(pending) < concurrency:
+                pending.append(asyncio.ensure_future(fetch_page(*windows.popleft())))
+            page = await pending.popleft()
+            page = page[int(np.searchsorted(page.ts, last, side="right")):int(np.searchsorted(page.ts, end_ms))]
+            if len(page):
+                last = int(page.ts[-1])
+                yield page
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def backfill_store(store, source: str, symbol: str, interval: str, fetch_page,
+                         start_ms: int, end_ms: int, concurrency: int = 4) -> int:
+    """Backfill into a CandleStore series and return the number of bars added.
+
+    The series only grows forward, so this starts from the newest stored bar
+    when there is one; rerunning after a failure picks up where it stopped.
+    """
+    last = store.last_ts(source, symbol, interval)
+    if last is not None:
+        start_ms = max(start_ms, last)
+    added = 0
+    async for page in backfill(fetch_page, start_ms, end_ms, interval, concurrency):
+        added += await asyncio.to_thread(store.append, source, symbol, interval, page)
+    return added
+
+
+def _parse_ms(value: str) -> int:
+    return int(np.datetime64(value, "ms").astype(np.int64))
+
+
+if __name__ == "__main__":
+    import time
+
+    import agent
+
+    if agent.candle_store is None:
+        sys.exit("CANDLE_STORE_DIR is not set")
+    symbol, interval, start = sys.argv[1:4]
+    end = _parse_ms(sys.argv[4]) if len(sys.argv) > 4 else int(time.time() * 1000) + 1
+    added = asyncio.run(agent.backfill_crypto_store(symbol, interval, _parse_ms(start), end))
+    print(f"{symbol} {interval}: {added} bars added")
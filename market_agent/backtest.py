@@ -0,0 +1,134 @@
+"""Backtest the analysts' trend rule over stored candle history.
+
+At every bar the indicators are computed exactly as a live snapshot would
+compute them from the trailing `window` bars (the same unrounded
+`ema_values` / `rsi_values` its trend_code is classified on), and the trend
+rule assigns Bullish, Bearish or Range. All bars of a symbol are evaluated
+at once over a sliding-window view; symbols are spread across a process
+pool.
+
+Per bias it reports how often the call was right `horizon` bars later
+(Bullish: price rose, Bearish: fell, Range: moved less than `range_band`),
+the mean directional return over that horizon (for Range, the mean absolute
+move), and the equity curve of holding the position one bar at a time while
+the bias lasts (long for Bullish, short for Bearish): total return and
+maximum drawdown.
+
+Reads series from a CandleStore (see backfill.py to load history):
+
+    python backtest.py --store ./candles --interval 4h BTCUSDT ETHUSDT
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    from .candle_store import CandleStore
+    from .candles import Candles
+    from .indicators import TREND_NAMES, ema_values, rsi_values, trend_codes
+except ImportError:
+    from candle_store import CandleStore
+    from candles import Candles
+    from indicators import TREND_NAMES, ema_values, rsi_values, trend_codes
+
+# Bars behind a live snapshot (agent.SNAPSHOT_BARS; FX uses 100).
+DEFAULT_WINDOW = 200
+
+
+def rolling_trend(close: np.ndarray, window: int = DEFAULT_WINDOW) -> np.ndarray:
+    """Trend code at each bar from `window - 1` on, as a snapshot taken at that bar would see it."""
+    if len(close) < window:
+        return np.empty(0, dtype=np.int8)
+    windows = sliding_window_view(np.asarray(close, dtype=np.float64), window)
+    return trend_codes(
+        windows[:, -1],
+        ema_values(windows, 20),
+        ema_values(windows, 50),
+        rsi_values(windows, 14),
+    )
+
+
+def _max_drawdown(returns: np.ndarray) -> float:
+    if not len(returns):
+        return 0.0
+    equity = np.cumprod(1 + returns)
+    peak = np.maximum.accumulate(np.r_[1.0, equity])[1:]
+    return float((equity / peak - 1).min())
+
+
+def backtest(candles: Candles, horizon: int = 1, window: int = DEFAULT_WINDOW, range_band: float = 0.01) -> dict:
+    """Per-bias hit rate, mean return, total return and max drawdown for one series."""
+    close = np.asarray(candles.close, dtype=np.float64)
+    trend = rolling_trend(close, window)
+    # Bars that have both a signal and a close `horizon` bars later.
+    start = window - 1
+    signals = trend[: max(0, len(close) - horizon - start)]
+    now = close[start : start + len(signals)]
+    forward = close[start + horizon : start + horizon + len(signals)] / now - 1
+    next_bar = close[start + 1 : start + 1 + len(signals)] / now - 1
+
+    report = {"bars": len(close), "signals": len(signals)}
+    for code, name in TREND_NAMES.items():
+        mask = signals == code
+        count = int(mask.sum())
+        if code == 0:
+            hits = np.abs(forward[mask]) < range_band
+            directional = np.abs(forward[mask])
+            held = np.zeros(0)
+        else:
+            directional = code * forward[mask]
+            hits = directional > 0
+            held = code * next_bar[mask]
+        report[name] = {
+            "count": count,
+            "hit_rate": round(float(hits.mean()), 4) if count else None,
+            "mean_return": round(float(directional.mean()), 6) if count else None,
+            "total_return": round(float(np.prod(1 + held) - 1), 6) if len(held) else None,
+            "max_drawdown": round(_max_drawdown(held), 6) if len(held) else None,
+        }
+    position = signals.astype(np.float64)
+    report["strategy"] = {
+        "total_return": round(float(np.prod(1 + position * next_bar) - 1), 6),
+        "max_drawdown": round(_max_drawdown(position * next_bar), 6),
+        "buy_and_hold": round(float(close[start + len(signals)] / close[start] - 1), 6) if len(signals) else None,
+    }
+    return report
+
+
+def _backtest_series(args: tuple) -> tuple[str, dict]:
+    root, source, symbol, interval, horizon, window, range_band = args
+    candles = CandleStore(root).read(source, symbol, interval)
+    return symbol, backtest(candles, horizon, window, range_band)
+
+
+def backtest_store(root: str, source: str, symbols: list[str], interval: str, horizon: int = 1,
+                   window: int = DEFAULT_WINDOW, range_band: float = 0.01, workers: int | None = None) -> dict:
+    """Backtest several stored series in parallel processes. Returns {symbol: report}."""
+    jobs = [(root, source, symbol, interval, horizon, window, range_band) for symbol in symbols]
+    if workers == 1 or len(jobs) == 1:
+        return dict(map(_backtest_series, jobs))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(_backtest_series, jobs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("symbols", nargs="+")
+    parser.add_argument("--store", default=os.environ.get("CANDLE_STORE_DIR"), help="candle store directory")
+    parser.add_argument("--source", default="binance")
+    parser.add_argument("--interval", default="4h")
+    parser.add_argument("--horizon", type=int, default=1, help="bars ahead used to score each call")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="bars behind each snapshot")
+    parser.add_argument("--range-band", type=float, default=0.01, help="max move for a Range call to count as a hit")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    if not args.store:
+        parser.error("--store or CANDLE_STORE_DIR is required")
+
+    results = backtest_store(args.store, args.source, args.symbols, args.interval,
+                             args.horizon, args.window, args.range_band, args.workers)
+    print(json.dumps(results, indent=2))
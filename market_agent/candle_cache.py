@@ -0,0 +1,257 @@
+"""Bar-close aware cache in front of the OHLC fetchers.
+
+Entries are keyed by (source, symbol, interval, limit) and expire when the
+next bar of that interval closes, since nothing before then can change the
+closed history. Payloads whose last bar is still forming (Binance's open
+candle, today's daily bar) carry the live price, so they only live for
+`forming_max_age` seconds. An in-process LRU tier is always on; an on-disk
+tier can be enabled so other processes and restarts reuse the same data.
+
+Disk entries are flat files that readers memory-map, so uvicorn workers on
+one machine share a single copy through the page cache. Each key has one
+writer at a time: a worker that misses takes an exclusive lock on the key's
+lock file, re-checks the disk, and only then fetches; workers missing at the
+same moment wait on the lock and read what the first one wrote. Files are
+replaced atomically, so readers never see a partial entry.
+"""
+import contextlib
+import functools
+import hashlib
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    from .candles import Candles
+    from .file_lock import locked
+    from .indicator_state import interval_ms
+    from .rate_limit import RateLimited, stale_fallback
+    from .singleflight import SingleFlight
+except ImportError:
+    from candles import Candles
+    from file_lock import locked
+    from indicator_state import interval_ms
+    from rate_limit import RateLimited, stale_fallback
+    from singleflight import SingleFlight
+
+# Providers publish a closed bar a little after the boundary.
+CLOSE_GRACE_SECONDS = 30
+# Lifetime of entries whose last bar is still open.
+FORMING_MAX_AGE_SECONDS = 60
+# Disk entry: expires_at (f8) and bar count (stored as f8), then ts, then ohlc.
+_HEADER_BYTES = 16
+
+
+def next_bar_close(interval: str, now: float) -> float:
+    """Epoch seconds of the next UTC-aligned close for `interval`."""
+    step = interval_ms(interval) / 1000
+    return (now // step + 1) * step
+
+
+def last_bar_forming(candles: Candles, interval: str, now: float) -> bool:
+    """Whether the last bar of `candles` has not closed yet at `now`."""
+    return len(candles) > 0 and int(candles.ts[-1]) + interval_ms(interval) > now * 1000
+
+
+def _freeze(candles: Candles) -> Candles:
+    # Cached arrays are shared between callers, so make them read-only.
+    candles.ts.flags.writeable = False
+    candles.ohlc.flags.writeable = False
+    return candles
+
+
+class CandleCache:
+    """Two-tier (memory LRU + optional disk) cache of Candles with hit/miss counters."""
+
+    def __init__(self, max_entries: int = 256, disk_dir: str | None = None,
+                 max_age: float | None = None, forming_max_age: float = FORMING_MAX_AGE_SECONDS,
+                 clock=time.time):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_age = max_age
+        self.forming_max_age = forming_max_age
+        self.clock = clock
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # Misses answered by another process's fetch while we waited on its lock.
+        self.shared_waits = 0
+        self.stale_served = 0
+        self._entries: OrderedDict[tuple, tuple[float, Candles]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Concurrent async misses for the same key share one upstream fetch.
+        self.inflight = SingleFlight()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def expires_at(self, interval: str, candles: Candles | None = None) -> float:
+        now = self.clock()
+        expiry = next_bar_close(interval, now) + CLOSE_GRACE_SECONDS
+        if candles is not None and last_bar_forming(candles, interval, now):
+            expiry = min(expiry, now + self.forming_max_age)
+        if self.max_age is not None:
+            expiry = min(expiry, now + self.max_age)
+        return expiry
+
+    def get(self, key: tuple) -> Candles | None:
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            # Expired entries stay until LRU eviction as a fallback for get_stale().
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        entry = self._load(key)
+        if entry is not None and entry[0] > now:
+            with self._lock:
+                self.disk_hits += 1
+                self._remember(key, entry)
+            return entry[1]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def get_stale(self, key: tuple) -> Candles | None:
+        """The last cached value for `key`, expired or not."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            entry = self._load(key)
+        return entry[1] if entry is not None else None
+
+    def put(self, key: tuple, candles: Candles, interval: str) -> None:
+        _freeze(candles)
+        entry = (self.expires_at(interval, candles), candles)
+        with self._lock:
+            self._remember(key, entry)
+        self._store(key, entry)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "shared_waits": self.shared_waits,
+                "stale_served": self.stale_served,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    def cached(self, source: str, key_fields):
+        """Decorate a fetcher so calls go through the cache.
+
+        `key_fields` maps the async fetcher's bound arguments (defaults
+        applied) to a (symbol, interval, limit) tuple. If the fetcher raises
+        RateLimited, the stale entry is served instead when there is one.
+        """
+        def decorator(fetch):
+            signature = inspect.signature(fetch)
+
+            def cache_key(args, kwargs) -> tuple:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                symbol, interval, limit = key_fields(bound.arguments)
+                return (source, symbol, interval, limit)
+
+            @functools.wraps(fetch)
+            async def wrapper(*args, **kwargs):
+                key = cache_key(args, kwargs)
+                candles = self.get(key)
+                if candles is not None:
+                    return candles
+                stale = self.get_stale(key)
+                # Lets a throttled fetcher give up instead of queueing.
+                token = stale_fallback.set(stale is not None)
+                try:
+                    return await self.inflight.do(key, lambda: fetch_and_put(key, args, kwargs))
+                except RateLimited:
+                    if stale is None:
+                        raise
+                    with self._lock:
+                        self.stale_served += 1
+                    return stale
+                finally:
+                    stale_fallback.reset(token)
+
+            async def fetch_and_put(key, args, kwargs):
+                async with self._writer(key) as candles:
+                    if candles is None:
+                        candles = await fetch(*args, **kwargs)
+                        self.put(key, candles, key[2])
+                return candles
+
+            return wrapper
+
+        return decorator
+
+    def _remember(self, key: tuple, entry: tuple[float, Candles]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key: tuple) -> str:
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.candles")
+
+    def _fresh_from_disk(self, key: tuple) -> Candles | None:
+        # Called holding the key's lock: another process may have just filled it.
+        entry = self._load(key)
+        if entry is None or entry[0] <= self.clock():
+            return None
+        with self._lock:
+            self.shared_waits += 1
+            self._remember(key, entry)
+        return entry[1]
+
+    @contextlib.asynccontextmanager
+    async def _writer(self, key: tuple):
+        """Hold the key's cross-process write lock; yields the entry if another process filled it meanwhile."""
+        if not self.disk_dir:
+            yield None
+            return
+        async with locked(self._path(key)):
+            yield self._fresh_from_disk(key)
+
+    def _load(self, key: tuple) -> tuple[float, Candles] | None:
+        if not self.disk_dir:
+            return None
+        try:
+            raw = np.memmap(self._path(key), dtype=np.uint8, mode="r")
+        except (OSError, ValueError):
+            return None
+        if len(raw) < _HEADER_BYTES:
+            return None
+        expires_at, bars = np.frombuffer(raw, dtype="<f8", count=2)
+        bars = int(bars)
+        if len(raw) != _HEADER_BYTES + bars * 40:
+            return None
+        ts = np.frombuffer(raw, dtype="<i8", count=bars, offset=_HEADER_BYTES)
+        ohlc = np.frombuffer(raw, dtype="<f8", count=4 * bars, offset=_HEADER_BYTES + 8 * bars).reshape(4, bars)
+        return float(expires_at), _freeze(Candles(ts, ohlc))
+
+    def _store(self, key: tuple, entry: tuple[float, Candles]) -> None:
+        if not self.disk_dir:
+            return
+        expires_at, candles = entry
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(np.array([expires_at, len(candles)], dtype="<f8").tobytes())
+            f.write(np.ascontiguousarray(candles.ts, dtype="<i8").tobytes())
+            f.write(np.ascontiguousarray(candles.ohlc, dtype="<f8").tobytes())
+        # Readers that already mapped the old file keep it until they drop it.
+        os.replace(tmp_path, path)
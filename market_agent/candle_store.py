@@ -0,0 +1,210 @@
+"""On-disk candle history per (source, symbol, interval) with incremental sync.
+
+Each series is one file of preallocated little-endian columns: a header
+(capacity and bar count, int64), then `capacity` open times (int64), then
+`capacity` opens, highs, lows and closes (float64), each column contiguous.
+New bars are written into every column and then published by bumping the
+bar count; the last bar is rewritten in place while it is still forming.
+When the columns are full the series moves to a file with twice the room.
+Reads memory-map the file and hand out Candles views without copying, so
+the (4 x bars) price block is the first `bars` of each preallocated row.
+
+Several processes can share a store directory: syncs of a series take its
+file lock, and the file's mtime records the last sync, so one worker fetches
+and the others just read. Intraday series are re-synced at most every
+`min_sync_seconds`; daily and longer ones not before their next bar close,
+which keeps quota-bound providers (Alpha Vantage) to about one call a day.
+"""
+import asyncio
+import os
+import re
+import struct
+import time
+
+import numpy as np
+
+try:
+    from .candle_cache import CLOSE_GRACE_SECONDS, next_bar_close
+    from .candles import Candles
+    from .file_lock import locked
+    from .indicator_state import interval_ms
+    from .rate_limit import RateLimited, stale_fallback
+    from .singleflight import SingleFlight
+except ImportError:
+    from candle_cache import CLOSE_GRACE_SECONDS, next_bar_close
+    from candles import Candles
+    from file_lock import locked
+    from indicator_state import interval_ms
+    from rate_limit import RateLimited, stale_fallback
+    from singleflight import SingleFlight
+
+# capacity, bars
+_HEADER = struct.Struct("<qq")
+_BAR_COUNT_OFFSET = 8
+MIN_CAPACITY = 1024
+_DAY_MS = 86_400_000
+
+
+def _file_size(capacity: int) -> int:
+    return _HEADER.size + 5 * 8 * capacity
+
+
+def _ohlc_offset(capacity: int) -> int:
+    return _HEADER.size + 8 * capacity
+
+
+def _write_columns(fd: int, capacity: int, start: int, candles: Candles) -> None:
+    os.pwrite(fd, np.ascontiguousarray(candles.ts, dtype="<i8").tobytes(), _HEADER.size + 8 * start)
+    for row in range(4):
+        offset = _ohlc_offset(capacity) + 8 * (row * capacity + start)
+        os.pwrite(fd, np.ascontiguousarray(candles.ohlc[row], dtype="<f8").tobytes(), offset)
+
+
+class CandleStore:
+    """Append-only, memory-mapped candle files under `root`."""
+
+    def __init__(self, root: str, min_sync_seconds: float = 60, clock=time.time):
+        self.root = root
+        self.min_sync_seconds = min_sync_seconds
+        self.clock = clock
+        self.syncs = 0
+        self.bars_appended = 0
+        self.stale_served = 0
+        self._series: set[tuple[str, str, str]] = set()
+        self._flights = SingleFlight()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, source: str, symbol: str, interval: str) -> str:
+        name = "_".join(re.sub(r"[^A-Za-z0-9=.-]", "-", part) for part in (source, symbol, interval))
+        return os.path.join(self.root, f"{name}.cols")
+
+    def _header(self, path: str) -> tuple[int, int]:
+        """(capacity, bars) of the series file, (0, 0) if there is none."""
+        try:
+            with open(path, "rb") as f:
+                raw = f.read(_HEADER.size)
+        except FileNotFoundError:
+            return 0, 0
+        return _HEADER.unpack(raw) if len(raw) == _HEADER.size else (0, 0)
+
+    def read(self, source: str, symbol: str, interval: str) -> Candles:
+        """All stored bars as a zero-copy, read-only view of the file."""
+        path = self.path(source, symbol, interval)
+        try:
+            raw = np.memmap(path, dtype=np.uint8, mode="r")
+        except (FileNotFoundError, ValueError):
+            return Candles(np.empty(0, dtype=np.int64), np.empty((4, 0)))
+        if len(raw) < _HEADER.size:
+            return Candles(np.empty(0, dtype=np.int64), np.empty((4, 0)))
+        capacity, bars = np.frombuffer(raw, dtype="<i8", count=2)
+        capacity, bars = int(capacity), int(bars)
+        ts = np.frombuffer(raw, dtype="<i8", count=bars, offset=_HEADER.size)
+        columns = np.frombuffer(raw, dtype="<f8", count=4 * capacity, offset=_ohlc_offset(capacity))
+        return Candles(ts, columns.reshape(4, capacity)[:, :bars])
+
+    def last_ts(self, source: str, symbol: str, interval: str) -> int | None:
+        path = self.path(source, symbol, interval)
+        _, bars = self._header(path)
+        if bars == 0:
+            return None
+        with open(path, "rb") as f:
+            f.seek(_HEADER.size + 8 * (bars - 1))
+            return int(np.frombuffer(f.read(8), dtype="<i8")[0])
+
+    def append(self, source: str, symbol: str, interval: str, candles: Candles) -> int:
+        """Store bars from `candles` not older than the last stored bar. Returns new bar count."""
+        path = self.path(source, symbol, interval)
+        last = self.last_ts(source, symbol, interval)
+        if last is not None:
+            candles = candles[int(np.searchsorted(candles.ts, last)):]
+        if not len(candles):
+            return 0
+
+        # The last stored bar was still forming; overwrite it.
+        overwrite = last is not None and candles.ts[0] == last
+        capacity, bars = self._header(path)
+        start = bars - int(overwrite)
+        end = start + len(candles)
+        if end > capacity:
+            capacity = max(MIN_CAPACITY, 2 * end)
+            self._move(path, self.read(source, symbol, interval)[:start], capacity)
+        fd = os.open(path, os.O_RDWR)
+        try:
+            _write_columns(fd, capacity, start, candles)
+            # Readers only look at the first `bars`, so publish the count last.
+            os.pwrite(fd, struct.pack("<q", end), _BAR_COUNT_OFFSET)
+        finally:
+            os.close(fd)
+        added = len(candles) - int(overwrite)
+        self.bars_appended += added
+        return added
+
+    def _move(self, path: str, kept: Candles, capacity: int) -> None:
+        """Replace the series file with one holding `kept` and room for `capacity` bars."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, _file_size(capacity))
+            _write_columns(fd, capacity, 0, kept)
+            os.pwrite(fd, _HEADER.pack(capacity, len(kept)), 0)
+        finally:
+            os.close(fd)
+        # Readers that already mapped the old file keep it until they drop it.
+        os.replace(tmp_path, path)
+
+    async def sync(self, source: str, symbol: str, interval: str, fetch_since) -> Candles:
+        """Bring the series up to date and return it.
+
+        `fetch_since(last_ts)` is awaited with the open time of the newest
+        stored bar (None when the store is empty) and must return Candles from
+        that bar onwards. Calls while the last sync (by any process) is still
+        fresh, or concurrent with one, skip the network. If the fetch is
+        rate limited and bars are already stored, those are returned.
+        """
+        key = (source, symbol, interval)
+        self._series.add(key)
+        if not self._synced_recently(key):
+            stored = self.last_ts(*key) is not None
+            # Lets a throttled fetcher give up instead of queueing.
+            token = stale_fallback.set(stored)
+            try:
+                await self._flights.do(key, lambda: self._sync(key, fetch_since))
+            except RateLimited:
+                if not stored:
+                    raise
+                self.stale_served += 1
+            finally:
+                stale_fallback.reset(token)
+        return self.read(*key)
+
+    def _fresh_until(self, interval: str, synced_at: float) -> float:
+        if interval_ms(interval) >= _DAY_MS:
+            return next_bar_close(interval, synced_at) + CLOSE_GRACE_SECONDS
+        return synced_at + self.min_sync_seconds
+
+    def _synced_recently(self, key: tuple[str, str, str]) -> bool:
+        try:
+            synced_at = os.stat(self.path(*key)).st_mtime
+        except FileNotFoundError:
+            return False
+        return self.clock() < self._fresh_until(key[2], synced_at)
+
+    async def _sync(self, key: tuple[str, str, str], fetch_since) -> None:
+        path = self.path(*key)
+        async with locked(path):
+            # Another process may have synced while we waited for the lock.
+            if self._synced_recently(key):
+                return
+            candles = await fetch_since(self.last_ts(*key))
+            await asyncio.to_thread(self.append, *key, candles)
+            if os.path.exists(path):
+                os.utime(path)
+            self.syncs += 1
+
+    def stats(self) -> dict:
+        return {
+            "series": len(self._series),
+            "syncs": self.syncs,
+            "bars_appended": self.bars_appended,
+            "stale_served": self.stale_served,
+        }
@@ -0,0 +1,90 @@
+"""Columnar OHLC container shared by the market data fetchers.
+
+Prices live in one (4 x bars) float64 block: contiguous when parsed from an
+API payload, the leading `bars` of each preallocated column when
+memory-mapped from the candle store. Either way each price column is
+contiguous, and column access and slicing a Candles never copy data.
+"""
+import numpy as np
+
+_BINANCE_OHLC = slice(1, 5)
+_ALPHA_VANTAGE_FIELDS = ("1. open", "2. high", "3. low", "4. close")
+
+
+class Candles:
+    """Struct-of-arrays OHLC candles with an int64 open-time column in epoch ms."""
+
+    __slots__ = ("ts", "ohlc")
+
+    def __init__(self, ts: np.ndarray, ohlc: np.ndarray):
+        if ohlc.shape != (4, len(ts)):
+            raise ValueError(f"Expected ohlc of shape (4, {len(ts)}), got {ohlc.shape}")
+        self.ts = ts
+        self.ohlc = ohlc
+
+    @property
+    def open(self) -> np.ndarray:
+        return self.ohlc[0]
+
+    @property
+    def high(self) -> np.ndarray:
+        return self.ohlc[1]
+
+    @property
+    def low(self) -> np.ndarray:
+        return self.ohlc[2]
+
+    @property
+    def close(self) -> np.ndarray:
+        return self.ohlc[3]
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def __getitem__(self, index: slice) -> "Candles":
+        if not isinstance(index, slice):
+            raise TypeError("Candles only supports slicing; index the columns for single values")
+        return Candles(self.ts[index], self.ohlc[:, index])
+
+    def tail(self, n: int) -> "Candles":
+        """The last `n` bars (all of them if there are fewer)."""
+        if n < 0:
+            raise ValueError(f"Expected a bar count >= 0, got {n}")
+        return self[len(self) - n:] if n < len(self) else self
+
+    def __repr__(self) -> str:
+        return f"Candles(bars={len(self)})"
+
+    @classmethod
+    def concat(cls, parts: list["Candles"]) -> "Candles":
+        if len(parts) == 1:
+            return parts[0]
+        return cls(np.concatenate([p.ts for p in parts]), np.concatenate([p.ohlc for p in parts], axis=1))
+
+    @classmethod
+    def from_frame(cls, df) -> "Candles":
+        """From a pandas frame with Open/High/Low/Close columns and a DatetimeIndex."""
+        values = df[["Open", "High", "Low", "Close"]].to_numpy(dtype=np.float64)
+        ts = df.index.values.astype("datetime64[ms]").astype(np.int64)
+        return cls(ts, np.ascontiguousarray(values.T))
+
+    @classmethod
+    def from_alpha_vantage(cls, series: dict, limit: int | None = None) -> "Candles":
+        """From an Alpha Vantage "Time Series" mapping of date -> OHLC fields."""
+        dates = sorted(series)
+        if limit is not None:
+            dates = dates[-limit:]
+        rows = [[series[d][field] for field in _ALPHA_VANTAGE_FIELDS] for d in dates]
+        ohlc = np.array(rows, dtype=np.float64).reshape(len(dates), 4)
+        ts = np.array(dates, dtype="datetime64[ms]").astype(np.int64)
+        return cls(ts, np.ascontiguousarray(ohlc.T))
+
+    @classmethod
+    def from_binance(cls, klines: list) -> "Candles":
+        """From a Binance /api/v3/klines payload."""
+        if not klines:
+            return cls(np.empty(0, dtype=np.int64), np.empty((4, 0)))
+        raw = np.array(klines, dtype=object)
+        ts = raw[:, 0].astype(np.int64)
+        ohlc = raw[:, _BINANCE_OHLC].astype(np.float64)
+        return cls(ts, np.ascontiguousarray(ohlc.T))
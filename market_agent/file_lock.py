@@ -0,0 +1,37 @@
+"""Exclusive advisory file locks for single-writer updates across processes.
+
+The lock is an flock on `<path>.lock`, released when the holder closes it or
+dies, so a crashed worker never leaves a key locked.
+"""
+import asyncio
+import contextlib
+import fcntl
+import os
+
+POLL_SECONDS = 0.05
+
+
+@contextlib.asynccontextmanager
+async def locked(path: str):
+    fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        # Poll rather than block a thread in flock, so cancellation stays clean.
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(POLL_SECONDS)
+        yield
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def locked_blocking(path: str):
+    fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
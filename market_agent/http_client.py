@@ -0,0 +1,82 @@
+"""Shared async HTTP client and blocking-call pool for the market data fetchers.
+
+One pooled httpx.AsyncClient (keep-alive, bounded connections) per event
+loop is reused for every Binance / Alpha Vantage request made from it, with
+an extra per-host cap so one slow provider cannot take every connection. Libraries
+without an async API (yfinance) run in a small bounded thread pool instead of
+on the event loop.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlsplit
+
+import httpx
+
+MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "50"))
+MAX_CONNECTIONS_PER_HOST = int(os.environ.get("HTTP_MAX_CONNECTIONS_PER_HOST", "10"))
+KEEPALIVE_SECONDS = float(os.environ.get("HTTP_KEEPALIVE_SECONDS", "30"))
+BLOCKING_WORKERS = int(os.environ.get("BLOCKING_WORKERS", "4"))
+
+# Connections are bound to the loop that opened them, so each loop has its own client.
+_clients: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+_host_limits: dict[tuple[asyncio.AbstractEventLoop, str], asyncio.Semaphore] = {}
+_blocking_pool = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking")
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the pooled client for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        _forget_closed_loops()
+        client = _clients[loop] = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_SECONDS,
+            ),
+            timeout=httpx.Timeout(10.0, connect=5.0),
+        )
+    return client
+
+
+def _forget_closed_loops() -> None:
+    # A loop closed without aclose() left its client unusable; nothing can await it now.
+    for loop in [loop for loop in _clients if loop.is_closed()]:
+        del _clients[loop]
+    for key in [key for key in _host_limits if key[0].is_closed()]:
+        del _host_limits[key]
+
+
+def _host_limit(url: str) -> asyncio.Semaphore:
+    key = (asyncio.get_running_loop(), urlsplit(url).netloc)
+    if key not in _host_limits:
+        _host_limits[key] = asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST)
+    return _host_limits[key]
+
+
+async def get_json(url: str, params: dict | None = None, timeout: float = 10) -> object:
+    """GET `url` through the shared client and decode the JSON body."""
+    client = get_client()
+    async with _host_limit(url):
+        resp = await client.get(url, params=params, timeout=timeout)
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking callable in the bounded thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_blocking_pool, partial(fn, *args, **kwargs))
+
+
+async def aclose() -> None:
+    """Close the running loop's client."""
+    loop = asyncio.get_running_loop()
+    client = _clients.pop(loop, None)
+    for key in [key for key in _host_limits if key[0] is loop]:
+        del _host_limits[key]
+    if client is not None:
+        await client.aclose()
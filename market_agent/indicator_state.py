@@ -0,0 +1,166 @@
+"""Incremental EMA / RSI state that advances one closed candle at a time.
+
+Unlike the snapshot path, which recomputes everything from the last 200
+candles, this keeps recursive EMAs seeded from the first close and Wilder
+smoothed RSI averages, so each new bar is O(1) regardless of history length.
+"""
+import base64
+import json
+import os
+import struct
+import tempfile
+import threading
+
+try:
+    from .indicators import price_decimals
+except ImportError:
+    from indicators import price_decimals
+
+EMA_PERIODS = (20, 50)
+RSI_PERIOD = 14
+
+_UNIT_MS = {"m": 60_000, "h": 3_600_000, "d": 86_400_000, "w": 604_800_000}
+
+# bars, last_ts, prev_close, ema20, ema50, avg_gain, avg_loss
+_STATE_FORMAT = struct.Struct("<qqddddd")
+
+
+def interval_ms(interval: str) -> int:
+    """Length of a Binance-style interval such as "15m", "4h" or "1d" in milliseconds."""
+    return int(interval[:-1]) * _UNIT_MS[interval[-1]]
+
+
+class StreamingIndicators:
+    """EMA20 / EMA50 / RSI14 for one symbol and interval."""
+
+    __slots__ = ("bars", "last_ts", "prev_close", "ema20", "ema50", "avg_gain", "avg_loss")
+
+    def __init__(self):
+        self.bars = 0
+        self.last_ts = -1
+        self.prev_close = 0.0
+        self.ema20 = 0.0
+        self.ema50 = 0.0
+        # Running sums until RSI_PERIOD changes are seen, Wilder averages after.
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    def update(self, close: float, ts: int | None = None) -> bool:
+        """Apply one closed candle. Returns False if `ts` was already applied."""
+        if ts is not None:
+            if ts <= self.last_ts:
+                return False
+            self.last_ts = ts
+
+        if self.bars == 0:
+            self.ema20 = self.ema50 = close
+        else:
+            k20 = 2 / (EMA_PERIODS[0] + 1)
+            k50 = 2 / (EMA_PERIODS[1] + 1)
+            self.ema20 = close * k20 + self.ema20 * (1 - k20)
+            self.ema50 = close * k50 + self.ema50 * (1 - k50)
+
+            diff = close - self.prev_close
+            gain = max(diff, 0)
+            loss = abs(min(diff, 0))
+            changes = self.bars  # price changes seen including this one
+            if changes <= RSI_PERIOD:
+                self.avg_gain += gain
+                self.avg_loss += loss
+                if changes == RSI_PERIOD:
+                    self.avg_gain /= RSI_PERIOD
+                    self.avg_loss /= RSI_PERIOD
+            else:
+                self.avg_gain = (self.avg_gain * (RSI_PERIOD - 1) + gain) / RSI_PERIOD
+                self.avg_loss = (self.avg_loss * (RSI_PERIOD - 1) + loss) / RSI_PERIOD
+
+        self.prev_close = close
+        self.bars += 1
+        return True
+
+    @property
+    def ready(self) -> bool:
+        return self.bars > RSI_PERIOD
+
+    def rsi(self) -> float:
+        if self.avg_loss == 0:
+            return 100.0
+        rs = self.avg_gain / self.avg_loss
+        return round(100 - (100 / (1 + rs)), 2)
+
+    def snapshot(self) -> dict:
+        decimals = price_decimals(self.prev_close)
+        return {
+            "last_price": self.prev_close,
+            "ema20": round(self.ema20, decimals),
+            "ema50": round(self.ema50, decimals),
+            "rsi14": self.rsi(),
+            "bars": self.bars,
+        }
+
+    def to_bytes(self) -> bytes:
+        return _STATE_FORMAT.pack(
+            self.bars, self.last_ts, self.prev_close,
+            self.ema20, self.ema50, self.avg_gain, self.avg_loss,
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "StreamingIndicators":
+        state = cls()
+        (state.bars, state.last_ts, state.prev_close,
+         state.ema20, state.ema50, state.avg_gain, state.avg_loss) = _STATE_FORMAT.unpack(data)
+        return state
+
+
+class IndicatorStateStore:
+    """StreamingIndicators keyed by (symbol, interval), optionally persisted to a file.
+
+    Point INDICATOR_STATE_PATH at a mounted volume (e.g. a GCS bucket on Cloud
+    Run) to keep state across instance restarts.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._states: dict[tuple[str, str], StreamingIndicators] = {}
+        self._lock = threading.Lock()
+        # Saves write in the order they read the states, so an older one never lands last.
+        self._save_lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def get(self, symbol: str, interval: str) -> StreamingIndicators:
+        with self._lock:
+            return self._states.setdefault((symbol, interval), StreamingIndicators())
+
+    def reset(self, symbol: str, interval: str) -> StreamingIndicators:
+        with self._lock:
+            state = self._states[(symbol, interval)] = StreamingIndicators()
+            return state
+
+    def load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        with self._lock:
+            for key, blob in raw.items():
+                symbol, interval = key.split("|", 1)
+                self._states[(symbol, interval)] = StreamingIndicators.from_bytes(base64.b64decode(blob))
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                raw = {
+                    f"{symbol}|{interval}": base64.b64encode(state.to_bytes()).decode("ascii")
+                    for (symbol, interval), state in self._states.items()
+                }
+            # A temp file of our own: other workers save to the same path.
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", prefix=".indicator-state-")
+            try:
+                os.fchmod(fd, 0o644)
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(raw, f, separators=(",", ":"))
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
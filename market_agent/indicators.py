@@ -0,0 +1,230 @@
+"""Batched technical indicators over a (symbols x bars) matrix of prices.
+
+EMA and RSI reproduce the scalar `calculate_ema` / `calculate_rsi` in
+agent.py bit for bit: recurrences step along the bar axis in the same order
+as the scalar loops and only the symbol axis is vectorized, so the float
+results are identical. Rounding is for display only: the trend rule reads
+the unrounded values, since 2 decimals is a whole trend's worth of EUR/USD.
+
+`batch_indicators` computes everything in one pass along the bar axis,
+sharing the previous close, the 20-bar window and the MACD EMAs between
+indicators instead of walking the arrays once per indicator. Windowed
+statistics are slice reductions; only the recurrences loop over bars.
+"""
+import numpy as np
+
+RECENT_BARS = 20
+BOLLINGER_BARS = 20
+ATR_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+
+
+def _as_matrix(values) -> np.ndarray:
+    arr = np.asarray(values, dtype=np.float64)
+    if arr.ndim == 1:
+        arr = arr[np.newaxis, :]
+    if arr.ndim != 2 or arr.shape[1] == 0:
+        raise ValueError(f"Expected a non-empty (symbols x bars) array, got shape {arr.shape}")
+    return arr
+
+
+def _round2(values: np.ndarray) -> np.ndarray:
+    # Python's round() is correctly rounded; np.round is not always the same.
+    return np.array([round(float(v), 2) for v in values], dtype=np.float64)
+
+
+def price_decimals(price: float) -> int:
+    """Decimals that keep 6 significant digits of `price`, and at least 2."""
+    if not np.isfinite(price) or price == 0:
+        return 2
+    return max(2, 5 - int(np.floor(np.log10(abs(price)))))
+
+
+def _round_price(values: np.ndarray, prices: np.ndarray) -> np.ndarray:
+    # EMAs in price units: BTC to the cent, EUR/USD to the pip and beyond.
+    return np.array([round(float(v), price_decimals(float(p))) for v, p in zip(values, prices)], dtype=np.float64)
+
+
+def _round_sig(values: np.ndarray, digits: int = 4) -> np.ndarray:
+    # Price-unit values (MACD, ATR) span BTC to EUR/USD scales; keep significant digits.
+    return np.array([float(f"{float(v):.{digits}g}") for v in values], dtype=np.float64)
+
+
+def ema_values(closes, period: int) -> np.ndarray:
+    """Unrounded EMA of the last `period` bars per row, seeded from the first value of that window."""
+    window = _as_matrix(closes)[:, -period:]
+    k = 2 / (period + 1)
+    ema = window[:, 0].copy()
+    for j in range(1, window.shape[1]):
+        ema = window[:, j] * k + ema * (1 - k)
+    return ema
+
+
+def _rsi(sum_gain: np.ndarray, sum_loss: np.ndarray, period: int) -> np.ndarray:
+    avg_gain = sum_gain / period
+    avg_loss = sum_loss / period
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - (100 / (1 + avg_gain / avg_loss))
+    return np.where(avg_loss == 0, 100.0, rsi)
+
+
+def rsi_values(closes, period: int = 14) -> np.ndarray:
+    """Unrounded RSI per row from the simple average of the first `period` price changes."""
+    arr = _as_matrix(closes)
+    change = np.diff(arr[:, :period + 1], axis=1)
+    if not change.shape[1]:
+        return _rsi(np.zeros(arr.shape[0]), np.zeros(arr.shape[0]), period)
+    # cumsum accumulates left to right like sum(), keeping results identical to calculate_rsi.
+    sum_gain = np.cumsum(np.maximum(change, 0), axis=1)[:, -1]
+    sum_loss = np.cumsum(np.abs(np.minimum(change, 0)), axis=1)[:, -1]
+    return _rsi(sum_gain, sum_loss, period)
+
+
+def ema_last(closes, period: int) -> np.ndarray:
+    """`ema_values` rounded to 2 decimals, as calculate_ema returns it."""
+    return _round2(ema_values(closes, period))
+
+
+def rsi_seed(closes, period: int = 14) -> np.ndarray:
+    """`rsi_values` rounded to 2 decimals, as calculate_rsi returns it."""
+    return _round2(rsi_values(closes, period))
+
+
+def _columns(matrix: np.ndarray) -> list:
+    # For one row, plain floats: ufunc calls on 1-element arrays cost more than the arithmetic.
+    return matrix[0].tolist() if matrix.shape[0] == 1 else list(matrix.T)
+
+
+def _as_row(value) -> np.ndarray:
+    return np.atleast_1d(np.asarray(value, dtype=np.float64))
+
+
+def batch_indicators(closes, highs, lows) -> dict:
+    """All snapshot indicators for every row in a single pass over the bars.
+
+    All three inputs are (symbols x bars) arrays with the same shape. Returns a
+    dict of 1-D arrays, one value per symbol:
+
+    - last, rsi14: the last close and `rsi_seed`
+    - ema20, ema50: `ema_values`, to 6 significant digits of the last close
+      (at least 2 decimals, so `ema_last` for anything priced from 1000 up)
+    - trend_code: `trend_codes` on the unrounded values
+    - macd, macd_signal, macd_hist: EMA12 - EMA26 over all bars and its EMA9
+    - atr14, atr_pct: Wilder's average true range, absolute and % of last close
+    - bb_width: Bollinger band width (4 standard deviations of the last 20
+      closes) as % of their mean
+    - high_recent, low_recent, range_pct: last 20 bars' extremes and their
+      spread as % of the last close
+    """
+    closes = _as_matrix(closes)
+    highs = _as_matrix(highs)
+    lows = _as_matrix(lows)
+    if not (closes.shape == highs.shape == lows.shape):
+        raise ValueError("closes, highs and lows must have the same shape")
+
+    rows, bars = closes.shape
+    ema20_start = max(0, bars - 20)
+    ema50_start = max(0, bars - 50)
+    k20, k50 = 2 / 21, 2 / 51
+    k_fast, k_slow, k_signal = 2 / (MACD_FAST + 1), 2 / (MACD_SLOW + 1), 2 / (MACD_SIGNAL + 1)
+
+    rsi = rsi_values(closes)
+
+    prev = closes[:, :-1]
+    high, low = highs[:, 1:], lows[:, 1:]
+    true_range = np.maximum(high - low, np.maximum(np.abs(high - prev), np.abs(low - prev)))
+    seed_bars = min(ATR_PERIOD, bars - 1)
+    if seed_bars:
+        atr = np.cumsum(true_range[:, :seed_bars], axis=1)[:, -1] / seed_bars
+    else:
+        atr = highs[:, 0] - lows[:, 0]
+
+    high_recent = highs[:, -RECENT_BARS:].max(axis=1)
+    low_recent = lows[:, -RECENT_BARS:].min(axis=1)
+    window = closes[:, -BOLLINGER_BARS:]
+    mean = window.mean(axis=1)
+    std = window.std(axis=1)
+
+    c = _columns(closes)
+    tr = _columns(true_range) if bars > ATR_PERIOD + 1 else []
+    if rows == 1:
+        atr = float(atr[0])
+    ema20 = c[ema20_start]
+    ema50 = c[ema50_start]
+    ema_fast = ema_slow = c[0]
+    signal = 0.0 if rows == 1 else np.zeros(rows)
+    for j in range(1, bars):
+        close = c[j]
+        if j > ema20_start:
+            ema20 = close * k20 + ema20 * (1 - k20)
+        if j > ema50_start:
+            ema50 = close * k50 + ema50 * (1 - k50)
+        ema_fast = close * k_fast + ema_fast * (1 - k_fast)
+        ema_slow = close * k_slow + ema_slow * (1 - k_slow)
+        signal = (ema_fast - ema_slow) * k_signal + signal * (1 - k_signal)
+        if j > ATR_PERIOD:
+            atr = (atr * (ATR_PERIOD - 1) + tr[j - 1]) / ATR_PERIOD
+    ema20, ema50, ema_fast, ema_slow, signal, atr = map(_as_row, (ema20, ema50, ema_fast, ema_slow, signal, atr))
+
+    last = closes[:, -1]
+    macd = ema_fast - ema_slow
+
+    return {
+        "last": last,
+        "ema20": _round_price(ema20, last),
+        "ema50": _round_price(ema50, last),
+        "rsi14": _round2(rsi),
+        "trend_code": trend_codes(last, ema20, ema50, rsi),
+        "macd": _round_sig(macd),
+        "macd_signal": _round_sig(signal),
+        "macd_hist": _round_sig(macd - signal),
+        "atr14": _round_sig(atr),
+        "atr_pct": _round2(atr / last * 100),
+        "bb_width": _round2(4 * std / mean * 100),
+        "high_recent": high_recent,
+        "low_recent": low_recent,
+        "range_pct": _round2((high_recent - low_recent) / last * 100),
+    }
+
+
+def indicator_fields(closes, highs, lows) -> dict:
+    """Indicators for a single symbol as plain floats, ready for a snapshot dict."""
+    batch = batch_indicators(closes, highs, lows)
+    return {name: float(values[0]) for name, values in batch.items()}
+
+
+TREND_NAMES = {1: "Bullish", -1: "Bearish", 0: "Range"}
+
+
+def trend_codes(last, ema20, ema50, rsi14) -> np.ndarray:
+    """The analysts' trend rule, elementwise: 1 Bullish, -1 Bearish, 0 Range.
+
+    Bullish if price > EMA20 > EMA50 and RSI > 55, Bearish if
+    price < EMA20 < EMA50 and RSI < 45, otherwise Range.
+    """
+    last, ema20, ema50, rsi14 = (np.asarray(a, dtype=np.float64) for a in (last, ema20, ema50, rsi14))
+    bullish = (last > ema20) & (ema20 > ema50) & (rsi14 > 55)
+    bearish = (last < ema20) & (ema20 < ema50) & (rsi14 < 45)
+    return bullish.astype(np.int8) - bearish.astype(np.int8)
+
+
+BIAS_BY_TREND = {"Bullish": "Buy", "Bearish": "Sell", "Range": "Wait"}
+
+
+def volatility_class(range_pct: float) -> str:
+    """High above a 10% recent range, Low below 5%, otherwise Normal."""
+    if range_pct > 10:
+        return "High"
+    if range_pct < 5:
+        return "Low"
+    return "Normal"
+
+
+def signal_fields(fields: dict) -> dict:
+    """Trend, volatility class and bias for one symbol's `indicator_fields`."""
+    trend = TREND_NAMES[int(fields["trend_code"])]
+    return {
+        "trend": trend,
+        "volatility": volatility_class(fields["range_pct"]),
+        "bias": BIAS_BY_TREND[trend],
+    }
@@ -0,0 +1,192 @@
+"""Live candles from a Binance-style kline websocket stream.
+
+A background task subscribes to `<symbol>@kline_<interval>` for each symbol
+and keeps the latest bars per symbol in a fixed-size ring buffer. On every
+(re)connect the rings are topped up from REST first, so they never have
+gaps. Snapshot requests then read candles from memory instead of polling.
+"""
+import asyncio
+import json
+import logging
+import time
+
+import numpy as np
+import websockets
+
+try:
+    from .candles import Candles
+except ImportError:
+    from candles import Candles
+
+logger = logging.getLogger(__name__)
+
+
+class CandleRing:
+    """The newest `capacity` candles in preallocated arrays.
+
+    Every bar is written twice, at i and i + capacity, so the live window is
+    always one contiguous slice and reading it never copies.
+    """
+
+    __slots__ = ("capacity", "size", "version", "_ts", "_ohlc", "_last")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.size = 0
+        self.version = 0
+        self._ts = np.zeros(2 * capacity, dtype=np.int64)
+        self._ohlc = np.zeros((4, 2 * capacity))
+        self._last = -1
+
+    @property
+    def last_ts(self) -> int | None:
+        return int(self._ts[self._last]) if self.size else None
+
+    def update(self, ts: int, o: float, h: float, l: float, c: float) -> bool:
+        """Add a bar, or replace the newest one if it has the same open time. Older bars are ignored."""
+        if self.size and ts < self._ts[self._last]:
+            return False
+        if not self.size or ts > self._ts[self._last]:
+            self._last = (self._last + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+        for i in (self._last, self._last + self.capacity):
+            self._ts[i] = ts
+            self._ohlc[:, i] = (o, h, l, c)
+        self.version += 1
+        return True
+
+    def extend(self, candles: Candles) -> None:
+        for ts, o, h, l, c in zip(candles.ts, *candles.ohlc):
+            self.update(int(ts), float(o), float(h), float(l), float(c))
+
+    def view(self) -> Candles:
+        """The buffered candles, oldest first. Valid until the next update."""
+        end = self._last + self.capacity + 1
+        return Candles(self._ts[end - self.size:end], self._ohlc[:, end - self.size:end])
+
+
+class KlineFeed:
+    """Background websocket consumer filling one CandleRing per symbol.
+
+    `backfill(symbol, since)` is awaited on every connect with the open time
+    of the newest buffered bar (None when empty) and must return the candles
+    from there on. `on_close(symbol, candles)`, if given, is called with the
+    buffered candles up to and including a bar the stream reports closed,
+    once per bar even if the stream repeats the close after a reconnect.
+    """
+
+    def __init__(self, base_url: str, symbols: list[str], interval: str, backfill,
+                 capacity: int = 1000, max_silence: float = 60, reconnect_delay: float = 1.0,
+                 on_close=None):
+        self.base_url = base_url.rstrip("/")
+        self.interval = interval
+        self.backfill = backfill
+        self.on_close = on_close
+        self.max_silence = max_silence
+        self.reconnect_delay = reconnect_delay
+        self.rings = {symbol.upper(): CandleRing(capacity) for symbol in symbols}
+        self.connected = False
+        self.messages = 0
+        self.reconnects = 0
+        self.last_message = 0.0
+        self._views: dict[str, tuple[int, object]] = {}
+        # Open time of the last bar passed to on_close, per symbol.
+        self._closed: dict[str, int] = {}
+        self._task: asyncio.Task | None = None
+
+    @property
+    def url(self) -> str:
+        streams = "/".join(f"{symbol.lower()}@kline_{self.interval}" for symbol in self.rings)
+        return f"{self.base_url}/stream?streams={streams}"
+
+    def live(self, symbol: str) -> bool:
+        ring = self.rings.get(symbol.upper())
+        return (
+            ring is not None and ring.size > 0 and self.connected
+            and time.monotonic() - self.last_message < self.max_silence
+        )
+
+    def candles(self, symbol: str, interval: str | None = None) -> Candles | None:
+        """A copy of the symbol's live candles, or None if the feed can't answer for it."""
+        if (interval or self.interval) != self.interval or not self.live(symbol):
+            return None
+        view = self.rings[symbol.upper()].view()
+        return Candles(view.ts.copy(), view.ohlc.copy())
+
+    def view(self, symbol: str, build):
+        """`build(candles)` over the live candles, memoized until the next update. None if not live."""
+        if not self.live(symbol):
+            return None
+        symbol = symbol.upper()
+        ring = self.rings[symbol]
+        cached = self._views.get(symbol)
+        if cached is None or cached[0] != ring.version:
+            cached = (ring.version, build(ring.view()))
+            self._views[symbol] = cached
+        return cached[1]
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.connected = False
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with websockets.connect(self.url) as ws:
+                    # Subscribe before backfilling so no bar falls in between;
+                    # the stream's copies of backfilled bars just overwrite them.
+                    for symbol, ring in self.rings.items():
+                        ring.extend(await self.backfill(symbol, ring.last_ts))
+                    self.connected = True
+                    self.last_message = time.monotonic()
+                    async for raw in ws:
+                        self._handle(raw)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Kline stream error: %s", e)
+            self.connected = False
+            self.reconnects += 1
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _handle(self, raw: str | bytes) -> None:
+        message = json.loads(raw)
+        data = message.get("data", message)
+        kline = data.get("k") if isinstance(data, dict) else None
+        if not kline:
+            return
+        symbol = str(kline["s"]).upper()
+        ring = self.rings.get(symbol)
+        if ring is None:
+            return
+        ts = int(kline["t"])
+        applied = ring.update(ts, float(kline["o"]), float(kline["h"]), float(kline["l"]), float(kline["c"]))
+        self.messages += 1
+        self.last_message = time.monotonic()
+        if applied and kline.get("x") and self.on_close is not None and ts > self._closed.get(symbol, -1):
+            self._closed[symbol] = ts
+            view = ring.view()
+            closed = view[:int(np.searchsorted(view.ts, ts, side="right"))]
+            try:
+                self.on_close(symbol, closed)
+            except Exception as e:
+                logger.warning("Kline close handler error: %s", e)
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "messages": self.messages,
+            "reconnects": self.reconnects,
+            "seconds_since_message": round(time.monotonic() - self.last_message, 1) if self.last_message else None,
+            "symbols": {symbol: {"bars": ring.size, "last_ts": ring.last_ts} for symbol, ring in self.rings.items()},
+        }
@@ -0,0 +1,41 @@
+"""Per-agent LLM token accounting from the model's usage metadata.
+
+Hooked in as an ADK after_model callback, so replies served by the response
+cache (which skip the model) are not counted.
+"""
+import threading
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmResponse
+
+
+class TokenUsage:
+    """Prompt / completion token totals per agent."""
+
+    def __init__(self):
+        self._agents: dict[str, dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def after_model(self, callback_context: CallbackContext, llm_response: LlmResponse) -> LlmResponse | None:
+        usage = llm_response.usage_metadata
+        if llm_response.partial or usage is None:
+            return None
+        with self._lock:
+            totals = self._agents.setdefault(
+                callback_context.agent_name, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+            )
+            totals["calls"] += 1
+            totals["prompt_tokens"] += usage.prompt_token_count or 0
+            totals["completion_tokens"] += usage.candidates_token_count or 0
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    **totals,
+                    "prompt_per_call": round(totals["prompt_tokens"] / totals["calls"], 1),
+                    "completion_per_call": round(totals["completion_tokens"] / totals["calls"], 1),
+                }
+                for name, totals in self._agents.items()
+            }
@@ -0,0 +1,51 @@
+"""Event-loop lag: how late a periodic timer fires.
+
+A task sleeps `interval` seconds at a time and records how much longer than
+that the sleep actually took. Anything holding the loop (CPU-bound indicator
+work, a blocking call that slipped onto it) shows up as lag, and every
+request waiting on the loop waits that long too.
+"""
+import asyncio
+import time
+from collections import deque
+
+
+class LoopLagMonitor:
+    """Samples lag every `interval` seconds; stats cover the last `window` samples (30s by default)."""
+
+    def __init__(self, interval: float = 0.1, window: int = 300):
+        self.interval = interval
+        self.max_lag = 0.0
+        self._lags = deque(maxlen=window)
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - started - self.interval, 0.0)
+            self._lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def stats(self) -> dict:
+        lags = sorted(self._lags)
+        return {
+            "samples": len(lags),
+            "lag_p50_ms": round(lags[len(lags) // 2] * 1000, 2) if lags else 0.0,
+            "lag_p99_ms": round(lags[int(len(lags) * 0.99)] * 1000, 2) if lags else 0.0,
+            "lag_max_ms": round(lags[-1] * 1000, 2) if lags else 0.0,
+            "lag_max_ever_ms": round(self.max_lag * 1000, 2),
+        }
@@ -0,0 +1,56 @@
+"""Render the fixed part of an analyst's outlook from its snapshot.
+
+Price, indicators, trend, volatility and bias are all determined by the
+snapshot, so they are formatted here rather than by the model. The analyst
+only writes the Notes, which are appended to the rendered block.
+"""
+import math
+from decimal import Decimal
+
+OUTLOOKS = {
+    "fetch_crypto_snapshot": ("🌅 Crypto Market Outlook", "last_price"),
+    "fetch_fx_snapshot": ("🌅 FX Market Outlook", "price"),
+    "fetch_xau_snapshot": ("🌅 XAU Outlook", "price"),
+}
+
+
+def _price(value: float) -> str:
+    """A price-unit value with every decimal it carries (at least 2, at most 8).
+
+    Quotes span 104,523.17 (BTC) to 1.08123 (EUR/USD), so a fixed number of
+    significant digits either drops cents or drops pips.
+    """
+    if not math.isfinite(value):
+        return f"{value:g}"
+    decimals = -Decimal(repr(float(value))).as_tuple().exponent
+    return f"{value:,.{min(max(decimals, 2), 8)}f}"
+
+
+def _label(snapshot: dict) -> str:
+    if "pair" in snapshot:
+        return snapshot["pair"]
+    symbol = snapshot.get("symbol", "")
+    return f"{symbol.removesuffix('USDT')}/USD" if symbol.endswith("USDT") else symbol
+
+
+def render_header(tool_name: str, snapshot: dict) -> str | None:
+    """The outlook up to "- Notes: ", or None if `tool_name` has no outlook format."""
+    if tool_name not in OUTLOOKS or "trend" not in snapshot:
+        return None
+    title, price_key = OUTLOOKS[tool_name]
+    return (
+        f"{title}\n\n"
+        f"{_label(snapshot)}:\n"
+        f"- Price: {_price(snapshot[price_key])}\n"
+        f"- EMA20 / EMA50: {_price(snapshot['ema20'])} / {_price(snapshot['ema50'])}\n"
+        f"- RSI14: {snapshot['rsi14']:g}\n"
+        f"- Trend: {snapshot['trend']}\n"
+        f"- Volatility: {snapshot['volatility']} (range {snapshot['range_pct']:g}%)\n"
+        f"- Bias: {snapshot['bias']}\n"
+        "- Notes: "
+    )
+
+
+def render(tool_name: str, snapshot: dict, notes: str) -> str:
+    header = render_header(tool_name, snapshot)
+    return header + notes.strip() if header else notes
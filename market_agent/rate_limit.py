@@ -0,0 +1,195 @@
+"""Quota-aware request scheduling for the upstream market data APIs.
+
+Each provider gets one or more token buckets (e.g. Alpha Vantage's per-minute
+and per-day limits, Binance's request weight per minute). Requests queue for
+tokens in priority order, so scheduled jobs go ahead of ad-hoc queries. A
+request that would wait longer than `max_wait` raises RateLimited instead,
+letting the caller serve cached data.
+
+Buckets given a `path` keep their state in that file under an flock, so
+uvicorn workers on one machine draw from one quota instead of each assuming
+the provider's full allowance. Tokens are checked and taken in one locked
+step, so two workers can't both spend the last one.
+"""
+import asyncio
+import contextlib
+import heapq
+import itertools
+import os
+import struct
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+try:
+    from .file_lock import locked_blocking
+except ImportError:
+    from file_lock import locked_blocking
+
+SCHEDULED = 0
+ADHOC = 1
+
+# Priority of the work running in the current context; the HTTP layer sets
+# SCHEDULED for Cloud Scheduler calls.
+request_priority: ContextVar[int] = ContextVar("request_priority", default=ADHOC)
+# Set by the candle cache when a stale entry could be served instead of waiting.
+stale_fallback: ContextVar[bool] = ContextVar("stale_fallback", default=False)
+
+
+class RateLimited(Exception):
+    def __init__(self, provider: str, wait: float):
+        super().__init__(f"{provider} rate limit: next slot in {wait:.1f}s")
+        self.provider = provider
+        self.wait = wait
+
+
+# Shared bucket file: tokens, updated (both f8).
+_BUCKET_STATE = struct.Struct("<dd")
+
+
+class TokenBucket:
+    """`capacity` tokens refilled continuously over `period` seconds.
+
+    With `path`, the state lives in that file and every process using it
+    shares the bucket. They must be on one machine (flock, and a monotonic
+    clock that is only comparable within a boot).
+    """
+
+    def __init__(self, capacity: float, period: float, clock=time.monotonic, path: str | None = None):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.clock = clock
+        self.path = path
+        self.tokens = capacity
+        self.updated = clock()
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    @contextlib.contextmanager
+    def held(self):
+        """Lock the bucket (across processes when shared) and bring it up to date."""
+        with self._lock, (locked_blocking(self.path) if self.path else contextlib.nullcontext()):
+            if self.path:
+                self._load()
+            now = self.clock()
+            # A state file from before a reboot can be ahead of the clock.
+            elapsed = max(0.0, now - self.updated)
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+            yield self
+            if self.path:
+                self._save()
+
+    def wait_locked(self, cost: float) -> float:
+        """Seconds until `cost` tokens are available (0 if they are now). Call inside `held()`."""
+        return max(0.0, (cost - self.tokens) / self.rate)
+
+    def wait_time(self, cost: float) -> float:
+        with self.held():
+            return self.wait_locked(cost)
+
+    def take(self, cost: float) -> None:
+        with self.held():
+            self.tokens -= cost
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "rb") as f:
+                raw = f.read(_BUCKET_STATE.size)
+        except FileNotFoundError:
+            return
+        if len(raw) == _BUCKET_STATE.size:
+            self.tokens, self.updated = _BUCKET_STATE.unpack(raw)
+
+    def _save(self) -> None:
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.pwrite(fd, _BUCKET_STATE.pack(self.tokens, self.updated), 0)
+        finally:
+            os.close(fd)
+
+
+class ProviderScheduler:
+    """Priority queue in front of a provider's token buckets."""
+
+    def __init__(self, name: str, buckets: list[TokenBucket], clock=time.monotonic, sleep=asyncio.sleep):
+        self.name = name
+        self.buckets = buckets
+        self.clock = clock
+        self.sleep = sleep
+        self._queue: list = []  # (priority, seq, cost, future, queued_at)
+        self._seq = itertools.count()
+        self._wakeup: asyncio.Event | None = None
+        self._dispatcher: asyncio.Task | None = None
+        self.granted = 0
+        self.throttled = 0
+        self._waits = deque(maxlen=1000)
+
+    def _wait_time(self, cost: float) -> float:
+        return max(bucket.wait_time(cost) for bucket in self.buckets)
+
+    def _try_take(self, cost: float, queued_at: float) -> float:
+        """Take `cost` from every bucket if all have it and return 0, else the wait without taking."""
+        with contextlib.ExitStack() as stack:
+            buckets = [stack.enter_context(bucket.held()) for bucket in self.buckets]
+            wait = max(bucket.wait_locked(cost) for bucket in buckets)
+            if wait > 0:
+                return wait
+            for bucket in buckets:
+                bucket.tokens -= cost
+        self.granted += 1
+        self._waits.append(self.clock() - queued_at)
+        return 0.0
+
+    async def acquire(self, cost: float = 1, priority: int | None = None, max_wait: float | None = None) -> None:
+        """Wait for `cost` tokens. Raises RateLimited if that would take longer than `max_wait`."""
+        if priority is None:
+            priority = request_priority.get()
+        queued_cost = sum(item[2] for item in self._queue if item[0] <= priority)
+        wait = self._wait_time(cost + queued_cost)
+        if max_wait is not None and wait > max_wait:
+            self.throttled += 1
+            raise RateLimited(self.name, wait)
+        # Another worker sharing the buckets may have taken them since.
+        if not self._queue and wait == 0 and self._try_take(cost, self.clock()) == 0:
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), cost, future, self.clock()))
+        self._ensure_dispatcher()
+        self._wakeup.set()
+        await future
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        while True:
+            while not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            priority, _, cost, future, queued_at = self._queue[0]
+            if future.cancelled():
+                heapq.heappop(self._queue)
+                continue
+            wait = self._try_take(cost, queued_at)
+            if wait > 0:
+                await self.sleep(wait)
+                continue
+            heapq.heappop(self._queue)
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            "granted": self.granted,
+            "throttled": self.throttled,
+            "queued": len(self._queue),
+            "wait_p50_s": round(waits[len(waits) // 2], 3) if waits else 0.0,
+            "wait_p95_s": round(waits[int(len(waits) * 0.95)], 3) if waits else 0.0,
+            "wait_max_s": round(waits[-1], 3) if waits else 0.0,
+        }
@@ -0,0 +1,46 @@
+"""Derive higher-timeframe candles from a base interval without refetching.
+
+Bars are grouped by the start of the target interval they open in (UTC,
+weeks starting Monday as on Binance) and aggregated in one vectorized pass:
+first open, highest high, lowest low, last close. A leading bucket the
+history only partly covers is dropped; the trailing one is kept, like the
+exchange's still-forming bar.
+"""
+import numpy as np
+
+try:
+    from .candles import Candles
+    from .indicator_state import interval_ms
+except ImportError:
+    from candles import Candles
+    from indicator_state import interval_ms
+
+_WEEK_MS = 7 * 86_400_000
+_WEEK_ORIGIN_MS = 4 * 86_400_000  # 1970-01-05, a Monday
+
+
+def bucket_starts(ts: np.ndarray, interval: str) -> np.ndarray:
+    """Open time of the `interval` bar each timestamp falls in."""
+    step = interval_ms(interval)
+    origin = _WEEK_ORIGIN_MS if step % _WEEK_MS == 0 else 0
+    return (ts - origin) // step * step + origin
+
+
+def resample(candles: Candles, interval: str) -> Candles:
+    """Aggregate `candles` (sorted by open time) into `interval` bars."""
+    if not len(candles):
+        return candles
+    buckets = bucket_starts(candles.ts, interval)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    if candles.ts[0] != buckets[0]:
+        starts = starts[1:]
+        if not len(starts):
+            return candles[:0]
+    ends = np.r_[starts[1:], len(candles)] - 1
+
+    ohlc = np.empty((4, len(starts)))
+    ohlc[0] = candles.open[starts]
+    ohlc[1] = np.maximum.reduceat(candles.high[starts[0]:], starts - starts[0])
+    ohlc[2] = np.minimum.reduceat(candles.low[starts[0]:], starts - starts[0])
+    ohlc[3] = candles.close[ends]
+    return Candles(buckets[starts], ohlc)
@@ -0,0 +1,102 @@
+"""Reuse analyst LLM replies when they would be answering the same snapshot.
+
+The analysts' outlook depends only on their instruction and the snapshot
+returned by their fetch_*_snapshot tool, so once the model has answered for a
+given snapshot the reply can be served again without a Gemini call. Hooked in
+as ADK before/after model callbacks.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+
+SNAPSHOT_TOOL_SUFFIX = "_snapshot"
+_MAX_PENDING = 1024
+
+
+def _latest_snapshot(llm_request: LlmRequest) -> dict | None:
+    for content in reversed(llm_request.contents):
+        for part in reversed(content.parts or []):
+            response = part.function_response
+            if response and response.name and response.name.endswith(SNAPSHOT_TOOL_SUFFIX):
+                return response.response
+    return None
+
+
+class ResponseCache:
+    """TTL + LRU cache of final model replies keyed on (agent, instruction, snapshot)."""
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 6 * 3600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, LlmResponse]] = OrderedDict()
+        # (invocation_id, agent_name) -> key awaiting the model's reply.
+        self._pending: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(agent_name: str, instruction: str, snapshot: dict) -> str:
+        canonical = json.dumps(
+            {
+                "agent": agent_name,
+                "instruction": hashlib.sha256(instruction.encode("utf-8")).hexdigest(),
+                "snapshot": snapshot,
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def before_model(self, callback_context: CallbackContext, llm_request: LlmRequest) -> LlmResponse | None:
+        snapshot = _latest_snapshot(llm_request)
+        if snapshot is None:
+            return None
+
+        key = self.key(callback_context.agent_name, str(llm_request.config.system_instruction or ""), snapshot)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1].model_copy(deep=True)
+            self.misses += 1
+            self._pending[(callback_context.invocation_id, callback_context.agent_name)] = key
+            while len(self._pending) > _MAX_PENDING:
+                self._pending.popitem(last=False)
+        return None
+
+    def after_model(self, callback_context: CallbackContext, llm_response: LlmResponse) -> LlmResponse | None:
+        if llm_response.partial or llm_response.error_code or not llm_response.content:
+            return None
+        parts = llm_response.content.parts or []
+        if any(part.function_call for part in parts) or not any(part.text for part in parts):
+            return None
+
+        with self._lock:
+            key = self._pending.pop((callback_context.invocation_id, callback_context.agent_name), None)
+            if key is None:
+                return None
+            self._entries[key] = (self.clock() + self.ttl_seconds, llm_response.model_copy(deep=True))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
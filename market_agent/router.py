@@ -0,0 +1,50 @@
+"""Keyword fast path in front of the MarketOrchestrator LLM.
+
+The orchestrator's routing rules are plain keyword matches, so when exactly
+one analyst matches a query we can dispatch to it directly and skip a model
+round trip. Queries matching no analyst, or several, still go to the LLM.
+"""
+import re
+import threading
+
+# Mirrors the routing rules in MarketOrchestrator's instruction.
+ROUTES = {
+    "CryptoAnalyst": r"\b(?:btc|eth|bitcoin|ethereum|crypto\w*)(?:usdt?)?\b",
+    "FXAnalyst": r"\b(?:eur\s*/?\s*usd|forex)\b",
+    "XAUAnalyst": r"\b(?:xau(?:\s*/?\s*usd)?|gold)\b",
+}
+
+
+class KeywordRouter:
+    """Compiled keyword rules with counters for how often each path fires."""
+
+    def __init__(self, routes: dict[str, str] = ROUTES):
+        self._patterns = [(name, re.compile(pattern, re.IGNORECASE)) for name, pattern in routes.items()]
+        self._lock = threading.Lock()
+        self.direct = {name: 0 for name in routes}
+        self.ambiguous = 0
+        self.unmatched = 0
+
+    def route(self, query: str) -> str | None:
+        """Return the single matching agent name, or None to fall back to the orchestrator."""
+        matches = [name for name, pattern in self._patterns if pattern.search(query)]
+        with self._lock:
+            if len(matches) == 1:
+                self.direct[matches[0]] += 1
+                return matches[0]
+            if matches:
+                self.ambiguous += 1
+            else:
+                self.unmatched += 1
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            fast = sum(self.direct.values())
+            total = fast + self.ambiguous + self.unmatched
+            return {
+                "direct": dict(self.direct),
+                "fallback_ambiguous": self.ambiguous,
+                "fallback_unmatched": self.unmatched,
+                "fast_path_rate": round(fast / total, 4) if total else 0.0,
+            }
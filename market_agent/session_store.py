@@ -0,0 +1,129 @@
+"""Session service with a size cap and idle TTL for the long-lived HTTP server.
+
+Every /analyze call creates a fresh session. Wrapping the ADK session service
+keeps the number of live sessions bounded: the least recently used session is
+dropped once `max_sessions` is reached, and sessions idle for longer than
+`ttl_seconds` are dropped on the next create. Sessions a persistent backend
+already holds (from before a restart) are indexed by their last update time
+the first time an (app, user) pair creates a session, so they age out too.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, InMemorySessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+
+
+class BoundedSessionService(BaseSessionService):
+    """LRU + TTL eviction in front of another session service."""
+
+    def __init__(self, backend: BaseSessionService | None = None, max_sessions: int = 1000,
+                 ttl_seconds: float = 3600, clock=time.monotonic, wall_clock=time.time):
+        self.backend = backend or InMemorySessionService()
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.created = 0
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+        # (app_name, user_id, session_id) -> last used, oldest first.
+        self._last_used: OrderedDict[tuple[str, str, str], float] = OrderedDict()
+        # (app_name, user_id) pairs whose stored sessions are in _last_used.
+        self._seeded: set[tuple[str, str]] = set()
+
+    def _touch(self, key: tuple[str, str, str]) -> None:
+        if key in self._last_used:
+            self._last_used[key] = self.clock()
+            self._last_used.move_to_end(key)
+
+    async def _seed(self, app_name: str, user_id: str) -> None:
+        if (app_name, user_id) in self._seeded:
+            return
+        self._seeded.add((app_name, user_id))
+        response = await self.backend.list_sessions(app_name=app_name, user_id=user_id)
+        if not response.sessions:
+            return
+        # last_update_time is wall-clock epoch seconds; carry its age over to self.clock.
+        now, wall_now = self.clock(), self.wall_clock()
+        for session in response.sessions:
+            key = (app_name, user_id, session.id)
+            if key not in self._last_used:
+                self._last_used[key] = now - max(0.0, wall_now - session.last_update_time)
+        self._last_used = OrderedDict(sorted(self._last_used.items(), key=lambda item: item[1]))
+
+    async def _evict(self) -> None:
+        now = self.clock()
+        while self._last_used:
+            key, last_used = next(iter(self._last_used.items()))
+            if now - last_used > self.ttl_seconds:
+                self.evicted_ttl += 1
+            elif len(self._last_used) >= self.max_sessions:
+                self.evicted_lru += 1
+            else:
+                break
+            del self._last_used[key]
+            app_name, user_id, session_id = key
+            await self.backend.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        await self._seed(app_name, user_id)
+        await self._evict()
+        session = await self.backend.create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id,
+        )
+        self._last_used[(app_name, user_id, session.id)] = self.clock()
+        self.created += 1
+        return session
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        self._touch((app_name, user_id, session_id))
+        return await self.backend.get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config,
+        )
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        return await self.backend.list_sessions(app_name=app_name, user_id=user_id)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self._last_used.pop((app_name, user_id, session_id), None)
+        await self.backend.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        self._touch((session.app_name, session.user_id, session.id))
+        return await self.backend.append_event(session, event)
+
+    def stats(self) -> dict:
+        return {
+            "live": len(self._last_used),
+            "created": self.created,
+            "evicted_lru": self.evicted_lru,
+            "evicted_ttl": self.evicted_ttl,
+        }
+
+
+def create_session_service(db_url: str | None = None, max_sessions: int = 1000,
+                           ttl_seconds: float = 3600) -> BoundedSessionService:
+    """In-memory sessions by default, or a database (e.g. "sqlite:///sessions.db") when `db_url` is set."""
+    backend = None
+    if db_url:
+        from google.adk.sessions import DatabaseSessionService
+
+        backend = DatabaseSessionService(db_url)
+    return BoundedSessionService(backend, max_sessions=max_sessions, ttl_seconds=ttl_seconds)
@@ -0,0 +1,53 @@
+"""Coalesce concurrent identical async calls into one in-flight task.
+
+When several requests ask for the same thing at once (a retry racing the
+original, the scheduler and a human asking about the same pair), only the
+first one does the work and the rest await its result. The work is
+cancelled once every caller waiting on it has been cancelled.
+"""
+import asyncio
+
+
+class SingleFlight:
+    """Per-key in-flight task sharing with a duplicate-suppression counter."""
+
+    def __init__(self):
+        self._inflight: dict[object, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+        self.calls = 0
+        self.suppressed = 0
+
+    async def do(self, key, fn):
+        """Await `fn()` for `key`, or join the call already running for it."""
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.suppressed += 1
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # Shielded so one cancelled caller doesn't cancel the work others still wait on.
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # The last waiter gave up; nobody wants the result any more.
+                    task.cancel()
+                    self._forget(key, task)
+
+    def _forget(self, key, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "suppressed": self.suppressed,
+            "in_flight": len(self._inflight),
+            "suppression_rate": round(self.suppressed / self.calls, 4) if self.calls else 0.0,
+        }
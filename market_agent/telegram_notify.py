@@ -1,18 +1,160 @@
-"""Send messages to Telegram when TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID are set."""
+"""Send messages to Telegram when TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID are set.
+
+Messages are queued and delivered by a background worker, so HTTP handlers
+never wait on Telegram. Messages arriving within a short window are merged,
+long text is split to fit Telegram's limit, and failed sends are retried with
+backoff.
+"""
+import asyncio
+import logging
 import os
-import requests
 
-def send_message(text: str) -> None:
-    """Send a text message to Telegram. No-op if token or chat_id is missing."""
-    token = os.environ.get("TELEGRAM_BOT_TOKEN")
-    chat_id = os.environ.get("TELEGRAM_CHAT_ID")
-    if not token or not chat_id:
-        return
+import httpx
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_BASE_URL = os.environ.get("TELEGRAM_API_BASE_URL", "https://api.telegram.org")
+MAX_MESSAGE_LENGTH = 4096
+COALESCE_WINDOW_SECONDS = float(os.environ.get("TELEGRAM_COALESCE_SECONDS", "1.0"))
+MAX_ATTEMPTS = 4
+BACKOFF_SECONDS = 1.0
+
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> list[str]:
+    """Split text into chunks of at most `limit` characters, preferring line breaks."""
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    if text:
+        chunks.append(text)
+    return chunks
+
+
+def _retry_after(resp: httpx.Response, default: float) -> float:
+    """Telegram's retry_after for a 429, or `default` if the body doesn't carry one."""
     try:
-        requests.post(
-            f"https://api.telegram.org/bot{token}/sendMessage",
-            json={"chat_id": chat_id, "text": text},
-            timeout=10,
-        )
-    except Exception:
-        pass  # Don't fail the request if Telegram fails
+        return float(resp.json()["parameters"]["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        # Proxies in front of the Bot API answer 429 with HTML or plain text.
+        return default
+
+
+class TelegramNotifier:
+    """Queue + background worker delivering messages through one pooled client."""
+
+    def __init__(self, token: str | None = None, chat_id: str | None = None,
+                 base_url: str = TELEGRAM_API_BASE_URL, coalesce_window: float = COALESCE_WINDOW_SECONDS):
+        # None means read from the environment at send time (after load_dotenv).
+        self._token = token
+        self._chat_id = chat_id
+        self.base_url = base_url
+        self.coalesce_window = coalesce_window
+        self.sent = 0
+        self.failed = 0
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def token(self) -> str | None:
+        return self._token or os.environ.get("TELEGRAM_BOT_TOKEN")
+
+    @property
+    def chat_id(self) -> str | None:
+        return self._chat_id or os.environ.get("TELEGRAM_CHAT_ID")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token and self.chat_id)
+
+    def notify(self, text: str) -> None:
+        """Queue `text` for delivery without waiting. Must be called from the event loop."""
+        if not self.enabled:
+            return
+        self.start()
+        self._queue.put_nowait(text)
+
+    def start(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._queue = self._queue or asyncio.Queue()
+            # A worker that died leaves its client open; keep using it.
+            if self._client is None or self._client.is_closed:
+                self._client = httpx.AsyncClient(timeout=10)
+            self._worker = asyncio.ensure_future(self._run())
+
+    async def stop(self, timeout: float = 15) -> None:
+        """Deliver whatever is queued (up to `timeout` seconds), then shut the worker down."""
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Dropping %d queued Telegram messages on shutdown", self._queue.qsize())
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        await self._client.aclose()
+        self._worker = None
+
+    async def _run(self) -> None:
+        while True:
+            texts = [await self._queue.get()]
+            # Merge bursts (e.g. several results finishing together) into one message.
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.coalesce_window
+            while (remaining := deadline - loop.time()) > 0:
+                try:
+                    texts.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                for chunk in split_message("\n\n".join(texts)):
+                    await self._send(chunk)
+            finally:
+                for _ in texts:
+                    self._queue.task_done()
+
+    async def _send(self, text: str) -> None:
+        url = f"{self.base_url}/bot{self.token}/sendMessage"
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            delay = BACKOFF_SECONDS * 2 ** (attempt - 1)
+            try:
+                resp = await self._client.post(url, json={"chat_id": self.chat_id, "text": text})
+                if resp.status_code == 429:
+                    delay = _retry_after(resp, delay)
+                elif resp.status_code < 500:
+                    resp.raise_for_status()
+                    self.sent += 1
+                    return
+            except httpx.HTTPStatusError as e:
+                # Other 4xx errors (bad token, bad chat id) will not succeed on retry.
+                logger.warning("Telegram rejected message: %s", e)
+                break
+            except httpx.HTTPError as e:
+                logger.warning("Telegram send attempt %d failed: %s", attempt, e)
+            if attempt < MAX_ATTEMPTS:
+                await asyncio.sleep(delay)
+        self.failed += 1
+        logger.error("Dropping Telegram message after %d attempts", attempt)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "sent": self.sent,
+            "failed": self.failed,
+        }
+
+
+notifier = TelegramNotifier()
+
+
+def send_message(text: str) -> None:
+    """Queue a text message for Telegram. No-op if token or chat_id is missing."""
+    notifier.notify(text)
@@ -0,0 +1,29 @@
+"""Request validation on the HTTP endpoints.
+
+    python -m pytest market_agent/test_app.py
+"""
+import os
+import sys
+
+from fastapi.testclient import TestClient
+
+# app.py is run by uvicorn from this directory and imports its siblings top-level.
+sys.path.insert(0, os.path.dirname(__file__))
+
+import app  # noqa: E402
+
+
+def test_unknown_instruments_are_a_422_without_an_alert(monkeypatch):
+    alerts = []
+    monkeypatch.setattr(app, "send_message", alerts.append)
+    monkeypatch.setattr(app, "analyze_instruments", lambda keys: alerts.append(keys))
+    resp = TestClient(app.app).post("/analyze-all", json={"instruments": ["eurusd", "dogeusd"]})
+    assert resp.status_code == 422
+    assert "dogeusd" in resp.json()["detail"][0]["msg"]
+    assert alerts == []
+
+
+def test_repeated_instruments_are_analyzed_once_in_order():
+    request = app.AnalyzeAllRequest(instruments=["btcusd", "eurusd", "btcusd", "eurusd"])
+    assert request.instruments == ["btcusd", "eurusd"]
+    assert app.AnalyzeAllRequest().instruments == list(app.BATCH_INSTRUMENTS)
@@ -0,0 +1,145 @@
+"""Backfill against a local fake klines server.
+
+    python -m pytest market_agent/test_backfill.py
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import numpy as np
+import pytest
+
+from market_agent import agent, http_client
+from market_agent.backfill import backfill, page_windows
+from market_agent.candle_store import CandleStore
+from market_agent.candles import Candles
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from fake_binance import Market  # noqa: E402
+
+HOUR_MS = 3_600_000
+START_MS = 1_704_067_200_000  # 2024-01-01
+BARS = 2500
+
+
+class KlinesServer:
+    """GET /api/v3/klines from fake_binance's Market; answers 500 once for each startTime in `fail_once`."""
+
+    def __init__(self):
+        self.market = Market(seed=7)
+        self.starts: list[int] = []
+        self.fail_once: set[int] = set()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                q = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                start = int(q["startTime"])
+                server.starts.append(start)
+                if start in server.fail_once:
+                    server.fail_once.discard(start)
+                    self.send_response(500)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = json.dumps(server.market.klines(
+                    q["symbol"], q["interval"], start, int(q["endTime"]), int(q["limit"]),
+                )).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def expected(self, start_ms: int, end_ms: int) -> Candles:
+        return Candles.from_binance(self.market.klines("BTCUSDT", "1h", start_ms, end_ms - 1, BARS + 1))
+
+
+@pytest.fixture
+def klines():
+    server = KlinesServer()
+    threading.Thread(target=server.httpd.serve_forever, daemon=True).start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
+
+
+def test_page_windows_cover_range_without_gaps():
+    end_ms = START_MS + BARS * HOUR_MS
+    windows = page_windows(START_MS, end_ms, "1h")
+    assert windows == [
+        (START_MS, START_MS + 1000 * HOUR_MS - 1),
+        (START_MS + 1000 * HOUR_MS, START_MS + 2000 * HOUR_MS - 1),
+        (START_MS + 2000 * HOUR_MS, end_ms - 1),
+    ]
+    assert page_windows(START_MS, START_MS, "1h") == []
+
+
+def test_overlapping_pages_are_merged_in_order(klines):
+    end_ms = START_MS + BARS * HOUR_MS
+
+    async def fetch_page(start: int, end: int) -> Candles:
+        # Each page reaches 5 bars into its neighbours, and later pages answer first.
+        await asyncio.sleep((end_ms - start) / (BARS * HOUR_MS) * 0.2)
+        data = await http_client.get_json(
+            f"{klines.base_url}/api/v3/klines",
+            params={"symbol": "BTCUSDT", "interval": "1h", "startTime": start - 5 * HOUR_MS,
+                    "endTime": end + 5 * HOUR_MS, "limit": 1010},
+        )
+        return Candles.from_binance(data)
+
+    async def run():
+        try:
+            return [page async for page in backfill(fetch_page, START_MS, end_ms, "1h", concurrency=3, page_bars=500)]
+        finally:
+            await http_client.aclose()
+
+    pages = asyncio.run(run())
+    assert len(klines.starts) == 5
+    merged = Candles.concat(pages)
+    expected = klines.expected(START_MS, end_ms)
+    assert len(merged) == BARS
+    assert np.array_equal(merged.ts, expected.ts)
+    assert np.array_equal(merged.ohlc, expected.ohlc)
+
+
+def test_store_backfill_resumes_after_failed_page(klines, tmp_path, monkeypatch):
+    store = CandleStore(str(tmp_path))
+    monkeypatch.setattr(agent, "candle_store", store)
+    monkeypatch.setattr(agent, "BINANCE_BASE_URL", klines.base_url)
+    end_ms = START_MS + BARS * HOUR_MS
+    klines.fail_once.add(START_MS + 2000 * HOUR_MS)
+
+    async def run():
+        try:
+            return await agent.backfill_crypto_store("BTCUSDT", "1h", START_MS, end_ms)
+        finally:
+            await http_client.aclose()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(run())
+    # The pages before the failure are kept.
+    assert len(store.read("binance", "BTCUSDT", "1h")) == 2000
+    assert store.last_ts("binance", "BTCUSDT", "1h") == START_MS + 1999 * HOUR_MS
+
+    # The rerun starts from the last stored bar instead of the beginning.
+    del klines.starts[:]
+    assert asyncio.run(run()) == BARS - 2000
+    assert klines.starts == [START_MS + 1999 * HOUR_MS]
+
+    stored = store.read("binance", "BTCUSDT", "1h")
+    expected = klines.expected(START_MS, end_ms)
+    assert np.array_equal(stored.ts, expected.ts)
+    assert np.array_equal(stored.ohlc, expected.ohlc)
@@ -0,0 +1,95 @@
+"""The backtester's trend rule against the live snapshot's, and its report on synthetic series.
+
+    python -m pytest market_agent/test_backtest.py
+"""
+import numpy as np
+import pytest
+
+from market_agent.backtest import _max_drawdown, backtest, rolling_trend
+from market_agent.candles import Candles
+from market_agent.indicators import TREND_NAMES, indicator_fields, signal_fields
+
+DAY_MS = 86_400_000
+
+
+def candles_from_returns(returns: np.ndarray, first: float = 100.0) -> Candles:
+    close = first * np.cumprod(1 + returns)
+    ts = np.arange(len(close), dtype=np.int64) * DAY_MS
+    return Candles(ts, np.vstack([close, close * 1.001, close * 0.999, close]))
+
+
+@pytest.mark.parametrize("scale", (1.08, 104523.17))
+def test_rolling_trend_matches_snapshot_rule(scale):
+    rng = np.random.default_rng(19)
+    # Drifting up, then down, then sideways, so every trend shows up.
+    drift = np.r_[np.full(150, 0.004), np.full(150, -0.004), np.zeros(150)]
+    close = scale * np.exp(np.cumsum(drift + rng.normal(0, 0.006, len(drift))))
+    window = 60
+
+    codes = rolling_trend(close, window)
+    assert len(codes) == len(close) - window + 1
+    assert set(codes.tolist()) == {-1, 0, 1}
+    for i, code in enumerate(codes):
+        bars = close[i : i + window]
+        fields = indicator_fields(bars, bars * 1.001, bars * 0.999)
+        assert signal_fields(fields)["trend"] == TREND_NAMES[int(code)], i
+
+
+def test_rolling_trend_short_series():
+    assert len(rolling_trend(np.ones(10), window=20)) == 0
+
+
+def test_max_drawdown():
+    assert _max_drawdown(np.array([0.1, -0.5, 0.2])) == pytest.approx(-0.5)
+    assert _max_drawdown(np.array([-0.1, 0.05, -0.1])) == pytest.approx(0.9 * 1.05 * 0.9 - 1)
+    assert _max_drawdown(np.array([0.01, 0.02])) == 0.0
+    assert _max_drawdown(np.zeros(0)) == 0.0
+
+
+def test_uptrend_with_pullbacks():
+    returns = np.full(260, 0.01)
+    returns[[220, 221, 240]] = -0.03
+    report = backtest(candles_from_returns(returns), horizon=1, window=200)
+
+    # Signals at bars 199..258, each scored on the next bar's return.
+    held = returns[200:]
+    assert report["bars"] == 260
+    assert report["signals"] == 60
+    bullish = report["Bullish"]
+    assert bullish["count"] == 60
+    assert bullish["hit_rate"] == 0.95
+    assert bullish["mean_return"] == pytest.approx(held.mean(), abs=1e-6)
+    assert bullish["total_return"] == pytest.approx(1.01 ** 57 * 0.97 ** 3 - 1, abs=1e-6)
+    # Two pullbacks in a row are the deepest fall from a peak.
+    assert bullish["max_drawdown"] == pytest.approx(0.97 ** 2 - 1, abs=1e-6)
+    assert report["Bearish"] == report["Range"] == {
+        "count": 0, "hit_rate": None, "mean_return": None, "total_return": None, "max_drawdown": None,
+    }
+    assert report["strategy"] == {
+        "total_return": bullish["total_return"],
+        "max_drawdown": bullish["max_drawdown"],
+        "buy_and_hold": bullish["total_return"],
+    }
+
+
+def test_downtrend_is_shorted():
+    report = backtest(candles_from_returns(np.full(230, -0.01)), horizon=5, window=200)
+    bearish = report["Bearish"]
+    # Scored 5 bars ahead, held one bar at a time.
+    assert report["signals"] == bearish["count"] == 230 - 199 - 5
+    assert bearish["hit_rate"] == 1.0
+    assert bearish["mean_return"] == pytest.approx(1 - 0.99 ** 5, abs=1e-6)
+    assert bearish["total_return"] == pytest.approx(1.01 ** 26 - 1, abs=1e-6)
+    assert bearish["max_drawdown"] == 0.0
+    assert report["strategy"]["buy_and_hold"] == pytest.approx(0.99 ** 26 - 1, abs=1e-6)
+
+
+def test_range_hits_inside_the_band():
+    # Alternating +-0.5% keeps the EMAs flat and RSI at 50: Range throughout.
+    returns = np.tile([0.005, -0.005], 115)
+    report = backtest(candles_from_returns(returns), horizon=1, window=200, range_band=0.01)
+    assert report["Range"]["count"] == report["signals"] == 30
+    assert report["Range"]["hit_rate"] == 1.0
+    assert report["Range"]["mean_return"] == pytest.approx(0.005, abs=1e-4)
+    assert report["Range"]["total_return"] is None
+    assert report["strategy"]["total_return"] == 0.0
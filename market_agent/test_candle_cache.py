@@ -0,0 +1,191 @@
+"""CandleCache in front of a local fake klines server, on a fake clock.
+
+    python -m pytest market_agent/test_candle_cache.py
+"""
+import asyncio
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+from market_agent import http_client
+from market_agent.candle_cache import CLOSE_GRACE_SECONDS, FORMING_MAX_AGE_SECONDS, CandleCache
+from market_agent.candles import Candles
+
+DAY = 86_400
+HOUR = 3_600
+# Midnight UTC, so bar closes fall on round offsets from here.
+MIDNIGHT = 1_700_006_400.0
+
+
+class FakeClock:
+    def __init__(self, now: float = MIDNIGHT + 6 * HOUR):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class KlinesServer:
+    """Answers /api/v3/klines with `interval` bars ending at the bar open at `clock`; counts requests."""
+
+    def __init__(self, clock: FakeClock):
+        self.clock = clock
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                body = json.dumps(server.klines(self.path)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def klines(self, path: str) -> list:
+        step = DAY if "interval=1d" in path else HOUR
+        # The bar containing `now` is included, still forming, unless `closed_only` is in the query.
+        last_open = int(self.clock() // step * step) - (step if "closed_only" in path else 0)
+        price = self.clock() / 1e7
+        return [[(last_open - i * step) * 1000, "1", "2", "0.5", str(price), "0"] for i in range(4, -1, -1)]
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def klines(clock):
+    server = KlinesServer(clock)
+    threading.Thread(target=server.httpd.serve_forever, daemon=True).start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
+
+
+def cached_fetcher(cache: CandleCache, base_url: str):
+    @cache.cached("binance", lambda a: (a["symbol"], a["interval"], 5))
+    async def fetch(symbol: str, interval: str, closed_only: bool = True) -> Candles:
+        params = {"symbol": symbol, "interval": interval}
+        if closed_only:
+            params["closed_only"] = 1
+        return Candles.from_binance(await http_client.get_json(f"{base_url}/api/v3/klines", params=params))
+
+    return fetch
+
+
+def run(coro_fn):
+    async def main():
+        try:
+            return await coro_fn()
+        finally:
+            await http_client.aclose()
+
+    return asyncio.run(main())
+
+
+def test_closed_bars_expire_at_the_next_bar_close(clock, klines):
+    cache = CandleCache(clock=clock)
+    fetch = cached_fetcher(cache, klines.base_url)
+
+    async def scenario():
+        first = await fetch("BTCUSDT", "1d")
+        # Hits right up to the next daily close plus the grace period.
+        clock.now = MIDNIGHT + DAY + CLOSE_GRACE_SECONDS - 1
+        assert await fetch("BTCUSDT", "1d") is first
+        assert klines.requests == 1
+
+        clock.now += 2
+        second = await fetch("BTCUSDT", "1d")
+        assert second is not first
+        assert int(second.ts[-1]) == int(first.ts[-1]) + DAY * 1000
+        assert klines.requests == 2
+
+    run(scenario)
+    assert cache.stats() == {
+        "entries": 1, "hits": 1, "disk_hits": 0, "misses": 2, "shared_waits": 0, "stale_served": 0, "hit_rate": 0.3333,
+    }
+
+
+def test_forming_bar_is_refetched_after_max_age(clock, klines):
+    cache = CandleCache(clock=clock)
+    fetch = cached_fetcher(cache, klines.base_url)
+
+    async def scenario():
+        first = await fetch("BTCUSDT", "1d", closed_only=False)
+        clock.now += FORMING_MAX_AGE_SECONDS - 1
+        assert await fetch("BTCUSDT", "1d", closed_only=False) is first
+        clock.now += 2
+        second = await fetch("BTCUSDT", "1d", closed_only=False)
+        # Same bars, but the forming one carries the newer price.
+        assert np.array_equal(second.ts, first.ts)
+        assert second.close[-1] > first.close[-1]
+        assert klines.requests == 2
+
+    run(scenario)
+
+
+def test_expires_at(clock):
+    # 06:00 UTC: the next 1h close is 07:00, the next 1d close midnight.
+    assert CandleCache(clock=clock).expires_at("1h") == MIDNIGHT + 7 * HOUR + CLOSE_GRACE_SECONDS
+    assert CandleCache(clock=clock).expires_at("1d") == MIDNIGHT + DAY + CLOSE_GRACE_SECONDS
+    # max_age caps both.
+    assert CandleCache(clock=clock, max_age=600).expires_at("1d") == clock.now + 600
+
+
+def test_lru_evicts_least_recently_used(clock, klines):
+    cache = CandleCache(max_entries=2, clock=clock)
+    fetch = cached_fetcher(cache, klines.base_url)
+
+    async def scenario():
+        await fetch("BTCUSDT", "1h")
+        await fetch("ETHUSDT", "1h")
+        await fetch("BTCUSDT", "1h")  # BTC is now the most recent
+        await fetch("SOLUSDT", "1h")  # evicts ETH
+        await fetch("BTCUSDT", "1h")
+        await fetch("ETHUSDT", "1h")
+        return klines.requests
+
+    assert run(scenario) == 4
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (2, 2, 4)
+
+
+def test_disk_tier_round_trip(clock, klines, tmp_path):
+    disk_dir = str(tmp_path / "cache")
+    first_cache = CandleCache(disk_dir=disk_dir, clock=clock)
+    fetched = run(lambda: cached_fetcher(first_cache, klines.base_url)("BTCUSDT", "1h"))
+    assert [name for name in os.listdir(disk_dir) if name.endswith(".candles")]
+
+    # Another process (or a restart): nothing in memory, the entry is on disk.
+    second_cache = CandleCache(disk_dir=disk_dir, clock=clock)
+    fetch = cached_fetcher(second_cache, klines.base_url)
+    loaded = run(lambda: fetch("BTCUSDT", "1h"))
+    assert klines.requests == 1
+    assert np.array_equal(loaded.ts, fetched.ts)
+    assert np.array_equal(loaded.ohlc, fetched.ohlc)
+    assert not loaded.ohlc.flags.writeable
+    assert run(lambda: fetch("BTCUSDT", "1h")) is loaded
+    stats = second_cache.stats()
+    assert (stats["disk_hits"], stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0, 1.0)
+
+    # Past the bar close the disk entry is stale too, and is refetched.
+    clock.now += HOUR + CLOSE_GRACE_SECONDS
+    refetched = run(lambda: fetch("BTCUSDT", "1h"))
+    assert klines.requests == 2
+    assert int(refetched.ts[-1]) == int(fetched.ts[-1]) + HOUR * 1000
+    # ...and the disk entry is replaced for the next reader.
+    third_cache = CandleCache(disk_dir=disk_dir, clock=clock)
+    assert np.array_equal(third_cache.get(("binance", "BTCUSDT", "1h", 5)).ts, refetched.ts)
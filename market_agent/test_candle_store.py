@@ -0,0 +1,75 @@
+"""CandleStore's columnar files.
+
+    python -m pytest market_agent/test_candle_store.py
+"""
+import numpy as np
+
+from market_agent.candle_store import MIN_CAPACITY, CandleStore
+from market_agent.candles import Candles
+
+HOUR_MS = 3_600_000
+KEY = ("binance", "BTCUSDT", "1h")
+
+
+def bars(first: int, count: int, price: float = 100.0) -> Candles:
+    ts = (np.arange(first, first + count, dtype=np.int64)) * HOUR_MS
+    close = price + np.arange(first, first + count, dtype=np.float64)
+    return Candles(ts, np.vstack([close - 0.5, close + 1, close - 1, close]))
+
+
+def assert_same(a: Candles, b: Candles) -> None:
+    assert np.array_equal(a.ts, b.ts)
+    assert np.array_equal(a.ohlc, b.ohlc)
+
+
+def test_columns_are_contiguous_views(tmp_path):
+    store = CandleStore(str(tmp_path))
+    assert len(store.read(*KEY)) == 0
+    assert store.last_ts(*KEY) is None
+
+    assert store.append(*KEY, bars(0, 10)) == 10
+    stored = store.read(*KEY)
+    assert_same(stored, bars(0, 10))
+    for column in (stored.ts, stored.open, stored.high, stored.low, stored.close):
+        assert column.flags.c_contiguous
+        assert not column.flags.writeable
+    assert store.last_ts(*KEY) == 9 * HOUR_MS
+
+
+def test_forming_bar_is_overwritten(tmp_path):
+    store = CandleStore(str(tmp_path))
+    store.append(*KEY, bars(0, 5))
+    # Bar 4 closed at a different price, and bar 5 opened.
+    update = bars(4, 2, price=200.0)
+    assert store.append(*KEY, update) == 1
+    assert_same(store.read(*KEY), Candles.concat([bars(0, 4), update]))
+    # Bars older than the last stored one are ignored.
+    assert store.append(*KEY, bars(0, 3, price=300.0)) == 0
+    assert len(store.read(*KEY)) == 6
+
+
+def test_grows_past_capacity(tmp_path):
+    store = CandleStore(str(tmp_path))
+    store.append(*KEY, bars(0, MIN_CAPACITY - 1))
+    before = store.read(*KEY)
+    assert store.append(*KEY, bars(MIN_CAPACITY - 1, 2 * MIN_CAPACITY)) == 2 * MIN_CAPACITY
+    assert_same(store.read(*KEY), bars(0, 3 * MIN_CAPACITY - 1))
+    # A reader's earlier view still sees the file it mapped.
+    assert_same(before, bars(0, MIN_CAPACITY - 1))
+
+    # Appends keep going into the larger file, one bar at a time.
+    for i in range(3 * MIN_CAPACITY - 1, 3 * MIN_CAPACITY + 20):
+        store.append(*KEY, bars(i, 1))
+    assert_same(store.read(*KEY), bars(0, 3 * MIN_CAPACITY + 20))
+    assert store.stats()["bars_appended"] == 3 * MIN_CAPACITY + 20
+
+
+def test_series_are_separate_files(tmp_path):
+    store = CandleStore(str(tmp_path))
+    store.append("binance", "BTCUSDT", "1h", bars(0, 3))
+    store.append("binance", "ETHUSDT", "1h", bars(0, 5, price=10.0))
+    store.append("binance", "BTCUSDT", "4h", bars(0, 2))
+    assert [len(store.read("binance", s, i)) for s, i in (("BTCUSDT", "1h"), ("ETHUSDT", "1h"), ("BTCUSDT", "4h"))] == [3, 5, 2]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "binance_BTCUSDT_1h.cols", "binance_BTCUSDT_4h.cols", "binance_ETHUSDT_1h.cols",
+    ]
@@ -0,0 +1,39 @@
+"""Candles slicing.
+
+    python -m pytest market_agent/test_candles.py
+"""
+import numpy as np
+import pytest
+
+from market_agent.candles import Candles
+
+
+def make_candles(bars: int) -> Candles:
+    return Candles(np.arange(bars, dtype=np.int64), np.arange(4 * bars, dtype=np.float64).reshape(4, bars))
+
+
+@pytest.mark.parametrize("n", [0, 1, 3, 4])
+def test_tail_returns_the_last_n_bars(n):
+    candles = make_candles(5)
+    tail = candles.tail(n)
+    assert len(tail) == n
+    assert tail.ts.tolist() == list(range(5 - n, 5))
+    assert np.array_equal(tail.ohlc, candles.ohlc[:, 5 - n:])
+    # A view, not a copy.
+    assert n == 0 or np.shares_memory(tail.ohlc, candles.ohlc)
+
+
+@pytest.mark.parametrize("n", [5, 6, 1000])
+def test_tail_of_at_least_all_bars_is_everything(n):
+    candles = make_candles(5)
+    assert candles.tail(n) is candles
+
+
+def test_tail_of_empty_candles():
+    assert len(make_candles(0).tail(0)) == 0
+    assert len(make_candles(0).tail(3)) == 0
+
+
+def test_tail_rejects_negative_counts():
+    with pytest.raises(ValueError):
+        make_candles(5).tail(-1)
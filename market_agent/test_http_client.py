@@ -0,0 +1,41 @@
+"""The per-loop pooled HTTP client.
+
+    python -m pytest market_agent/test_http_client.py
+"""
+import asyncio
+import threading
+
+from market_agent import http_client
+
+
+async def _client_twice():
+    first = http_client.get_client()
+    await asyncio.sleep(0.05)
+    return first, http_client.get_client()
+
+
+def test_each_loop_keeps_its_own_client():
+    results = {}
+
+    def in_thread(name):
+        results[name] = asyncio.run(_client_twice())
+
+    # Loops running at the same time don't replace each other's client.
+    threads = [threading.Thread(target=in_thread, args=(name,)) for name in "ab"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    (a1, a2), (b1, b2) = results["a"], results["b"]
+    assert a1 is a2 and b1 is b2 and a1 is not b1
+    # Their loops ended without aclose(); the next loop forgets their clients.
+    asyncio.run(_client_twice())
+    assert all(client not in http_client._clients.values() for client in (a1, b1))
+
+    async def close():
+        client = http_client.get_client()
+        await http_client.aclose()
+        return client
+
+    assert asyncio.run(close()).is_closed
+    assert http_client._clients == {}
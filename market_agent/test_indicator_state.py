@@ -0,0 +1,148 @@
+"""Streaming EMA / RSI state and its persistence.
+
+    python -m pytest market_agent/test_indicator_state.py
+"""
+import asyncio
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from market_agent.indicator_state import RSI_PERIOD, IndicatorStateStore, StreamingIndicators
+from market_agent.indicators import price_decimals, rsi_values
+
+
+def random_closes(seed: int, scale: float, bars: int = 300) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return scale * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+
+
+def wilder_rsi(closes: np.ndarray) -> float:
+    """RSI seeded from the simple average of the first changes, then Wilder smoothed."""
+    changes = np.diff(closes)
+    gains, losses = np.maximum(changes, 0), np.abs(np.minimum(changes, 0))
+    avg_gain, avg_loss = gains[:RSI_PERIOD].mean(), losses[:RSI_PERIOD].mean()
+    for gain, loss in zip(gains[RSI_PERIOD:], losses[RSI_PERIOD:]):
+        avg_gain = (avg_gain * (RSI_PERIOD - 1) + gain) / RSI_PERIOD
+        avg_loss = (avg_loss * (RSI_PERIOD - 1) + loss) / RSI_PERIOD
+    return 100.0 if avg_loss == 0 else 100 - 100 / (1 + avg_gain / avg_loss)
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("scale", [0.6, 1.08, 150.0, 60_000.0])
+def test_updates_match_batch_ema_and_rsi(seed, scale):
+    closes = random_closes(seed, scale)
+    state = StreamingIndicators()
+    for i, close in enumerate(closes):
+        assert state.update(float(close), i)
+        if i == RSI_PERIOD:
+            # After exactly RSI_PERIOD changes the averages are simple ones.
+            assert state.ready
+            assert state.rsi() == round(float(rsi_values(closes[:i + 1])[0]), 2)
+    assert not state.update(float(closes[-1]), len(closes) - 1)
+
+    series = pd.Series(closes)
+    ema20 = series.ewm(span=20, adjust=False).mean().iloc[-1]
+    ema50 = series.ewm(span=50, adjust=False).mean().iloc[-1]
+    assert state.ema20 == pytest.approx(ema20, rel=1e-12)
+    assert state.ema50 == pytest.approx(ema50, rel=1e-12)
+    assert state.rsi() == pytest.approx(round(wilder_rsi(closes), 2), abs=0.011)
+
+    snapshot = state.snapshot()
+    decimals = price_decimals(closes[-1])
+    assert snapshot["ema20"] == round(state.ema20, decimals)
+    assert snapshot["ema50"] == round(state.ema50, decimals)
+    assert snapshot["bars"] == len(closes)
+
+
+def test_fx_snapshot_keeps_pips():
+    state = StreamingIndicators()
+    for i, close in enumerate(random_closes(1, 1.08)):
+        state.update(float(close), i)
+    snapshot = state.snapshot()
+    assert snapshot["ema20"] != round(snapshot["ema20"], 2)
+    assert snapshot["ema20"] == pytest.approx(state.ema20, abs=5e-6)
+
+
+def test_bytes_round_trip():
+    state = StreamingIndicators()
+    for i, close in enumerate(random_closes(2, 30_000.0, bars=40)):
+        state.update(float(close), 1_000 * i)
+    restored = StreamingIndicators.from_bytes(state.to_bytes())
+    assert [getattr(restored, name) for name in StreamingIndicators.__slots__] == [
+        getattr(state, name) for name in StreamingIndicators.__slots__
+    ]
+    # The restored state carries on exactly like the original.
+    assert not restored.update(1.0, 39_000)
+    for target in (state, restored):
+        target.update(31_000.0, 40_000)
+    assert restored.snapshot() == state.snapshot()
+
+
+def test_store_round_trip(tmp_path):
+    path = str(tmp_path / "state.json")
+    store = IndicatorStateStore(path)
+    for i, close in enumerate(random_closes(3, 2_000.0, bars=60)):
+        store.get("ETHUSDT", "4h").update(float(close), i)
+    store.get("BTCUSDT", "1d").update(50_000.0, 7)
+    store.save()
+
+    loaded = IndicatorStateStore(path)
+    assert loaded.get("ETHUSDT", "4h").to_bytes() == store.get("ETHUSDT", "4h").to_bytes()
+    assert loaded.get("BTCUSDT", "1d").to_bytes() == store.get("BTCUSDT", "1d").to_bytes()
+
+
+def test_concurrent_saves_from_several_workers(tmp_path):
+    path = str(tmp_path / "state.json")
+    stores = [IndicatorStateStore(path) for _ in range(8)]
+    for i, store in enumerate(stores):
+        store.get("BTCUSDT", "4h").update(100.0 + i, 1)
+    errors = []
+
+    def save_repeatedly(store):
+        try:
+            for _ in range(100):
+                store.save()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save_repeatedly, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    # Only the state file is left, holding one worker's complete save.
+    assert os.listdir(tmp_path) == ["state.json"]
+    assert IndicatorStateStore(path).get("BTCUSDT", "4h").prev_close in {100.0 + i for i in range(8)}
+
+
+def test_live_feed_closes_share_one_save_off_the_loop(tmp_path, monkeypatch):
+    from market_agent import agent
+    from market_agent.candles import Candles
+
+    store = IndicatorStateStore(str(tmp_path / "state.json"))
+    saves = []
+    save = store.save
+    monkeypatch.setattr(store, "save", lambda: saves.append(threading.current_thread().name) or save())
+    monkeypatch.setattr(agent, "indicator_states", store)
+    monkeypatch.setattr(agent, "INDICATOR_STATE_SAVE_DELAY", 0.05)
+    step = 4 * 3_600_000
+    closes = random_closes(4, 60_000.0, bars=30)
+    candles = Candles(np.arange(30, dtype=np.int64) * step, np.vstack([closes] * 4))
+
+    async def scenario():
+        # One on_close per bar, as the kline feed calls it from the event loop.
+        for bars in range(20, 31):
+            agent._advance_crypto_state("BTCUSDT", "4h", candles[:bars])
+        assert saves == []
+        await asyncio.sleep(0.2)
+        agent._advance_crypto_state("BTCUSDT", "4h", candles)  # nothing new: no save
+        await asyncio.sleep(0.2)
+
+    asyncio.run(scenario())
+    assert len(saves) == 1 and saves[0].startswith("blocking")
+    assert IndicatorStateStore(store.path).get("BTCUSDT", "4h").bars == 30
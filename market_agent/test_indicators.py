@@ -0,0 +1,184 @@
+"""Parity of the batched indicator engine with agent.py's scalar functions and pandas.
+
+    python -m pytest market_agent/test_indicators.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from market_agent.agent import calculate_ema, calculate_rsi
+from market_agent.indicators import (
+    batch_indicators,
+    ema_last,
+    ema_values,
+    indicator_fields,
+    price_decimals,
+    rsi_seed,
+    rsi_values,
+    signal_fields,
+)
+
+# Short series exercise the windows that start at the first bar.
+LENGTHS = (1, 2, 14, 15, 16, 20, 21, 49, 50, 51, 200)
+
+
+def random_walk(rng: np.random.Generator, rows: int, bars: int, scale: float = 100.0):
+    closes = scale * np.exp(np.cumsum(rng.normal(0, 0.02, (rows, bars)), axis=1))
+    highs = closes * (1 + rng.uniform(0, 0.02, (rows, bars)))
+    lows = closes * (1 - rng.uniform(0, 0.02, (rows, bars)))
+    return closes, highs, lows
+
+
+def scalar_ema(values: list[float], period: int) -> float:
+    """calculate_ema without its rounding."""
+    k = 2 / (period + 1)
+    ema = values[0]
+    for price in values[1:]:
+        ema = price * k + ema * (1 - k)
+    return ema
+
+
+def scalar_snapshot(closes: list[float], highs: list[float], lows: list[float]) -> dict:
+    """What the snapshot tools computed before the batched engine, EMAs at the price's precision."""
+    decimals = price_decimals(closes[-1])
+    return {
+        "ema20": round(scalar_ema(closes[-20:], 20), decimals),
+        "ema50": round(scalar_ema(closes[-50:], 50), decimals),
+        "rsi14": calculate_rsi(closes),
+        "high_recent": max(highs[-20:]),
+        "low_recent": min(lows[-20:]),
+    }
+
+
+@pytest.mark.parametrize("bars", LENGTHS)
+@pytest.mark.parametrize("scale", (1.08, 2400.0, 104523.17))
+def test_batch_matches_scalar(bars, scale):
+    rng = np.random.default_rng(bars)
+    for _ in range(20):
+        closes, highs, lows = random_walk(rng, 1, bars, scale)
+        expected = scalar_snapshot(closes[0].tolist(), highs[0].tolist(), lows[0].tolist())
+        batch = batch_indicators(closes, highs, lows)
+        assert batch["last"][0] == closes[0, -1]
+        for name, value in expected.items():
+            assert batch[name][0] == value, name
+        if price_decimals(closes[0, -1]) == 2:
+            assert batch["ema20"][0] == calculate_ema(closes[0, -20:].tolist(), 20)
+
+
+def reference_volatility(closes: np.ndarray, highs: np.ndarray, lows: np.ndarray) -> dict:
+    """MACD, ATR14, Bollinger width and 20-bar range, unrounded, from pandas and plain loops."""
+    close = pd.Series(closes)
+    macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    signal = macd.ewm(span=9, adjust=False).mean()
+
+    # Wilder's ATR: the mean of the first 14 true ranges, then smoothed.
+    prev = closes[:-1]
+    true_range = np.maximum(highs[1:] - lows[1:], np.maximum(abs(highs[1:] - prev), abs(lows[1:] - prev)))
+    if len(true_range):
+        atr = true_range[:14].mean()
+        for tr in true_range[14:]:
+            atr = (atr * 13 + tr) / 14
+    else:
+        atr = highs[0] - lows[0]
+
+    window = close.tail(20)
+    high_recent, low_recent = highs[-20:].max(), lows[-20:].min()
+    return {
+        "macd": macd.iloc[-1],
+        "macd_signal": signal.iloc[-1],
+        "macd_hist": macd.iloc[-1] - signal.iloc[-1],
+        "atr14": atr,
+        "atr_pct": atr / closes[-1] * 100,
+        "bb_width": 4 * window.std(ddof=0) / window.mean() * 100,
+        "range_pct": (high_recent - low_recent) / closes[-1] * 100,
+    }
+
+
+# Rounded to 4 significant digits, and to 2 decimals (percentages).
+SIGNIFICANT = ("macd", "macd_signal", "macd_hist", "atr14")
+PERCENT = ("atr_pct", "bb_width", "range_pct")
+
+
+@pytest.mark.parametrize("bars", LENGTHS)
+@pytest.mark.parametrize("scale", (1.08, 2400.0, 104523.17))
+def test_volatility_indicators_match_reference(bars, scale):
+    rng = np.random.default_rng(2000 + bars)
+    closes, highs, lows = random_walk(rng, 30, bars, scale)
+    batch = batch_indicators(closes, highs, lows)
+    for row in range(30):
+        expected = reference_volatility(closes[row], highs[row], lows[row])
+        for name in SIGNIFICANT:
+            assert batch[name][row] == pytest.approx(expected[name], rel=5.01e-4, abs=1e-12), name
+            assert batch[name][row] == float(f"{batch[name][row]:.4g}"), name
+        for name in PERCENT:
+            assert batch[name][row] == pytest.approx(expected[name], abs=0.00501), name
+            assert batch[name][row] == round(batch[name][row], 2), name
+
+
+@pytest.mark.parametrize("bars", LENGTHS)
+def test_rows_are_independent(bars):
+    rng = np.random.default_rng(1000 + bars)
+    closes, highs, lows = random_walk(rng, 5, bars)
+    batch = batch_indicators(closes, highs, lows)
+    for row in range(5):
+        single = batch_indicators(closes[row], highs[row], lows[row])
+        for name, values in batch.items():
+            assert values[row] == single[name][0], name
+
+
+@pytest.mark.parametrize("bars", (15, 50, 200))
+def test_ema_last_and_rsi_seed_match_scalar(bars):
+    rng = np.random.default_rng(bars)
+    closes, _, _ = random_walk(rng, 3, bars)
+    for row in closes:
+        values = row.tolist()
+        assert ema_last(row, 20)[0] == calculate_ema(values[-20:], 20)
+        assert ema_last(row, 50)[0] == calculate_ema(values[-50:], 50)
+        assert rsi_seed(row)[0] == calculate_rsi(values)
+
+
+@pytest.mark.parametrize("bars", (15, 50, 200))
+def test_unrounded_values_match_scalar(bars):
+    rng = np.random.default_rng(bars)
+    closes, _, _ = random_walk(rng, 3, bars, scale=1.08)
+    for row in closes:
+        values = row.tolist()
+        assert ema_values(row, 20)[0] == scalar_ema(values[-20:], 20)
+        assert round(float(rsi_values(row)[0]), 2) == calculate_rsi(values)
+
+
+@pytest.mark.parametrize("price, decimals", [
+    (104523.17, 2), (2400.0, 2), (151.234, 3), (1.08123, 5), (0.12345, 6), (0.0, 2),
+])
+def test_price_decimals(price, decimals):
+    assert price_decimals(price) == decimals
+
+
+def test_fx_uptrend_is_bullish():
+    # EUR/USD climbing steadily from 1.07 to 1.089: EMA20 rounded to 2 decimals
+    # would be 1.09, above the last price, and the trend would read Range.
+    closes = np.linspace(1.07, 1.089, 100)
+    fields = indicator_fields(closes, closes + 0.0005, closes - 0.0005)
+    assert fields["last"] == 1.089
+    assert fields["last"] > fields["ema20"] > fields["ema50"]
+    assert round(fields["ema20"], 2) == 1.09
+    assert signal_fields(fields) == {"trend": "Bullish", "volatility": "Low", "bias": "Buy"}
+
+
+def test_fx_downtrend_is_bearish():
+    closes = np.linspace(1.089, 1.07, 100)
+    fields = indicator_fields(closes, closes + 0.0005, closes - 0.0005)
+    assert fields["last"] < fields["ema20"] < fields["ema50"]
+    assert signal_fields(fields)["trend"] == "Bearish"
+
+
+def test_flat_series_has_rsi_100():
+    closes = np.full(30, 1.25)
+    batch = batch_indicators(closes, closes, closes)
+    assert batch["rsi14"][0] == calculate_rsi(closes.tolist()) == 100.0
+    assert batch["range_pct"][0] == 0.0
+
+
+def test_mismatched_shapes_rejected():
+    with pytest.raises(ValueError):
+        batch_indicators(np.ones(20), np.ones(20), np.ones(19))
@@ -0,0 +1,139 @@
+"""CandleRing, and KlineFeed against a local scripted kline stream.
+
+    python -m pytest market_agent/test_kline_feed.py
+"""
+import asyncio
+import json
+import os
+import sys
+
+import numpy as np
+from websockets.asyncio.server import serve
+
+from market_agent.candles import Candles
+from market_agent.kline_feed import CandleRing, KlineFeed
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from fake_binance import Market  # noqa: E402
+
+MINUTE_MS = 60_000
+START_MS = 1_704_067_200_000  # 2024-01-01
+market = Market(seed=3)
+
+
+def bar(i: int) -> list:
+    return market.bar("BTCUSDT", "1m", START_MS + i * MINUTE_MS)
+
+
+def bars(first: int, last: int) -> Candles:
+    return Candles.from_binance([bar(i) for i in range(first, last + 1)])
+
+
+def kline_message(i: int, closed: bool, close: float | None = None) -> str:
+    t, o, h, l, c, *_ = bar(i)
+    kline = {"t": t, "T": t + MINUTE_MS - 1, "s": "BTCUSDT", "i": "1m",
+             "o": o, "h": h, "l": l, "c": str(close) if close is not None else c, "x": closed}
+    return json.dumps({"stream": "btcusdt@kline_1m", "data": {"e": "kline", "s": "BTCUSDT", "k": kline}})
+
+
+def test_ring_wraps_around_keeping_the_newest_bars():
+    ring = CandleRing(4)
+    ring.extend(bars(0, 9))
+    view = ring.view()
+    assert ring.size == 4
+    assert np.array_equal(view.ts, bars(6, 9).ts)
+    assert np.array_equal(view.ohlc, bars(6, 9).ohlc)
+    # One contiguous slice of the doubled buffer, not a copy.
+    assert view.ts.base is not None and view.close.flags.c_contiguous
+    # Older bars than the newest are ignored.
+    assert not ring.update(int(bars(5, 5).ts[0]), 1, 1, 1, 1)
+    assert ring.last_ts == int(bars(9, 9).ts[0])
+
+
+def test_ring_replaces_the_forming_bar():
+    ring = CandleRing(3)
+    ring.extend(bars(0, 2))
+    ts = int(ring.last_ts)
+    version = ring.version
+    assert ring.update(ts, 1.0, 3.0, 0.5, 2.0)
+    assert ring.size == 3 and ring.version == version + 1
+    assert ring.view().ohlc[:, -1].tolist() == [1.0, 3.0, 0.5, 2.0]
+    assert np.array_equal(ring.view().ts, bars(0, 2).ts)
+
+
+def test_handle_replaces_the_forming_bar_and_fires_on_close_once():
+    closes = []
+    feed = KlineFeed("ws://unused", ["BTCUSDT"], "1m", backfill=None, capacity=10,
+                     on_close=lambda symbol, candles: closes.append((symbol, candles.ts.copy(), candles.close.copy())))
+    feed.rings["BTCUSDT"].extend(bars(0, 2))
+
+    feed._handle(kline_message(2, closed=False, close=123.0))
+    feed._handle(kline_message(2, closed=False, close=124.0))
+    ring = feed.rings["BTCUSDT"]
+    assert ring.size == 3 and ring.view().close[-1] == 124.0
+    assert closes == []
+
+    feed._handle(kline_message(2, closed=True))
+    feed._handle(kline_message(3, closed=False))
+    # A repeated close (e.g. after a reconnect) is not reported again.
+    feed._handle(kline_message(2, closed=True))
+    feed._handle(kline_message(3, closed=True))
+    assert [(symbol, ts[-1], len(ts)) for symbol, ts, _ in closes] == [
+        ("BTCUSDT", bar(2)[0], 3), ("BTCUSDT", bar(3)[0], 4),
+    ]
+    assert closes[0][2][-1] == float(bar(2)[4])
+    assert feed.messages == 6
+
+
+async def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_reconnect_backfills_the_gap():
+    # Each connection plays one script; the server hangs up after the first.
+    scripts = [
+        [kline_message(2, closed=False), kline_message(2, closed=True), kline_message(3, closed=False)],
+        [kline_message(5, closed=True), kline_message(6, closed=False)],
+    ]
+    backfills = []
+    closes = []
+
+    async def backfill(symbol, since):
+        backfills.append((symbol, since))
+        # Bars 3 and 4 closed while the stream was down.
+        return bars(0, 2) if since is None else bars(3, 5)
+
+    async def stream(ws):
+        script = scripts.pop(0)
+        for message in script:
+            await ws.send(message)
+        if scripts:
+            return
+        await ws.wait_closed()
+
+    async def scenario():
+        async with serve(stream, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            feed = KlineFeed(f"ws://127.0.0.1:{port}", ["btcusdt"], "1m", backfill, capacity=5,
+                             reconnect_delay=0.01, on_close=lambda symbol, candles: closes.append(candles.ts.copy()))
+            feed.start()
+            try:
+                await _wait_for(lambda: feed.rings["BTCUSDT"].last_ts == bar(6)[0])
+                assert feed.live("BTCUSDT")
+            finally:
+                await feed.stop()
+            return feed
+
+    feed = asyncio.run(scenario())
+    assert backfills == [("BTCUSDT", None), ("BTCUSDT", bar(3)[0])]
+    assert feed.reconnects == 1
+    # No gap: the ring holds bars 2..6 in order, bar 3 as backfilled.
+    view = feed.rings["BTCUSDT"].view()
+    assert np.array_equal(view.ts, bars(2, 6).ts)
+    assert np.array_equal(view.ohlc[:, :-1], bars(2, 5).ohlc)
+    assert [int(ts[-1]) for ts in closes] == [bar(2)[0], bar(5)[0]]
+    assert np.array_equal(closes[1][-4:], bars(2, 5).ts)
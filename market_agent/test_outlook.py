@@ -0,0 +1,51 @@
+"""Rendering of the outlook's fixed lines.
+
+    python -m pytest market_agent/test_outlook.py
+"""
+import pytest
+
+from market_agent.outlook import _price, render
+
+
+@pytest.mark.parametrize("value, text", [
+    (104523.17, "104,523.17"),
+    (67234.51, "67,234.51"),
+    (67234.5, "67,234.50"),
+    (2400.0, "2,400.00"),
+    (151.234, "151.234"),
+    (1.08123, "1.08123"),
+    (0.12, "0.12"),
+    (1e-05, "0.00001"),
+])
+def test_price_keeps_every_decimal(value, text):
+    assert _price(value) == text
+
+
+def test_render_crypto_outlook():
+    snapshot = {
+        "symbol": "BTCUSDT", "last_price": 104523.17, "ema20": 103876.4, "ema50": 99012.85,
+        "rsi14": 61.37, "trend": "Bullish", "volatility": "Normal", "range_pct": 7.12, "bias": "Buy",
+    }
+    assert render("fetch_crypto_snapshot", snapshot, " Holding above EMA20. ") == (
+        "🌅 Crypto Market Outlook\n\n"
+        "BTC/USD:\n"
+        "- Price: 104,523.17\n"
+        "- EMA20 / EMA50: 103,876.40 / 99,012.85\n"
+        "- RSI14: 61.37\n"
+        "- Trend: Bullish\n"
+        "- Volatility: Normal (range 7.12%)\n"
+        "- Bias: Buy\n"
+        "- Notes: Holding above EMA20."
+    )
+
+
+def test_render_fx_outlook_keeps_pips():
+    snapshot = {
+        "pair": "EUR/USD", "price": 1.08123, "ema20": 1.08, "ema50": 1.07,
+        "rsi14": 48.2, "trend": "Range", "volatility": "Low", "range_pct": 1.4, "bias": "Wait",
+    }
+    assert "- Price: 1.08123\n" in render("fetch_fx_snapshot", snapshot, "")
+
+
+def test_unknown_tool_returns_notes():
+    assert render("get_time", {}, "just notes") == "just notes"
@@ -0,0 +1,204 @@
+"""ProviderScheduler and the candle cache's stale fallback, on a fake clock
+and a local fake klines server.
+
+    python -m pytest market_agent/test_rate_limit.py
+"""
+import asyncio
+import json
+import multiprocessing
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from market_agent import http_client
+from market_agent.candle_cache import CandleCache
+from market_agent.candles import Candles
+from market_agent.rate_limit import (
+    ADHOC,
+    SCHEDULED,
+    ProviderScheduler,
+    RateLimited,
+    TokenBucket,
+    stale_fallback,
+)
+
+DAY_MS = 86_400_000
+
+
+class FakeClock:
+    """Time that only moves when something sleeps on it."""
+
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        # Let everything already runnable go first, as a real sleep would.
+        await asyncio.sleep(0)
+        self.now += seconds
+
+
+def make_scheduler(clock: FakeClock, capacity: float = 1, period: float = 10) -> ProviderScheduler:
+    return ProviderScheduler("fake", [TokenBucket(capacity, period, clock=clock)], clock=clock, sleep=clock.sleep)
+
+
+@pytest.fixture
+def klines_server():
+    """Serves three closed daily bars ending before FakeClock's start; yields (base_url, request paths)."""
+    requests = []
+    first = int(FakeClock().now * 1000) // DAY_MS * DAY_MS - 3 * DAY_MS
+    body = json.dumps([[first + i * DAY_MS, "1", "2", "0.5", str(1.5 + i), "0"] for i in range(3)]).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", requests
+    server.shutdown()
+    server.server_close()
+
+
+def test_scheduled_requests_go_ahead_of_adhoc():
+    async def run():
+        clock = FakeClock()
+        limits = make_scheduler(clock)
+        start = clock()
+        await limits.acquire()  # the only token
+        granted = []
+
+        async def request(name: str, priority: int) -> None:
+            await limits.acquire(priority=priority)
+            granted.append((name, clock() - start))
+
+        await asyncio.gather(
+            request("adhoc-1", ADHOC),
+            request("adhoc-2", ADHOC),
+            request("scheduled", SCHEDULED),
+        )
+        return granted, limits.stats()
+
+    granted, stats = asyncio.run(run())
+    assert [name for name, _ in granted] == ["scheduled", "adhoc-1", "adhoc-2"]
+    assert [at for _, at in granted] == pytest.approx([10, 20, 30])
+    assert stats["granted"] == 4
+    assert stats["queued"] == 0
+    assert stats["wait_max_s"] == pytest.approx(30, abs=0.01)
+
+
+def test_max_wait_raises_rate_limited():
+    async def run():
+        clock = FakeClock()
+        limits = make_scheduler(clock)
+        await limits.acquire()
+        with pytest.raises(RateLimited) as raised:
+            await limits.acquire(max_wait=2)
+        assert raised.value.provider == "fake"
+        assert raised.value.wait == pytest.approx(10)
+
+        clock.now += 9
+        await limits.acquire(max_wait=2)  # one second to wait
+        return limits.stats()
+
+    stats = asyncio.run(run())
+    assert stats["throttled"] == 1
+    assert stats["granted"] == 2
+
+
+def test_max_wait_counts_queued_requests_ahead():
+    async def run():
+        clock = FakeClock()
+        limits = make_scheduler(clock)
+        await limits.acquire()
+        # A scheduled request is already waiting for the next token.
+        waiting = asyncio.ensure_future(limits.acquire(priority=SCHEDULED))
+        await asyncio.sleep(0)
+        with pytest.raises(RateLimited) as raised:
+            await limits.acquire(priority=ADHOC, max_wait=15)
+        await waiting
+        return raised.value.wait
+
+    assert asyncio.run(run()) == pytest.approx(20)
+
+
+def test_cache_serves_stale_entry_when_throttled(klines_server):
+    base_url, requests = klines_server
+
+    async def run():
+        clock = FakeClock()
+        cache = CandleCache(clock=clock)
+        # One call per ten days: the second fetch can't get a token in time.
+        limits = make_scheduler(clock, capacity=1, period=10 * 86400)
+
+        @cache.cached("binance", lambda a: (a["symbol"], "1d", 3))
+        async def fetch(symbol: str) -> Candles:
+            await limits.acquire(max_wait=2 if stale_fallback.get() else None)
+            return Candles.from_binance(await http_client.get_json(f"{base_url}/api/v3/klines", params={"symbol": symbol}))
+
+        try:
+            fresh = await fetch("BTCUSDT")
+            clock.now += 2 * 86400  # past the next bar close
+            stale = await fetch("BTCUSDT")
+            assert stale is fresh
+            assert len(requests) == 1
+            assert cache.stats()["stale_served"] == 1
+
+            # Nothing cached for ETH: the request queues for quota instead.
+            before = clock()
+            eth = await fetch("ETHUSDT")
+            assert len(eth) == 3
+            assert len(requests) == 2
+            assert clock() - before > 86400
+        finally:
+            await http_client.aclose()
+        return limits.stats()
+
+    stats = asyncio.run(run())
+    assert stats["throttled"] == 1
+    assert stats["granted"] == 2
+
+
+def test_buckets_on_one_path_share_tokens(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "provider.bucket")
+    first = TokenBucket(5, 60, clock=clock, path=path)
+    second = TokenBucket(5, 60, clock=clock, path=path)  # another worker
+    first.take(3)
+    assert second.wait_time(2) == 0
+    second.take(2)
+    assert first.wait_time(1) == pytest.approx(12)
+    clock.now += 12
+    assert second.wait_time(1) == 0
+
+
+def _spend(path: str, attempts: int, granted) -> None:
+    limits = ProviderScheduler("shared", [TokenBucket(10, 3600, path=path)])
+    for _ in range(attempts):
+        if limits._try_take(1, limits.clock()) == 0:
+            with granted.get_lock():
+                granted.value += 1
+
+
+def test_workers_do_not_multiply_the_quota(tmp_path):
+    path = str(tmp_path / "provider.bucket")
+    granted = multiprocessing.Value("i", 0)
+    workers = [multiprocessing.Process(target=_spend, args=(path, 50, granted)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    assert [worker.exitcode for worker in workers] == [0] * 4
+    # 4 workers x 50 attempts against one 10-token hourly bucket.
+    assert granted.value == 10
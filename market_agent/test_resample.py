@@ -0,0 +1,88 @@
+"""Higher-timeframe candles from a base interval, against pandas resampling.
+
+    python -m pytest market_agent/test_resample.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from market_agent.candles import Candles
+from market_agent.resample import bucket_starts, resample
+
+HOUR_MS = 3_600_000
+DAY_MS = 24 * HOUR_MS
+MONDAY_MS = 1_704_067_200_000  # 2024-01-01, a Monday
+
+
+def random_candles(start_ms: int, step_ms: int, bars: int, seed: int = 0) -> Candles:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    open_ = np.r_[100.0, close[:-1]]
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, bars))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, bars))
+    ts = start_ms + step_ms * np.arange(bars, dtype=np.int64)
+    return Candles(ts, np.vstack([open_, high, low, close]))
+
+
+def pandas_resample(candles: Candles, rule: str) -> pd.DataFrame:
+    df = pd.DataFrame(
+        candles.ohlc.T, columns=["Open", "High", "Low", "Close"],
+        index=pd.to_datetime(candles.ts, unit="ms"),
+    )
+    agg = df.resample(rule, label="left", closed="left").agg(
+        {"Open": "first", "High": "max", "Low": "min", "Close": "last"}
+    )
+    return agg.dropna()
+
+
+def assert_matches(result: Candles, expected: pd.DataFrame) -> None:
+    assert result.ts.tolist() == expected.index.values.astype("datetime64[ms]").astype(np.int64).tolist()
+    assert np.array_equal(result.ohlc, expected.to_numpy().T)
+
+
+def test_weekly_buckets_start_on_monday():
+    wednesday = MONDAY_MS + 2 * DAY_MS
+    sunday_night = MONDAY_MS + 7 * DAY_MS - 1
+    next_monday = MONDAY_MS + 7 * DAY_MS
+    starts = bucket_starts(np.array([MONDAY_MS, wednesday, sunday_night, next_monday]), "1w")
+    assert starts.tolist() == [MONDAY_MS, MONDAY_MS, MONDAY_MS, next_monday]
+    # Epoch-aligned intervals are unaffected.
+    assert bucket_starts(np.array([wednesday + 5 * HOUR_MS]), "4h").tolist() == [wednesday + 4 * HOUR_MS]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_4h_to_1d_matches_pandas(seed):
+    candles = random_candles(MONDAY_MS, 4 * HOUR_MS, 6 * 30 + 3, seed)
+    daily = resample(candles, "1d")
+    assert len(daily) == 31
+    assert_matches(daily, pandas_resample(candles, "1D"))
+    # The trailing day only has 3 of its 6 bars, like an exchange's forming bar.
+    assert daily.close[-1] == candles.close[-1]
+    assert daily.open[-1] == candles.open[-3]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_1d_to_1w_matches_pandas(seed):
+    candles = random_candles(MONDAY_MS, DAY_MS, 7 * 12, seed)
+    weekly = resample(candles, "1w")
+    assert len(weekly) == 12
+    assert_matches(weekly, pandas_resample(candles, "W-MON"))
+
+
+def test_partial_leading_bucket_is_dropped():
+    # Starts on a Wednesday: the first week is only partly covered.
+    candles = random_candles(MONDAY_MS + 2 * DAY_MS, DAY_MS, 20)
+    weekly = resample(candles, "1w")
+    assert weekly.ts.tolist() == [MONDAY_MS + 7 * DAY_MS, MONDAY_MS + 14 * DAY_MS, MONDAY_MS + 21 * DAY_MS]
+    assert weekly.open[0] == candles.open[5]
+    assert_matches(weekly, pandas_resample(candles[5:], "W-MON"))
+
+    # Same for 4h bars starting at 08:00.
+    intraday = random_candles(MONDAY_MS + 8 * HOUR_MS, 4 * HOUR_MS, 16)
+    assert resample(intraday, "1d").ts.tolist() == [MONDAY_MS + DAY_MS, MONDAY_MS + 2 * DAY_MS]
+
+
+def test_only_a_partial_bucket_gives_no_bars():
+    candles = random_candles(MONDAY_MS + 4 * HOUR_MS, 4 * HOUR_MS, 3)
+    assert len(resample(candles, "1d")) == 0
+    assert len(resample(candles[:0], "1d")) == 0
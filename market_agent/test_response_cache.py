@@ -0,0 +1,117 @@
+"""The analysts' LLM reply cache, driven through its model callbacks.
+
+    python -m pytest market_agent/test_response_cache.py
+"""
+from types import SimpleNamespace
+
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai.types import Content, FunctionCall, FunctionResponse, GenerateContentConfig, Part
+
+from market_agent.response_cache import ResponseCache
+
+INSTRUCTION = "You are a crypto analyst. Use fetch_crypto_snapshot."
+SNAPSHOT = {"symbol": "BTCUSDT", "last_price": 104523.17, "ema20": 103900.5, "rsi14": 61.2}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def context(invocation_id: str = "inv-1", agent_name: str = "CryptoAnalyst"):
+    # The cache only reads these two attributes of ADK's CallbackContext.
+    return SimpleNamespace(invocation_id=invocation_id, agent_name=agent_name)
+
+
+def request(snapshot: dict | None = SNAPSHOT, instruction: str = INSTRUCTION) -> LlmRequest:
+    contents = [Content(role="user", parts=[Part(text="Analyze BTC")])]
+    if snapshot is not None:
+        contents.append(Content(role="user", parts=[
+            Part(function_response=FunctionResponse(name="fetch_crypto_snapshot", response=snapshot)),
+        ]))
+    return LlmRequest(contents=contents, config=GenerateContentConfig(system_instruction=instruction))
+
+
+def reply(text: str = "Bias: Buy") -> LlmResponse:
+    return LlmResponse(content=Content(role="model", parts=[Part(text=text)]))
+
+
+def answer(cache: ResponseCache, llm_request: LlmRequest, invocation_id: str = "inv-1", text: str = "Bias: Buy"):
+    """One model call through the callbacks: the cached reply, or None after caching `text`."""
+    ctx = context(invocation_id)
+    cached = cache.before_model(ctx, llm_request)
+    if cached is None:
+        cache.after_model(ctx, reply(text))
+    return cached
+
+
+def test_key_covers_agent_instruction_and_snapshot():
+    key = ResponseCache.key("CryptoAnalyst", INSTRUCTION, SNAPSHOT)
+    assert key == ResponseCache.key("CryptoAnalyst", INSTRUCTION, dict(reversed(list(SNAPSHOT.items()))))
+    assert key != ResponseCache.key("FXAnalyst", INSTRUCTION, SNAPSHOT)
+    assert key != ResponseCache.key("CryptoAnalyst", INSTRUCTION + " Be brief.", SNAPSHOT)
+    assert key != ResponseCache.key("CryptoAnalyst", INSTRUCTION, {**SNAPSHOT, "rsi14": 61.3})
+
+
+def test_same_snapshot_is_a_hit():
+    cache = ResponseCache()
+    assert answer(cache, request()) is None
+    hit = answer(cache, request(), invocation_id="inv-2")
+    assert hit.content.parts[0].text == "Bias: Buy"
+    # Callers get their own copy.
+    hit.content.parts[0].text = "changed"
+    assert answer(cache, request(), invocation_id="inv-3").content.parts[0].text == "Bias: Buy"
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 1, "hit_rate": 0.6667}
+
+
+def test_changed_instruction_or_snapshot_is_a_miss():
+    cache = ResponseCache()
+    answer(cache, request())
+    assert answer(cache, request(instruction=INSTRUCTION + " Mention support levels."), "inv-2") is None
+    assert answer(cache, request({**SNAPSHOT, "last_price": 104600.0}), "inv-3") is None
+    assert cache.stats()["misses"] == 3 and cache.stats()["entries"] == 3
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = ResponseCache(ttl_seconds=60, clock=clock)
+    answer(cache, request())
+    clock.now = 59
+    assert answer(cache, request(), "inv-2") is not None
+    clock.now = 60
+    assert answer(cache, request(), "inv-3", text="Bias: Wait") is None
+    assert answer(cache, request(), "inv-4").content.parts[0].text == "Bias: Wait"
+
+
+def test_lru_eviction():
+    cache = ResponseCache(max_entries=2)
+    for i, price in enumerate((1.0, 2.0, 3.0)):
+        answer(cache, request({**SNAPSHOT, "last_price": price}), f"inv-{i}")
+    assert cache.stats()["entries"] == 2
+    assert answer(cache, request({**SNAPSHOT, "last_price": 1.0}), "inv-9") is None
+    assert answer(cache, request({**SNAPSHOT, "last_price": 3.0}), "inv-10") is not None
+
+
+def test_requests_without_a_snapshot_are_not_cached():
+    cache = ResponseCache()
+    assert answer(cache, request(snapshot=None)) is None
+    assert answer(cache, request(snapshot=None), "inv-2") is None
+    assert cache.stats() == {"entries": 0, "hits": 0, "misses": 0, "hit_rate": 0.0}
+
+
+def test_only_final_text_replies_are_stored():
+    cache = ResponseCache()
+    ctx = context()
+    cache.before_model(ctx, request())
+    cache.after_model(ctx, LlmResponse(content=Content(role="model", parts=[Part(text="Bias")]), partial=True))
+    cache.after_model(ctx, LlmResponse(content=Content(role="model", parts=[
+        Part(function_call=FunctionCall(name="fetch_crypto_snapshot", args={})),
+    ])))
+    cache.after_model(ctx, LlmResponse(error_code="RESOURCE_EXHAUSTED"))
+    assert cache.stats()["entries"] == 0
+    # The final reply still lands under the pending key.
+    cache.after_model(ctx, reply())
+    assert cache.stats()["entries"] == 1
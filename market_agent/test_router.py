@@ -0,0 +1,60 @@
+"""Keyword routing in front of the orchestrator.
+
+    python -m pytest market_agent/test_router.py
+"""
+import pytest
+
+from market_agent.agent import BATCH_INSTRUMENTS
+from market_agent.router import KeywordRouter
+
+
+@pytest.mark.parametrize("query, agent", [
+    ("Analyze BTC price today", "CryptoAnalyst"),
+    ("what about ethusdt on the 4h?", "CryptoAnalyst"),
+    ("Is Bitcoin overbought", "CryptoAnalyst"),
+    ("cryptocurrency outlook", "CryptoAnalyst"),
+    ("EUR/USD outlook", "FXAnalyst"),
+    ("eur usd", "FXAnalyst"),
+    ("EURUSD today", "FXAnalyst"),
+    ("forex majors", "FXAnalyst"),
+    ("XAU/USD daily", "XAUAnalyst"),
+    ("xauusd", "XAUAnalyst"),
+    ("Should I buy gold?", "XAUAnalyst"),
+])
+def test_single_match_is_routed_directly(query, agent):
+    router = KeywordRouter()
+    assert router.route(query) == agent
+    assert router.stats()["direct"][agent] == 1
+
+
+def test_batch_queries_route_to_their_analyst():
+    router = KeywordRouter()
+    for spec in BATCH_INSTRUMENTS.values():
+        assert router.route(spec["query"]) == spec["agent"]
+
+
+@pytest.mark.parametrize("query", ["BTC or gold?", "EUR/USD vs XAU", "eth and eurusd"])
+def test_several_matches_fall_back(query):
+    router = KeywordRouter()
+    assert router.route(query) is None
+    assert router.stats()["fallback_ambiguous"] == 1
+
+
+@pytest.mark.parametrize("query", ["hello", "Goldman Sachs earnings", "ethics of trading", "usd/jpy"])
+def test_no_match_falls_back(query):
+    router = KeywordRouter()
+    assert router.route(query) is None
+    assert router.stats()["fallback_unmatched"] == 1
+
+
+def test_stats():
+    router = KeywordRouter()
+    for query in ["btc", "gold", "gold", "btc and gold", "hi"]:
+        router.route(query)
+    assert router.stats() == {
+        "direct": {"CryptoAnalyst": 1, "FXAnalyst": 0, "XAUAnalyst": 2},
+        "fallback_ambiguous": 1,
+        "fallback_unmatched": 1,
+        "fast_path_rate": 0.6,
+    }
+    assert KeywordRouter().stats()["fast_path_rate"] == 0.0
@@ -0,0 +1,66 @@
+"""BoundedSessionService eviction, in memory and across a restart on SQLite.
+
+    python -m pytest market_agent/test_session_store.py
+"""
+import asyncio
+
+from market_agent.session_store import BoundedSessionService, create_session_service
+
+APP, USER = "market_agent", "http_user"
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def session_ids(service) -> set[str]:
+    response = await service.list_sessions(app_name=APP, user_id=USER)
+    return {session.id for session in response.sessions}
+
+
+def test_lru_and_ttl_eviction():
+    async def run():
+        clock = FakeClock()
+        service = BoundedSessionService(max_sessions=3, ttl_seconds=60, clock=clock)
+        for name in ("a", "b", "c"):
+            await service.create_session(app_name=APP, user_id=USER, session_id=name)
+        await service.get_session(app_name=APP, user_id=USER, session_id="a")
+        await service.create_session(app_name=APP, user_id=USER, session_id="d")
+        assert await session_ids(service) == {"a", "c", "d"}
+
+        clock.now += 61
+        await service.create_session(app_name=APP, user_id=USER, session_id="e")
+        assert await session_ids(service) == {"e"}
+        return service.stats()
+
+    assert asyncio.run(run()) == {"live": 1, "created": 5, "evicted_lru": 1, "evicted_ttl": 3}
+
+
+def test_sessions_from_before_a_restart_are_evicted(tmp_path):
+    db_url = f"sqlite:///{tmp_path / 'sessions.db'}"
+
+    async def run():
+        before = create_session_service(db_url, max_sessions=10)
+        for name in ("old-1", "old-2", "old-3"):
+            await before.create_session(app_name=APP, user_id=USER, session_id=name)
+
+        # A new process: the in-memory index starts empty.
+        after = create_session_service(db_url, max_sessions=3)
+        await after.create_session(app_name=APP, user_id=USER, session_id="new")
+        assert await session_ids(after) == {"old-2", "old-3", "new"}
+        assert after.stats()["evicted_lru"] == 1
+
+        # Idle since before the restart: gone once the TTL has passed on the wall clock.
+        wall = FakeClock(after.wall_clock() + 3601)
+        later = BoundedSessionService(after.backend, max_sessions=3, ttl_seconds=3600, wall_clock=wall)
+        await later.create_session(app_name=APP, user_id=USER, session_id="newer")
+        assert await session_ids(later) == {"newer"}
+        return later.stats()
+
+    stats = asyncio.run(run())
+    assert stats["evicted_ttl"] == 3
+    assert stats["live"] == 1
@@ -0,0 +1,100 @@
+"""SingleFlight coalescing and cancellation.
+
+    python -m pytest market_agent/test_singleflight.py
+"""
+import asyncio
+
+import pytest
+
+from market_agent.singleflight import SingleFlight
+
+
+class Work:
+    """An async call that counts its runs and finishes when `release` is set."""
+
+    def __init__(self, result="done"):
+        self.result = result
+        self.runs = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.runs += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return self.result
+
+
+def test_concurrent_calls_share_one_run():
+    async def scenario():
+        flights, work = SingleFlight(), Work()
+        callers = [asyncio.ensure_future(flights.do("BTCUSDT", work)) for _ in range(5)]
+        other = asyncio.ensure_future(flights.do("ETHUSDT", Work("eth")))
+        await asyncio.sleep(0)
+        assert flights.stats()["in_flight"] == 2
+        work.release.set()
+        assert await asyncio.gather(*callers) == ["done"] * 5
+        other.cancel()
+        await asyncio.gather(other, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert work.runs == 1
+        assert flights.stats() == {"calls": 6, "suppressed": 4, "in_flight": 0, "suppression_rate": 0.6667}
+        # Finished work is not reused: the next call runs again.
+        assert await flights.do("BTCUSDT", work) == "done"
+        assert work.runs == 2
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_waiter():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(*(flights.do("k", fail) for _ in range(3)), return_exceptions=True)
+        assert [str(r) for r in results] == ["upstream down"] * 3
+        assert flights.stats()["suppressed"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_last_waiter_cancelling_cancels_the_work():
+    async def scenario():
+        flights, work = SingleFlight(), Work()
+        callers = [asyncio.ensure_future(flights.do("k", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert work.cancelled == 1
+        assert flights.stats()["in_flight"] == 0
+        # A new caller starts fresh work instead of joining the cancelled one.
+        fresh = asyncio.ensure_future(flights.do("k", work))
+        await asyncio.sleep(0)
+        work.release.set()
+        assert await fresh == "done"
+        assert work.runs == 2
+
+    asyncio.run(scenario())
+
+
+def test_one_waiter_cancelling_leaves_the_others_their_result():
+    async def scenario():
+        flights, work = SingleFlight(), Work()
+        callers = [asyncio.ensure_future(flights.do("k", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        callers[0].cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await callers[0]
+        work.release.set()
+        assert await asyncio.gather(*callers[1:]) == ["done", "done"]
+        assert (work.runs, work.cancelled) == (1, 0)
+
+    asyncio.run(scenario())
@@ -0,0 +1,144 @@
+"""TelegramNotifier against a local Bot API stub.
+
+    python -m pytest market_agent/test_telegram_notify.py
+"""
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from market_agent import telegram_notify
+from market_agent.telegram_notify import MAX_MESSAGE_LENGTH, TelegramNotifier
+
+
+class BotApiStub:
+    """sendMessage endpoint that records texts and answers with queued (status, body) replies, then 200."""
+
+    def __init__(self):
+        self.texts: list[str] = []
+        self.paths: list[str] = []
+        self.replies: list[tuple[int, bytes]] = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.paths.append(self.path)
+                stub.texts.append(payload["text"])
+                status, body = stub.replies.pop(0) if stub.replies else (200, b'{"ok": true, "result": {}}')
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def bot_api(monkeypatch):
+    monkeypatch.setattr(telegram_notify, "BACKOFF_SECONDS", 0.01)
+    with BotApiStub() as stub:
+        yield stub
+
+
+def deliver(stub: BotApiStub, texts: list[str], coalesce_window: float = 0.2) -> TelegramNotifier:
+    async def run():
+        notifier = TelegramNotifier("TOKEN", "42", base_url=stub.base_url, coalesce_window=coalesce_window)
+        for text in texts:
+            notifier.notify(text)
+        await notifier.stop(timeout=5)
+        return notifier
+
+    return asyncio.run(run())
+
+
+def test_burst_is_coalesced_into_one_message(bot_api):
+    notifier = deliver(bot_api, ["BTC: Buy", "ETH: Wait", "SOL: Sell"])
+    assert bot_api.texts == ["BTC: Buy\n\nETH: Wait\n\nSOL: Sell"]
+    assert bot_api.paths == ["/botTOKEN/sendMessage"]
+    assert notifier.stats() == {"enabled": True, "queued": 0, "sent": 1, "failed": 0}
+
+
+def test_long_text_is_split_at_the_limit(bot_api):
+    lines = [f"line {i:04d} " + "x" * 90 for i in range(100)]
+    text = "\n".join(lines)
+    notifier = deliver(bot_api, [text])
+    assert len(bot_api.texts) == 3
+    assert all(len(chunk) <= MAX_MESSAGE_LENGTH for chunk in bot_api.texts)
+    # Cuts fall on line breaks, so no line is torn across two messages.
+    assert "\n".join(bot_api.texts) == text
+    assert notifier.sent == 3
+
+
+def test_unbroken_text_is_split_hard():
+    chunks = telegram_notify.split_message("x" * (2 * MAX_MESSAGE_LENGTH + 1))
+    assert [len(c) for c in chunks] == [MAX_MESSAGE_LENGTH, MAX_MESSAGE_LENGTH, 1]
+
+
+def test_retries_after_429_and_5xx(bot_api):
+    bot_api.replies = [
+        (429, b'{"ok": false, "error_code": 429, "parameters": {"retry_after": 0}}'),
+        (502, b"Bad Gateway"),
+    ]
+    notifier = deliver(bot_api, ["BTC: Buy"])
+    assert bot_api.texts == ["BTC: Buy"] * 3
+    assert (notifier.sent, notifier.failed) == (1, 0)
+
+
+def test_non_json_429_falls_back_to_backoff(bot_api):
+    bot_api.replies = [(429, b"<html>Too Many Requests</html>")]
+    notifier = deliver(bot_api, ["BTC: Buy"])
+    assert bot_api.texts == ["BTC: Buy"] * 2
+    assert (notifier.sent, notifier.failed) == (1, 0)
+
+
+def test_gives_up_and_counts_failure(bot_api):
+    bot_api.replies = [(429, b"slow down")] * telegram_notify.MAX_ATTEMPTS
+    notifier = deliver(bot_api, ["BTC: Buy"])
+    assert len(bot_api.texts) == telegram_notify.MAX_ATTEMPTS
+    assert (notifier.sent, notifier.failed) == (0, 1)
+
+
+def test_client_error_is_not_retried(bot_api):
+    bot_api.replies = [(400, b'{"ok": false, "description": "chat not found"}')]
+    notifier = deliver(bot_api, ["BTC: Buy", "ETH: Wait"], coalesce_window=0)
+    # The worker survives the rejected message and delivers the next one.
+    assert bot_api.texts == ["BTC: Buy", "ETH: Wait"]
+    assert (notifier.sent, notifier.failed) == (1, 1)
+
+
+def test_restart_reuses_the_open_client(bot_api):
+    async def run():
+        notifier = TelegramNotifier("TOKEN", "42", base_url=bot_api.base_url, coalesce_window=0.01)
+        notifier.notify("first")
+        client = notifier._client
+        # The worker dies; the next notify restarts it on the same client.
+        notifier._worker.cancel()
+        await asyncio.sleep(0)
+        notifier.notify("second")
+        assert notifier._client is client
+        await notifier.stop(timeout=5)
+        assert client.is_closed
+        # After a stop a fresh client is opened.
+        notifier.notify("third")
+        assert notifier._client is not client
+        await notifier.stop(timeout=5)
+        return notifier
+
+    notifier = asyncio.run(run())
+    assert bot_api.texts[-1] == "third"
+    assert notifier._client.is_closed
@@ -0,0 +1,15 @@
+"""Record/replay harness: run the agents offline against recorded fixtures."""
+from .cassette import Cassette, Latency, ReplayMiss
+from .http import patch_http
+from .llm import RecordingLlm, ReplayLlm, record_models, replay_models
+
+__all__ = [
+    "Cassette",
+    "Latency",
+    "RecordingLlm",
+    "ReplayLlm",
+    "ReplayMiss",
+    "patch_http",
+    "record_models",
+    "replay_models",
+]
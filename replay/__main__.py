@@ -0,0 +1,71 @@
+"""Record an agent run to a fixture, or replay one offline.
+
+    python -m replay record market_agent "Analyze BTC/USD Price today" --fixture fixtures/btc.json
+    python -m replay replay market_agent "Analyze BTC/USD Price today" --fixture fixtures/btc.json \\
+        --llm-latency 0.8 --http-latency 0.05 --runs 20
+    python -m replay record terraform_agent "Review the plan" --fixture fixtures/tf.json \\
+        --artifact tfplan.json=terraform/tfplan.json
+
+Prints one JSON object: per-run wall times, whether every run returned the
+same text, and the cassette counters.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+
+from .cassette import Cassette, Latency
+from .runner import AGENTS, AgentTarget, cassette_session, prepare_environment, timed_runs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m replay", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=("record", "replay"))
+    parser.add_argument("agent", choices=AGENTS)
+    parser.add_argument("query")
+    parser.add_argument("--fixture", required=True, help="cassette file to write (record) or read (replay)")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--cold", action="store_true", help="disable the candle and response caches")
+    parser.add_argument("--artifact", action="append", default=[], metavar="NAME=PATH",
+                        help="save PATH as artifact NAME in each run's session")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds before each replayed model call answers")
+    parser.add_argument("--http-latency", type=float, default=0.0, help="seconds added to each replayed HTTP exchange")
+    parser.add_argument("--latency-scale", type=float, default=None,
+                        help="replay the recorded timings times this factor instead")
+    parser.add_argument("--show", action="store_true", help="include the first run's text in the output")
+    args = parser.parse_args()
+
+    artifacts = {}
+    for spec in args.artifact:
+        name, _, path = spec.partition("=")
+        with open(path, "rb") as f:
+            artifacts[name] = f.read()
+
+    prepare_environment(args.mode, cold=args.cold)
+    target = AgentTarget(args.agent)
+    cassette = Cassette(args.fixture) if args.mode == "record" else Cassette.load(args.fixture)
+    latency = Latency(args.llm_latency, args.http_latency, args.latency_scale)
+
+    with cassette_session(target, cassette, args.mode, latency):
+        results = asyncio.run(timed_runs(target, args.query, args.runs, artifacts))
+    if args.mode == "record":
+        cassette.save()
+
+    seconds = [elapsed for elapsed, _ in results]
+    report = {
+        "mode": args.mode,
+        "agent": args.agent,
+        "runs": len(results),
+        "seconds": [round(s, 4) for s in seconds],
+        "median_seconds": round(statistics.median(seconds), 4),
+        "identical_output": len({text for _, text in results}) == 1,
+        "cassette": cassette.stats(),
+    }
+    if args.show:
+        report["text"] = results[0][1]
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Fixture files holding recorded model calls and HTTP exchanges.
+
+A cassette is one JSON file:
+
+    {"version": 1,
+     "llm":  [{"key", "agent", "offsets", "responses"}, ...],
+     "http": [{"key", "method", "url", "elapsed", "status", "headers", "body"}, ...]}
+
+Entries are looked up by key, a digest of what identifies the request (for
+HTTP: method, URL and query without the volatile or secret parameters; for
+the model: agent, instruction, tools and conversation without call ids).
+A key recorded several times replays its entries in order, then cycles, so
+a recording of one run can be replayed any number of times.
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+VERSION = 1
+
+# Query parameters that change from run to run (time windows, session crumbs)
+# and are left out of the key.
+VOLATILE_PARAMS = frozenset({"startTime", "endTime", "period1", "period2", "crumb", "_"})
+# Query parameters redacted before anything is written to a fixture.
+SECRET_PARAMS = frozenset({"apikey", "api_key", "key", "token"})
+# Telegram puts the bot token in the path: /bot<token>/sendMessage.
+_TELEGRAM_TOKEN = re.compile(r"/bot[^/]+/")
+# Response headers that no longer match the body once it has been decoded.
+_DROPPED_HEADERS = frozenset({"content-encoding", "content-length", "transfer-encoding", "connection"})
+
+
+class ReplayMiss(LookupError):
+    """A request with no recorded exchange in the cassette."""
+
+
+@dataclass
+class Latency:
+    """Delays injected on replay, in seconds.
+
+    `llm` is the wait before a model call's first response and `http` the
+    wait on every HTTP exchange. With `scale` set, the recorded timings
+    multiplied by `scale` are used instead (1.0 replays at recorded speed).
+    """
+    llm: float = 0.0
+    http: float = 0.0
+    scale: float | None = None
+
+    @classmethod
+    def from_env(cls) -> "Latency":
+        scale = os.environ.get("REPLAY_LATENCY_SCALE")
+        return cls(
+            llm=float(os.environ.get("REPLAY_LLM_LATENCY", "0")),
+            http=float(os.environ.get("REPLAY_HTTP_LATENCY", "0")),
+            scale=float(scale) if scale else None,
+        )
+
+    def http_delay(self, entry: dict) -> float:
+        return entry.get("elapsed", 0.0) * self.scale if self.scale is not None else self.http
+
+    def llm_delays(self, entry: dict) -> list[float]:
+        """Wait before each response of a recorded call."""
+        offsets = entry.get("offsets") or [0.0] * len(entry["responses"])
+        if self.scale is None:
+            return [self.llm] + [0.0] * (len(offsets) - 1)
+        previous = 0.0
+        delays = []
+        for offset in offsets:
+            delays.append(max(offset - previous, 0.0) * self.scale)
+            previous = offset
+        return delays
+
+
+def redact_url(url: str) -> str:
+    parts = urlsplit(url)
+    path = _TELEGRAM_TOKEN.sub("/bot<redacted>/", parts.path)
+    query = [
+        (k, "<redacted>" if k.lower() in SECRET_PARAMS else v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+    ]
+    return urlunsplit((parts.scheme, parts.netloc, path, urlencode(query), ""))
+
+
+def http_key(method: str, url: str) -> str:
+    parts = urlsplit(redact_url(url))
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in VOLATILE_PARAMS
+    )
+    return f"{method.upper()} {parts.scheme}://{parts.netloc.lower()}{parts.path}?{urlencode(query)}"
+
+
+def _strip_ids(value):
+    # ADK assigns fresh function call ids every run.
+    if isinstance(value, dict):
+        return {k: _strip_ids(v) for k, v in value.items() if k != "id"}
+    if isinstance(value, list):
+        return [_strip_ids(v) for v in value]
+    return value
+
+
+def llm_key(llm_request) -> str:
+    config = llm_request.config
+    labels = getattr(config, "labels", None) or {}
+    canonical = {
+        "agent": labels.get("adk_agent_name"),
+        "instruction": str(getattr(config, "system_instruction", None) or ""),
+        "tools": sorted(llm_request.tools_dict),
+        "contents": _strip_ids([c.model_dump(mode="json", exclude_none=True) for c in llm_request.contents]),
+    }
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def encode_body(body: bytes) -> dict:
+    try:
+        return {"text": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(body).decode("ascii")}
+
+
+def decode_body(entry: dict) -> bytes:
+    if "base64" in entry["body"]:
+        return base64.b64decode(entry["body"]["base64"])
+    return entry["body"]["text"].encode("utf-8")
+
+
+class Cassette:
+    """Recorded exchanges plus per-key replay cursors. Thread-safe."""
+
+    def __init__(self, path: str | None = None, llm: list | None = None, http: list | None = None):
+        self.path = path
+        self.llm: list[dict] = llm or []
+        self.http: list[dict] = http or []
+        self.llm_calls = 0
+        self.llm_fallbacks = 0
+        self.http_calls = 0
+        self._cursors: dict[tuple, int] = {}
+        self._agent_calls: dict[str | None, int] = {}
+        self._lock = threading.Lock()
+        self._index()
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != VERSION:
+            raise ValueError(f"{path}: unsupported cassette version {data.get('version')!r}")
+        return cls(path, data.get("llm"), data.get("http"))
+
+    def save(self, path: str | None = None) -> None:
+        path = path or self.path
+        with self._lock:
+            data = {"version": VERSION, "llm": self.llm, "http": self.http}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _index(self) -> None:
+        self._by_key: dict[tuple, list[dict]] = {}
+        for entry in self.llm:
+            self._by_key.setdefault(("llm", entry["key"]), []).append(entry)
+            self._by_key.setdefault(("agent", entry.get("agent")), []).append(entry)
+        for entry in self.http:
+            self._by_key.setdefault(("http", entry["key"]), []).append(entry)
+
+    def _next(self, index_key: tuple) -> dict | None:
+        entries = self._by_key.get(index_key)
+        if not entries:
+            return None
+        i = self._cursors.get(index_key, 0)
+        self._cursors[index_key] = i + 1
+        return entries[i % len(entries)]
+
+    def rewind(self) -> None:
+        with self._lock:
+            self._cursors.clear()
+            self._agent_calls.clear()
+
+    def add_http(self, method: str, url: str, status: int, headers, body: bytes, elapsed: float) -> dict:
+        entry = {
+            "key": http_key(method, url),
+            "method": method.upper(),
+            "url": redact_url(url),
+            "elapsed": round(elapsed, 4),
+            "status": status,
+            "headers": [[k, v] for k, v in headers if k.lower() not in _DROPPED_HEADERS],
+            "body": encode_body(body),
+        }
+        with self._lock:
+            self.http.append(entry)
+            self._by_key.setdefault(("http", entry["key"]), []).append(entry)
+        return entry
+
+    def next_http(self, method: str, url: str) -> dict:
+        key = http_key(method, url)
+        with self._lock:
+            entry = self._next(("http", key))
+            if entry is None:
+                raise ReplayMiss(f"no recorded response for {key}")
+            self.http_calls += 1
+            return entry
+
+    def add_llm(self, key: str, agent: str | None, responses: list[dict], offsets: list[float]) -> None:
+        entry = {"key": key, "agent": agent, "offsets": [round(t, 4) for t in offsets], "responses": responses}
+        with self._lock:
+            self.llm.append(entry)
+            self._by_key.setdefault(("llm", key), []).append(entry)
+            self._by_key.setdefault(("agent", agent), []).append(entry)
+
+    def next_llm(self, key: str, agent: str | None) -> dict:
+        """The recorded call for `key`, else the agent's next call in recorded order.
+
+        The fallback covers prompts that differ only by something the agent
+        computed at run time (a tool reporting the current time, say).
+        """
+        with self._lock:
+            turn = self._agent_calls.get(agent, 0)
+            self._agent_calls[agent] = turn + 1
+            entry = self._next(("llm", key))
+            if entry is None:
+                entries = self._by_key.get(("agent", agent))
+                if not entries:
+                    raise ReplayMiss(f"no recorded model call for agent {agent!r}")
+                entry = entries[turn % len(entries)]
+                self.llm_fallbacks += 1
+            self.llm_calls += 1
+            return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "llm_recorded": len(self.llm),
+                "http_recorded": len(self.http),
+                "llm_calls": self.llm_calls,
+                "llm_fallbacks": self.llm_fallbacks,
+                "http_calls": self.http_calls,
+            }
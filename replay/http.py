@@ -0,0 +1,150 @@
+"""Stub HTTP transport for requests and httpx, backed by a cassette.
+
+`patch_http(cassette, mode)` routes every requests.Session (the Jenkins,
+DuckDuckGo and Yahoo calls) and every httpx client (Binance, Alpha Vantage,
+Telegram) through the cassette for as long as the context is open. In
+"record" mode the real call is made and its response stored; in "replay"
+mode the recorded response is returned after the configured latency and
+nothing leaves the process. A replayed request that was never recorded
+raises ReplayMiss. Model endpoints are left alone: model calls are
+recorded one level up, by replay.llm.
+
+yfinance only goes through requests when YF_DISABLE_CURL_CFFI=1 is set
+before it is imported; the replay CLI takes care of that.
+"""
+import asyncio
+import contextlib
+import io
+import time
+from http.client import HTTPMessage
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+from urllib3._collections import HTTPHeaderDict
+
+from .cassette import Cassette, Latency, decode_body
+
+MODES = ("record", "replay")
+# Hosts (netloc suffixes) of model APIs, which pass through untouched.
+MODEL_HOSTS = ("generativelanguage.googleapis.com", "aiplatform.googleapis.com", "api.openai.com", ":11434")
+
+
+def is_model_host(url: str) -> bool:
+    return urlsplit(str(url)).netloc.endswith(MODEL_HOSTS)
+
+
+class _RecordedMessage:
+    """Stands in for the http.client response urllib3 wraps; requests reads cookies off `msg`."""
+
+    def __init__(self, msg: HTTPMessage):
+        self.msg = msg
+
+    def isclosed(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+class CassetteAdapter(HTTPAdapter):
+    """requests transport adapter that records or replays through a cassette."""
+
+    def __init__(self, cassette: Cassette, mode: str, latency: Latency):
+        super().__init__()
+        self.cassette = cassette
+        self.mode = mode
+        self.latency = latency
+
+    def send(self, request, **kwargs):
+        if is_model_host(request.url):
+            return super().send(request, **kwargs)
+        if self.mode == "record":
+            started = time.perf_counter()
+            response = super().send(request, **kwargs)
+            body = response.content
+            self.cassette.add_http(request.method, request.url, response.status_code,
+                                   response.raw.headers.items(), body, time.perf_counter() - started)
+            return response
+
+        entry = self.cassette.next_http(request.method, request.url)
+        delay = self.latency.http_delay(entry)
+        if delay:
+            time.sleep(delay)
+        headers = HTTPHeaderDict()
+        msg = HTTPMessage()
+        for name, value in entry["headers"]:
+            headers.add(name, value)
+            msg[name] = value  # appends, so repeated Set-Cookie headers survive
+        raw = HTTPResponse(
+            body=io.BytesIO(decode_body(entry)),
+            headers=headers,
+            status=entry["status"],
+            preload_content=False,
+            decode_content=False,
+            original_response=_RecordedMessage(msg),
+        )
+        return self.build_response(request, raw)
+
+
+def _httpx_response(entry: dict, request: httpx.Request) -> httpx.Response:
+    return httpx.Response(entry["status"], headers=entry["headers"], content=decode_body(entry), request=request)
+
+
+@contextlib.contextmanager
+def patch_http(cassette: Cassette, mode: str = "replay", latency: Latency | None = None):
+    """Route requests and httpx traffic through `cassette` while the context is open."""
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, not {mode!r}")
+    latency = latency or Latency()
+    adapter = CassetteAdapter(cassette, mode, latency)
+    original_get_adapter = requests.Session.get_adapter
+    original_send = httpx.HTTPTransport.handle_request
+    original_send_async = httpx.AsyncHTTPTransport.handle_async_request
+
+    def get_adapter(session, url):
+        return adapter
+
+    def handle_request(transport, request: httpx.Request) -> httpx.Response:
+        if is_model_host(request.url):
+            return original_send(transport, request)
+        if mode == "record":
+            started = time.perf_counter()
+            response = original_send(transport, request)
+            body = response.read()
+            entry = cassette.add_http(request.method, str(request.url), response.status_code,
+                                      response.headers.multi_items(), body, time.perf_counter() - started)
+            response.close()
+        else:
+            entry = cassette.next_http(request.method, str(request.url))
+            if delay := latency.http_delay(entry):
+                time.sleep(delay)
+        return _httpx_response(entry, request)
+
+    async def handle_async_request(transport, request: httpx.Request) -> httpx.Response:
+        if is_model_host(request.url):
+            return await original_send_async(transport, request)
+        if mode == "record":
+            started = time.perf_counter()
+            response = await original_send_async(transport, request)
+            body = await response.aread()
+            entry = cassette.add_http(request.method, str(request.url), response.status_code,
+                                      response.headers.multi_items(), body, time.perf_counter() - started)
+            await response.aclose()
+        else:
+            entry = cassette.next_http(request.method, str(request.url))
+            if delay := latency.http_delay(entry):
+                await asyncio.sleep(delay)
+        return _httpx_response(entry, request)
+
+    requests.Session.get_adapter = get_adapter
+    httpx.HTTPTransport.handle_request = handle_request
+    httpx.AsyncHTTPTransport.handle_async_request = handle_async_request
+    try:
+        yield cassette
+    finally:
+        requests.Session.get_adapter = original_get_adapter
+        httpx.HTTPTransport.handle_request = original_send
+        httpx.AsyncHTTPTransport.handle_async_request = original_send_async
@@ -0,0 +1,93 @@
+"""Model backends that record to, or replay from, a cassette.
+
+`record_models` wraps every LlmAgent's model in a RecordingLlm that passes
+calls through and stores the responses; `replay_models` swaps in one
+ReplayLlm that answers from the cassette without any network.
+"""
+import asyncio
+import time
+from typing import Any, AsyncGenerator
+
+from google.adk.agents import LlmAgent
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+
+from .cassette import Cassette, Latency, llm_key
+
+
+def _agent_name(llm_request: LlmRequest) -> str | None:
+    return (getattr(llm_request.config, "labels", None) or {}).get("adk_agent_name")
+
+
+class RecordingLlm(BaseLlm):
+    """Passes calls to `inner` and appends each call's responses to the cassette."""
+
+    model: str = "recording"
+    inner: Any = None
+    cassette: Any = None
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        # Keyed before the inner model gets to adjust the request.
+        key = llm_key(llm_request)
+        agent = _agent_name(llm_request)
+        responses, offsets = [], []
+        started = time.perf_counter()
+        async for response in self.inner.generate_content_async(llm_request, stream):
+            offsets.append(time.perf_counter() - started)
+            responses.append(response.model_dump(mode="json", exclude_none=True))
+            yield response
+        self.cassette.add_llm(key, agent, responses, offsets)
+
+
+class ReplayLlm(BaseLlm):
+    """Answers every call with the recorded responses, after the configured latency."""
+
+    model: str = "replay"
+    cassette: Any = None
+    latency: Any = None
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        entry = self.cassette.next_llm(llm_key(llm_request), _agent_name(llm_request))
+        latency = self.latency or Latency()
+        for data, delay in zip(entry["responses"], latency.llm_delays(entry)):
+            if delay:
+                await asyncio.sleep(delay)
+            response = LlmResponse.model_validate(data)
+            # A call recorded with streaming still replays to a non-streaming run.
+            if response.partial and not stream:
+                continue
+            yield response
+
+
+def _resolve(agent: LlmAgent) -> BaseLlm:
+    try:
+        return agent.canonical_model
+    except ValueError:
+        # Provider-prefixed names ("ollama/gemma3") are served through LiteLLM.
+        from google.adk.models.lite_llm import LiteLlm
+        return LiteLlm(model=agent.model)
+
+
+def _llm_agents(agent) -> list[LlmAgent]:
+    found = [agent] if isinstance(agent, LlmAgent) else []
+    for sub_agent in agent.sub_agents:
+        found.extend(_llm_agents(sub_agent))
+    return found
+
+
+def record_models(root_agent, cassette: Cassette) -> None:
+    """Wrap the model of every LlmAgent under `root_agent` for recording."""
+    for agent in _llm_agents(root_agent):
+        if not isinstance(agent.model, RecordingLlm):
+            agent.model = RecordingLlm(inner=_resolve(agent), cassette=cassette)
+
+
+def replay_models(root_agent, cassette: Cassette, latency: Latency | None = None) -> ReplayLlm:
+    """Point every LlmAgent under `root_agent` at one ReplayLlm and return it."""
+    llm = ReplayLlm(cassette=cassette, latency=latency or Latency())
+    for agent in _llm_agents(root_agent):
+        agent.model = llm
+    return llm
@@ -0,0 +1,109 @@
+"""Load one of the repo's agents and run a query through it on a cassette.
+
+Call prepare_environment() before load(): the agent modules read their
+configuration (and yfinance picks its HTTP backend) at import time.
+"""
+import contextlib
+import importlib
+import os
+import tempfile
+import time
+import uuid
+
+from google.adk.artifacts import InMemoryArtifactService
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai.types import Content, Part
+
+from .cassette import Cassette, Latency
+from .http import patch_http
+from .llm import record_models, replay_models
+
+AGENTS = ("market_agent", "terraform_agent", "planner_agent", "jenkins_agent")
+
+
+def prepare_environment(mode: str, cold: bool = False) -> None:
+    # yfinance only uses requests (which the stub transport covers) with this set.
+    os.environ["YF_DISABLE_CURL_CFFI"] = "1"
+    # Disk caches and the websocket feed would let a run skip the cassette or
+    # depend on what an earlier run left behind. Empty rather than unset, so
+    # a .env file loaded later cannot turn them back on.
+    for name in ("CANDLE_CACHE_DIR", "CANDLE_STORE_DIR", "INDICATOR_STATE_PATH", "LIVE_FEED"):
+        os.environ[name] = ""
+    if cold:
+        # Every run fetches and calls the model instead of hitting a cache.
+        os.environ["CANDLE_CACHE_MAX_AGE"] = "0"
+        os.environ["RESPONSE_CACHE_TTL_SECONDS"] = "0"
+    if mode == "replay":
+        # Read at import time, never sent anywhere on replay.
+        os.environ.setdefault("ALPHAVANTAGE_API_KEY", "replay")
+        os.environ.setdefault("GOOGLE_API_KEY", "replay")
+        # Upstream quotas do not apply to recorded responses.
+        os.environ.setdefault("ALPHAVANTAGE_PER_MINUTE", "1000000")
+        os.environ.setdefault("ALPHAVANTAGE_PER_DAY", "1000000")
+    import yfinance
+    yfinance.set_tz_cache_location(tempfile.mkdtemp(prefix="replay-yfinance-"))
+
+
+class AgentTarget:
+    """One agent module: its root agent, and the App wrapping it if it has one."""
+
+    def __init__(self, name: str):
+        if name not in AGENTS:
+            raise ValueError(f"unknown agent {name!r}, expected one of {AGENTS}")
+        self.name = name
+        self.module = importlib.import_module(f"{name}.agent")
+        self.app = getattr(self.module, "app", None)
+        self.root_agent = self.app.root_agent if self.app is not None else self.module.root_agent
+        self.session_service = InMemorySessionService()
+        self.artifact_service = InMemoryArtifactService()
+        if self.app is not None:
+            self.runner = Runner(app=self.app, session_service=self.session_service,
+                                 artifact_service=self.artifact_service)
+        else:
+            self.runner = Runner(app_name=name, agent=self.root_agent, session_service=self.session_service,
+                                 artifact_service=self.artifact_service)
+
+    async def run(self, query: str, artifacts: dict[str, bytes] | None = None) -> str:
+        """Run `query` in a fresh session and return the final text."""
+        if self.name == "market_agent":
+            # The service's own entry point: keyword routing, header rendering.
+            return await self.module.analyze_market(query)
+
+        app_name = self.runner.app_name
+        user_id, session_id = "replay", str(uuid.uuid4())
+        await self.session_service.create_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        for filename, data in (artifacts or {}).items():
+            await self.artifact_service.save_artifact(
+                app_name=app_name, user_id=user_id, session_id=session_id, filename=filename,
+                artifact=Part.from_bytes(data=data, mime_type="application/json"),
+            )
+        texts = []
+        async for event in self.runner.run_async(
+            user_id=user_id, session_id=session_id,
+            new_message=Content(role="user", parts=[Part(text=query)]),
+        ):
+            if event.is_final_response() and event.content:
+                texts.extend(part.text for part in event.content.parts or [] if part.text)
+        return "\n".join(texts)
+
+
+@contextlib.contextmanager
+def cassette_session(target: AgentTarget, cassette: Cassette, mode: str, latency: Latency | None = None):
+    """Install the cassette's model backend on `target` and patch HTTP while open."""
+    if mode == "record":
+        record_models(target.root_agent, cassette)
+    else:
+        replay_models(target.root_agent, cassette, latency)
+    with patch_http(cassette, mode, latency):
+        yield cassette
+
+
+async def timed_runs(target: AgentTarget, query: str, runs: int,
+                     artifacts: dict[str, bytes] | None = None) -> list[tuple[float, str]]:
+    results = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        text = await target.run(query, artifacts)
+        results.append((time.perf_counter() - started, text))
+    return results
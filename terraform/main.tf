@@ -37,31 +37,28 @@ resource "google_cloud_run_v2_service_iam_member" "scheduler_invoker" {
 
 locals {
   cloud_run_uri = trimspace(data.google_cloud_run_v2_service.market_agent.uri)
-  analyze_triggers = [
-    { key = "eurusd", query = "Analyze EUR/USD Price today" },
-    { key = "xauusd", query = "Analyze XAU/USD Price today" },
-    { key = "ethusd", query = "Analyze ETH/USD Price today" },
-    { key = "btcusd", query = "Analyze BTC/USD Price today" },
-  ]
+  # Keys of BATCH_INSTRUMENTS in market_agent/agent.py
+  analyze_instruments = ["eurusd", "xauusd", "ethusd", "btcusd"]
 }
 
-resource "google_cloud_scheduler_job" "analyze" {
-  for_each         = { for t in local.analyze_triggers : t.key => t }
-  name             = "market-agent-analyze-${each.value.key}"
+# One batch run fetches all instruments concurrently, runs the analysts in
+# parallel and sends a single consolidated notification.
+resource "google_cloud_scheduler_job" "analyze_all" {
+  name             = "market-agent-analyze-all"
   project          = "civil-treat-482015-n6"
   region           = "asia-southeast1"
-  description      = "Trigger market_agent /analyze: ${each.value.query}"
+  description      = "Trigger market_agent /analyze-all: ${join(", ", local.analyze_instruments)}"
   schedule         = "0 2 * * *"
   time_zone        = "Asia/Ho_Chi_Minh"
   attempt_deadline = "320s"
 
   http_target {
-    uri         = "${local.cloud_run_uri}/analyze"
+    uri         = "${local.cloud_run_uri}/analyze-all"
     http_method = "POST"
     headers = {
       "Content-Type" = "application/json"
     }
-    body = base64encode(jsonencode({ query = each.value.query }))
+    body = base64encode(jsonencode({ instruments = local.analyze_instruments }))
     oidc_token {
       service_account_email = google_service_account.scheduler.email
       audience              = data.google_cloud_run_v2_service.market_agent.uri